@@ -0,0 +1,159 @@
+"""Microbenchmark harness for Chatango parsing and protocol hot paths.
+
+Benchmarks are factories registered with `@benchmark`. A factory does its setup and returns the
+zero-argument callable (or coroutine function) to time, optionally followed by a cleanup callable
+that runs after each timed repeat and a teardown callable that runs once at the end::
+
+    @benchmark("utils.get_server")
+    def bench_get_server():
+        return lambda: get_server("pythonrpg")
+"""
+import gc
+import inspect
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark factory under `name`."""
+
+    def decorator(factory: Callable):
+        BENCHMARKS[name] = factory
+        return factory
+
+    return decorator
+
+
+class Result:
+    """Timing and allocation figures of one benchmark."""
+
+    def __init__(self, name: str, ops: float, peak_bytes: int, loops: int):
+        self.name = name
+        self.ops = ops
+        self.peak_bytes = peak_bytes
+        self.loops = loops
+
+    def as_dict(self) -> dict:
+        return {"ops": self.ops, "peak_bytes": self.peak_bytes}
+
+    def __repr__(self):
+        return f"<Result {self.name} {self.ops:,.0f} ops/s {self.peak_bytes} B>"
+
+
+async def _timed(op: Callable, is_async: bool, loops: int) -> float:
+    started = time.perf_counter()
+    if is_async:
+        for _ in range(loops):
+            await op()
+    else:
+        for _ in range(loops):
+            op()
+    return time.perf_counter() - started
+
+
+async def measure(name: str, factory: Callable, min_time: float = 0.05, repeat: int = 5) -> Result:
+    """
+    Time one benchmark: calibrate a loop count that runs for at least `min_time`, keep the best of `repeat`
+    runs and record the peak traced allocation of a single call.
+
+    :returns: Result
+    """
+    made = factory()
+    if inspect.isawaitable(made):
+        made = await made
+    op, cleanup, teardown = (tuple(made) + (None, None))[:3] if isinstance(made, tuple) else (made, None, None)
+    is_async = inspect.iscoroutinefunction(op)
+
+    async def after():
+        if cleanup:
+            done = cleanup()
+            if inspect.isawaitable(done):
+                await done
+
+    loops = 1
+    while True:
+        elapsed = await _timed(op, is_async, loops)
+        await after()
+        if elapsed >= min_time or loops >= 1 << 24:
+            break
+        loops *= 2 if elapsed > min_time / 10 else 10
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        best = min([await _timed(op, is_async, loops) for _ in range(repeat)])
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    await after()
+
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await _timed(op, is_async, 1)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    await after()
+    if teardown:
+        done = teardown()
+        if inspect.isawaitable(done):
+            await done
+    return Result(name, loops / best if best else float("inf"), max(peak - start, 0), loops)
+
+
+async def run_all(pattern: Optional[str] = None, min_time: float = 0.05, repeat: int = 5) -> Dict[str, Result]:
+    """Run all registered benchmarks whose name contains `pattern`."""
+    results = {}
+    for name, factory in sorted(BENCHMARKS.items()):
+        if pattern and pattern not in name:
+            continue
+        results[name] = await measure(name, factory, min_time, repeat)
+    return results
+
+
+def environment(loop: str = "asyncio") -> dict:
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "loop": loop,
+    }
+
+
+def save_baseline(path: str, results: Dict[str, Result], loop: str = "asyncio"):
+    """Merge `results` into the baseline file at `path`."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        data = {"benchmarks": {}}
+    data["environment"] = environment(loop)
+    data["benchmarks"].update({name: result.as_dict() for name, result in results.items()})
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f).get("benchmarks", {})
+    except FileNotFoundError:
+        return {}
+
+
+def run(
+    pattern: Optional[str] = None, min_time: float = 0.05, repeat: int = 5, loop: str = "asyncio"
+) -> Dict[str, Result]:
+    """Synchronous entry point; imports every benchmark module, then runs them on an `asyncio` or `uvloop` loop."""
+    from chatango.runner import run as run_loop
+
+    from . import bench_hasher, bench_parsing, bench_rooms, bench_servers  # noqa: F401
+
+    return run_loop(run_all(pattern, min_time, repeat), use_uvloop=loop == "uvloop")
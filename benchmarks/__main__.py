@@ -0,0 +1,55 @@
+"""Run the benchmark suite and compare against a local baseline.
+
+    python -m benchmarks                 # run and compare with the saved baseline
+    python -m benchmarks --save          # run and store the results as the new baseline
+    python -m benchmarks -k message      # only benchmarks whose name contains "message"
+    python -m benchmarks --loop uvloop   # same suite on uvloop, compared with the asyncio baseline
+"""
+import argparse
+import os
+import sys
+
+from . import load_baseline, run, save_baseline
+
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".benchmarks", "baseline.json"
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Chatango microbenchmarks.")
+    parser.add_argument("-k", dest="pattern", default=None, help="Only run benchmarks whose name contains this.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file.")
+    parser.add_argument("--save", action="store_true", help="Store results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent slowdown reported as a regression.")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per timed repeat.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repeats; the best one is kept.")
+    parser.add_argument("--loop", choices=("asyncio", "uvloop"), default="asyncio", help="Event loop implementation.")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    results = run(args.pattern, args.min_time, args.repeat, args.loop)
+    regressions = 0
+    print(f"{'benchmark':<40} {'ops/s':>14} {'peak B/op':>10} {'vs baseline':>12}")
+    for name, result in results.items():
+        change = ""
+        if name in baseline and baseline[name]["ops"]:
+            delta = (result.ops / baseline[name]["ops"] - 1) * 100
+            change = f"{delta:+.1f}%"
+            if delta < -args.threshold:
+                change += " !"
+                regressions += 1
+        print(f"{name:<40} {result.ops:>14,.0f} {result.peak_bytes:>10} {change:>12}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        save_baseline(args.baseline, results, args.loop)
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions:
+        print(f"{regressions} benchmark(s) slower than baseline by more than {args.threshold:.0f}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
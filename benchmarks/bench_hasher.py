@@ -0,0 +1,35 @@
+"""Benchmarks for `chatango.hasher`, with `hashlib.md5` as the C reference point."""
+import hashlib
+
+from chatango.hasher import Hasher
+
+from . import benchmark
+
+PAYLOAD_4K = bytes(range(256)) * 16
+PAYLOAD_64K = memoryview(PAYLOAD_4K * 16)
+
+
+@benchmark("hasher.Hasher.hash")
+def bench_hasher():
+    return lambda: Hasher().hash("pythonrpg")
+
+
+@benchmark("hasher.Hasher.hash[4KiB]")
+def bench_hasher_4k():
+    return lambda: Hasher().hash(PAYLOAD_4K)
+
+
+@benchmark("hasher.Hasher.update[64KiB memoryview, 1KiB chunks]")
+def bench_hasher_streaming():
+    def op():
+        hasher = Hasher()
+        for offset in range(0, len(PAYLOAD_64K), 1024):
+            hasher.update(PAYLOAD_64K[offset : offset + 1024])
+        return hasher.digest()
+
+    return op
+
+
+@benchmark("hashlib.md5[4KiB reference]")
+def bench_md5_reference():
+    return lambda: hashlib.md5(PAYLOAD_4K).hexdigest()
@@ -0,0 +1,82 @@
+"""Memory retained by `User` objects: registry churn over many unique names, and per-participant cost.
+
+    python -m benchmarks.bench_memory --names 1000000 --concurrent 2000 --participants 2000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import deque
+
+from chatango.recorder import max_rss
+from chatango.room import Room
+from chatango.simulator import participants_frame
+from chatango.user import User
+
+from .bench_parsing import run_sync
+from .fixtures import participants
+
+
+def churn(names: int, concurrent: int) -> dict:
+    """
+    Create `names` unique users while a room keeps only the last `concurrent` of them referenced.
+
+    :returns: dict
+    """
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    room = deque(maxlen=concurrent)
+    for n in range(names):
+        room.append(User(f"churn{n}", puid=str(n), ip="10.0.0.1"))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {
+        "names": names,
+        "concurrent": concurrent,
+        "seconds": elapsed,
+        "interned_users": len(User._users),
+        "retained_bytes": after - before,
+        "peak_bytes": peak - before,
+    }
+    peak_rss = max_rss()
+    if peak_rss is not None:  # no `resource` module on Windows
+        result["max_rss_kib"] = peak_rss // 1024
+    return result
+
+
+def participant_memory(count: int) -> dict:
+    """
+    Bytes retained per user after a `g_participants` frame of `count` users.
+
+    :returns: dict
+    """
+    args = participants_frame(participants(count)).split(":")[1:]
+    room = Room("memoryroom")
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    run_sync(room._rcmd_g_participants(args))
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"participants": len(room._user_dict), "bytes_per_participant": (after - before) / count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="User registry memory churn benchmark.")
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--concurrent", type=int, default=2000)
+    parser.add_argument("--participants", type=int, default=2000)
+    args = parser.parse_args()
+    result = participant_memory(args.participants)
+    result.update(churn(args.names, args.concurrent))
+    for key, value in result.items():
+        print(f"{key:<22} {value:,.2f}" if isinstance(value, float) else f"{key:<22} {value:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmarks for message parsing, protocol handlers and event dispatch."""
+import asyncio
+
+from chatango.message import _process, _process_pm, mentions
+from chatango.pm import PM
+from chatango.room import Room
+from chatango.utils import _clean_message, _parseFont, _strip_html, get_anon_name, get_server
+
+from . import benchmark
+from .fixtures import (
+    ANON_MESSAGE_ARGS,
+    FONT_TAG,
+    PARTICIPANTS_200_ARGS,
+    PARTICIPANTS_2000_ARGS,
+    PM_MESSAGE_ARGS,
+    RAW_BODY,
+    ROOM_MESSAGE_ARGS,
+    ROOM_NAME,
+    STYLED_HTML,
+)
+
+
+def run_sync(coro):
+    """Drive a coroutine that never suspends without the event loop overhead."""
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError("benchmarked coroutine suspended")
+
+
+def populated_room(participants_args=PARTICIPANTS_200_ARGS) -> Room:
+    room = Room(ROOM_NAME)
+    room._correctiontime = 0
+    run_sync(room._rcmd_g_participants(list(participants_args)))
+    return room
+
+
+@benchmark("message._process")
+def bench_process():
+    room = populated_room()
+    return lambda: run_sync(_process(room, ROOM_MESSAGE_ARGS))
+
+
+@benchmark("message._process[anon]")
+def bench_process_anon():
+    room = populated_room()
+    return lambda: run_sync(_process(room, ANON_MESSAGE_ARGS))
+
+
+@benchmark("message._process_pm")
+def bench_process_pm():
+    pm = PM()
+    return lambda: run_sync(_process_pm(pm, PM_MESSAGE_ARGS))
+
+
+@benchmark("message.mentions")
+def bench_mentions():
+    room = populated_room()
+    body = "ping @benchuser12 and @benchuser150, also @nobody"
+    return lambda: mentions(body, room)
+
+
+@benchmark("utils._clean_message")
+def bench_clean_message():
+    return lambda: _clean_message(RAW_BODY)
+
+
+@benchmark("utils._strip_html")
+def bench_strip_html():
+    return lambda: _strip_html(STYLED_HTML)
+
+
+@benchmark("utils._parseFont")
+def bench_parse_font():
+    return lambda: _parseFont(FONT_TAG)
+
+
+@benchmark("utils.get_anon_name")
+def bench_get_anon_name():
+    return lambda: get_anon_name("1700000000.25", "53884120")
+
+
+@benchmark("utils.get_server")
+def bench_get_server():
+    names = [f"room-{n}" for n in range(64)] + ["pythonrpg", "animeultimacom"]
+
+    def op():
+        for name in names:
+            get_server(name)
+
+    return op
+
+
+@benchmark("room._rcmd_g_participants[2000]")
+def bench_g_participants():
+    room = Room(ROOM_NAME)
+    return lambda: run_sync(room._rcmd_g_participants(list(PARTICIPANTS_2000_ARGS)))
+
+
+class _Listener:
+    async def on_message(self, room, message):
+        pass
+
+    async def on_event(self, room, event, *args):
+        pass
+
+
+@benchmark("handler.call_event[10 listeners]")
+async def bench_call_event():
+    room = Room(ROOM_NAME)
+    for _ in range(10):
+        room.add_listener(_Listener())
+    message = run_sync(_process(populated_room(), ROOM_MESSAGE_ARGS))
+
+    async def cleanup():
+        tasks = room.tasks
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        tasks.clear()
+
+    return (lambda: room.call_event("message", message)), cleanup
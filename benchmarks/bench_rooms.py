@@ -0,0 +1,65 @@
+"""End-to-end websocket throughput of many rooms against the local simulator.
+
+Compare event loops with `python -m benchmarks -k simulator --loop uvloop`.
+"""
+import asyncio
+
+from chatango.room import Room
+from chatango.simulator import ChatangoSimulator, SimulationScript
+
+from . import benchmark
+
+ROOMS = 20
+MESSAGES = 10
+
+
+class _Counter:
+    """Listener resolving a future once every room has received its messages."""
+
+    def __init__(self):
+        self.expected = 0
+        self.received = 0
+        self.done = None
+
+    async def on_message(self, room, message):
+        self.received += 1
+        if self.received >= self.expected and self.done and not self.done.done():
+            self.done.set_result(None)
+
+
+@benchmark(f"simulator.rooms[{ROOMS} rooms x {MESSAGES} msgs]")
+async def bench_many_rooms():
+    script = SimulationScript(participants=20, message_rate=0, history=0, seed=1)
+    sim = ChatangoSimulator(script=script)
+    await sim.start()
+    counter = _Counter()
+    rooms = [Room(f"benchroom{n}", server=sim.host, port=sim.ws_port) for n in range(ROOMS)]
+    listeners = []
+    for room in rooms:
+        room.add_listener(counter)
+        listeners.append(asyncio.create_task(room.listen("benchbot", "password")))
+    while not all(room.user for room in rooms):
+        await asyncio.sleep(0.01)
+
+    async def op():
+        counter.received = 0
+        counter.expected = ROOMS * MESSAGES
+        counter.done = asyncio.get_running_loop().create_future()
+        for room in rooms:
+            for n in range(MESSAGES):
+                sim.post_message(room.name, f"message {n}")
+        await counter.done
+
+    async def cleanup():
+        for room in rooms:
+            tasks = room.tasks
+            await asyncio.gather(*tasks, return_exceptions=True)
+            tasks.clear()
+
+    async def teardown():
+        for room in rooms:
+            await room.disconnect()
+        await asyncio.gather(*listeners, return_exceptions=True)
+        await sim.stop()
+
+    return op, cleanup, teardown
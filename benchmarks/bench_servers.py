@@ -0,0 +1,41 @@
+"""Benchmarks for batch server lookup and room name hashing."""
+from chatango.hasher import Hasher, hash_many
+from chatango.utils import get_server, get_servers
+
+from . import benchmark
+
+ROOM_NAMES = [f"room-{n:05d}x{n % 97}" for n in range(5000)]
+
+
+@benchmark("utils.get_server[5000 cold]")
+def bench_get_server_cold():
+    def op():
+        get_server.cache_clear()
+        for name in ROOM_NAMES:
+            get_server(name)
+
+    return op
+
+
+@benchmark("utils.get_servers[5000 python]")
+def bench_get_servers_python():
+    def op():
+        get_server.cache_clear()
+        get_servers(ROOM_NAMES, use_numpy=False)
+
+    return op
+
+
+@benchmark("utils.get_servers[5000 numpy]")
+def bench_get_servers_numpy():
+    return lambda: get_servers(ROOM_NAMES, use_numpy=True)
+
+
+@benchmark("hasher.hash_many[5000]")
+def bench_hash_many():
+    return lambda: hash_many(ROOM_NAMES)
+
+
+@benchmark("hasher.Hasher.hash[5000 loop]")
+def bench_hash_loop():
+    return lambda: [Hasher().hash(name) for name in ROOM_NAMES]
@@ -0,0 +1,79 @@
+"""Cold import cost of the chatango package, each statement timed in a fresh interpreter.
+
+    python -m benchmarks.bench_startup --repeat 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = (
+    "import chatango",
+    "from chatango import User, Message",
+    "from chatango import Client",
+)
+
+_PROBE = """
+import json, sys, time, tracemalloc
+tracemalloc.start()
+modules = len(sys.modules)
+started = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "traced_bytes": tracemalloc.get_traced_memory()[0],
+    "modules": len(sys.modules) - modules,
+    "aiohttp": "aiohttp" in sys.modules,
+    "loguru": "loguru" in sys.modules,
+}}))
+"""
+
+
+def probe(statement: str) -> dict:
+    """
+    Time one import statement in a new interpreter rooted at the repository.
+
+    :returns: dict
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(statement=statement)],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def startup(statement: str, repeat: int) -> dict:
+    """Median of `repeat` cold imports."""
+    runs = [probe(statement) for _ in range(repeat)]
+    return {
+        "statement": statement,
+        "median_ms": statistics.median(run["seconds"] for run in runs) * 1000,
+        "traced_kib": statistics.median(run["traced_bytes"] for run in runs) / 1024,
+        "modules": runs[0]["modules"],
+        "aiohttp": runs[0]["aiohttp"],
+        "loguru": runs[0]["loguru"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Package import time benchmark.")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    print(f"{'statement':<38} {'median ms':>10} {'traced KiB':>11} {'modules':>8}  aiohttp loguru")
+    for statement in STATEMENTS:
+        r = startup(statement, args.repeat)
+        print(
+            f"{r['statement']:<38} {r['median_ms']:>10.1f} {r['traced_kib']:>11,.0f} {r['modules']:>8}"
+            f"  {str(r['aiohttp']):<7} {r['loguru']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Deterministic, realistic protocol frames for benchmarks."""
+import random
+
+from chatango.simulator import (
+    participants_frame,
+    pm_message_frame,
+    room_message_frame,
+)
+
+ROOM_NAME = "benchroom"
+MESSAGE_TIME = 1700000000.25
+
+_rng = random.Random(1234)
+
+
+def _args(frame: str) -> list:
+    """Split a frame the way `CommandHandler._receive_command` does and drop the action."""
+    return frame.split(":")[1:]
+
+
+ROOM_MESSAGE = room_message_frame(
+    MESSAGE_TIME,
+    "regularuser",
+    "hey @benchuser12 did you see the match last night? it was <b>wild</b> &amp; the ref was awful",
+    puid="53884120",
+    unid="8E4A1C2B0D9F3E77",
+    msgid="Xm3p",
+    ip="203.0.113.42",
+    flags=4 | 8,
+)
+ROOM_MESSAGE_ARGS = _args(ROOM_MESSAGE)
+
+ANON_MESSAGE = room_message_frame(
+    MESSAGE_TIME, "", "anyone here?", puid="20361742", unid="A1B2C3D4", msgid="Yq9z", ip="198.51.100.7"
+)
+ANON_MESSAGE_ARGS = _args(ANON_MESSAGE)
+
+PM_MESSAGE = pm_message_frame("regularuser", MESSAGE_TIME, 'hey, are you around later? <i s="sm://smile" />')
+PM_MESSAGE_ARGS = _args(PM_MESSAGE)
+
+RAW_BODY = ROOM_MESSAGE.split(":", 10)[10]
+STYLED_HTML = 'line one<br/>line <b>two</b> with <a href="http://example.com">a link</a> &amp; more<br>end'
+FONT_TAG = ' x11FF0000="1"'
+
+
+def participants(count: int, anon_ratio: float = 0.3) -> list:
+    """`(ssid, contime, puid, name, tname)` tuples for a room of `count` users."""
+    rows = []
+    for n in range(count):
+        ssid = str(200000 + n)
+        puid = str(30000000 + n)
+        contime = f"{MESSAGE_TIME - _rng.randint(0, 86400):.2f}"
+        if _rng.random() < anon_ratio:
+            rows.append((ssid, contime, puid, "None", "None"))
+        else:
+            rows.append((ssid, contime, puid, f"benchuser{n}", "None"))
+    return rows
+
+
+PARTICIPANTS_2000 = participants(2000)
+PARTICIPANTS_2000_ARGS = _args(participants_frame(PARTICIPANTS_2000))
+PARTICIPANTS_200_ARGS = _args(participants_frame(participants(200)))
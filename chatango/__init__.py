@@ -1,11 +1,69 @@
 """Chatango Async Library"""
-from .client import *
-from .room import *
-from .exceptions import *
-from .pm import *
-from .utils import *
-from .user import *
-from .message import *
-from .handler import *
+import importlib
 
 __version__ = "0.0.1"
+
+# Public names and the submodule defining them; submodules are imported on first access
+_EXPORTS = {
+    "client": ("Client", "ConnectionListener"),
+    "room": ("Connection", "Room", "RoomFlags"),
+    "exceptions": (
+        "AlreadyConnectedError",
+        "BaseRoomError",
+        "InvalidRoomNameError",
+        "NotConnectedError",
+        "OutboxOverflowError",
+    ),
+    "pm": ("PM", "PMHistory", "Socket"),
+    "utils": (
+        "gen_uid",
+        "get_aiohttp_session",
+        "get_anon_name",
+        "get_server",
+        "get_servers",
+        "get_token",
+        "group_by_server",
+        "http_get",
+        "http_get_conditional",
+        "make_requests",
+        "multipart",
+        "on_request_exception",
+        "public_attributes",
+        "session_get",
+        "specials",
+        "trace",
+        "tsweights",
+    ),
+    "user": ("AdminFlags", "Friend", "ModeratorFlags", "Styles", "User", "UserRegistry", "default_profile"),
+    "message": ("Channel", "Fonts", "Message", "MessageFlags", "PMMessage", "RoomMessage", "mentions", "message_cut"),
+    "handler": ("CommandHandler", "EventHandler", "ProtocolTrace", "TaskHandler"),
+    "analytics": ("RoomAnalytics",),
+    "archive": ("MessageArchive",),
+    "auth": ("TokenManager",),
+    "identity": ("IdentityIndex",),
+    "multi": ("MultiClient",),
+    "stream": ("EventStream", "StreamEvent"),
+    "profiles": ("ProfileCache",),
+    "search": ("SearchIndex", "SQLiteSearchIndex"),
+}
+_ORIGINS = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_ORIGINS)
+
+
+def __getattr__(name: str):
+    module = _ORIGINS.get(name)
+    if module is None:
+        try:
+            return importlib.import_module(f".{name}", __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
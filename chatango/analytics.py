@@ -0,0 +1,306 @@
+"""Columnar, NumPy backed store of per-message facts and user counts for room dashboards.
+
+NumPy is an optional dependency: importing this module raises ImportError without it.
+"""
+import csv
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MESSAGE_COLUMNS = (
+    ("time", np.float64),
+    ("room", np.uint32),
+    ("user", np.uint32),
+    ("length", np.uint32),
+    ("flags", np.uint32),
+)
+USER_COUNT_COLUMNS = (("time", np.float64), ("room", np.uint32), ("count", np.uint32))
+
+
+class Table:
+    """
+    Growable column arrays. Rows are buffered in a list and copied into the arrays a chunk at a time,
+    so appending a row costs a list append rather than one NumPy store per column.
+    """
+
+    def __init__(self, columns: Sequence[Tuple[str, type]], capacity: int = 4096, chunk: int = 1024):
+        self.chunk = chunk
+        self._columns = {name: np.empty(capacity, dtype) for name, dtype in columns}
+        self._size = 0
+        self._pending: List[tuple] = []
+
+    def __len__(self):
+        return self._size + len(self._pending)
+
+    def append(self, row: tuple):
+        self._pending.append(row)
+        if len(self._pending) >= self.chunk:
+            self.flush()
+
+    def _reserve(self, end: int):
+        """Grow every column, doubling, to hold at least `end` rows."""
+        capacity = len(next(iter(self._columns.values())))
+        if end > capacity:
+            capacity = max(capacity * 2, end)
+            for name, column in self._columns.items():
+                grown = np.empty(capacity, column.dtype)
+                grown[: self._size] = column[: self._size]
+                self._columns[name] = grown
+
+    def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        end = self._size + len(rows)
+        self._reserve(end)
+        for column, values in zip(self._columns.values(), zip(*rows)):
+            column[self._size : end] = values
+        self._size = end
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Read-only views of the filled part of every column."""
+        self.flush()
+        views = {}
+        for name, column in self._columns.items():
+            view = column[: self._size]
+            view.flags.writeable = False
+            views[name] = view
+        return views
+
+    def extend(self, columns: Dict[str, np.ndarray]):
+        """Append whole columns, e.g. loaded from an NPZ file."""
+        self.flush()
+        end = self._size + len(next(iter(columns.values())))
+        self._reserve(end)
+        for name, column in self._columns.items():
+            column[self._size : end] = columns[name]
+        self._size = end
+
+
+class RoomAnalytics:
+    """
+    Per-message facts (time, room, user, body length, flags) and sampled user counts, kept as NumPy
+    columns independent of the `Message` objects. Room and user names are interned to integer codes.
+    Queries are vectorized over the columns::
+
+        analytics = RoomAnalytics()
+        client = Client(username, password, rooms, analytics=analytics)
+        ...
+        starts, counts = analytics.histogram(60, room="pythonrpg", since=time.time() - 3600)
+        analytics.top_talkers(10)
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.messages = Table(MESSAGE_COLUMNS, capacity)
+        self.user_counts = Table(USER_COUNT_COLUMNS, 256)
+        self.rooms: List[str] = []
+        self.users: List[str] = []
+        self._room_codes: Dict[str, int] = {}
+        self._user_codes: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.messages)
+
+    @staticmethod
+    def _intern(name: str, names: List[str], codes: Dict[str, int]) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def room_code(self, name: str) -> int:
+        return self._intern(name, self.rooms, self._room_codes)
+
+    def user_code(self, name: str) -> int:
+        return self._intern(name.lower(), self.users, self._user_codes)
+
+    def add_message(self, msg):
+        """Record a `RoomMessage`."""
+        self.messages.append(
+            (
+                msg.time,
+                self.room_code(msg.room.name),
+                self.user_code(msg.user.name),
+                len(msg.body),
+                int(msg.flags),
+            )
+        )
+
+    def add_user_count(self, room: str, count: int, when: Optional[float] = None):
+        """Record a room's user count, as sent by the server on every change."""
+        self.user_counts.append((time.time() if when is None else when, self.room_code(room), count))
+
+    def _mask(self, columns: Dict[str, np.ndarray], room, user, since, until) -> Optional[np.ndarray]:
+        mask = None
+
+        def both(condition):
+            return condition if mask is None else mask & condition
+
+        for column, code in (
+            ("room", None if room is None else self._room_codes.get(room, -1)),
+            ("user", None if user is None else self._user_codes.get(user.lower(), -1)),
+        ):
+            if code == -1:  # never seen: nothing matches
+                mask = np.zeros(len(columns["time"]), bool)
+            elif code is not None:
+                mask = both(columns[column] == code)
+        if since is not None:
+            mask = both(columns["time"] >= since)
+        if until is not None:
+            mask = both(columns["time"] < until)
+        return mask
+
+    def select(
+        self,
+        room: Optional[str] = None,
+        user: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Message columns filtered by room, user and time range.
+
+        :returns: Dict of column name to array; unfiltered results are read-only views.
+        """
+        columns = self.messages.columns()
+        mask = self._mask(columns, room, user, since, until)
+        if mask is None:
+            return columns
+        return {name: column[mask] for name, column in columns.items()}
+
+    def histogram(
+        self,
+        bucket: float = 60.0,
+        room: Optional[str] = None,
+        user: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        weights: Optional[str] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Messages per `bucket` seconds, e.g. messages per minute.
+
+        :param str weights: Sum a column instead of counting, e.g. `length` for characters per bucket.
+
+        :returns: (bucket start times, counts or sums)
+        """
+        selected = self.select(room, user, since, until)
+        times = selected["time"]
+        if since is None and not len(times):
+            return np.empty(0), np.empty(0)
+        start = since if since is not None else np.floor(times.min() / bucket) * bucket
+        if until is not None:
+            bins = max(int(np.ceil((until - start) / bucket)), 0)
+        else:  # up to the bucket holding the last message
+            bins = int(((times.max() if len(times) else start) - start) // bucket) + 1
+        index = ((times - start) // bucket).astype(np.int64)
+        values = np.bincount(index, weights=selected[weights] if weights else None, minlength=bins)[:bins]
+        return start + np.arange(bins) * bucket, values
+
+    def rolling(
+        self,
+        window: float,
+        step: float = 60.0,
+        room: Optional[str] = None,
+        user: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        weights: Optional[str] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Trailing `window`-second sums sampled every `step` seconds, from a cumulative sum of the histogram.
+
+        :returns: (window end times, counts or sums)
+        """
+        starts, values = self.histogram(step, room, user, since, until, weights)
+        width = max(int(round(window / step)), 1)
+        totals = np.cumsum(values)
+        rolled = totals.copy()
+        rolled[width:] -= totals[:-width]
+        return starts + step, rolled
+
+    def top_talkers(
+        self,
+        n: int = 10,
+        room: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> List[Tuple[str, int]]:
+        """
+        Users with the most messages.
+
+        :returns: List of (user name, message count), busiest first.
+        """
+        users = self.select(room, None, since, until)["user"]
+        counts = np.bincount(users, minlength=len(self.users))
+        n = min(n, np.count_nonzero(counts))
+        if not n:
+            return []
+        top = np.argpartition(counts, -n)[-n:]
+        top = top[np.argsort(counts[top], kind="stable")[::-1]]
+        return [(self.users[code], int(counts[code])) for code in top]
+
+    def user_count_series(
+        self,
+        room: str,
+        bucket: Optional[float] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        A room's sampled user counts, or their mean per `bucket` seconds (NaN where nothing was sampled).
+
+        :returns: (times, counts)
+        """
+        columns = self.user_counts.columns()
+        mask = self._mask(columns, room, None, since, until)
+        times, counts = columns["time"][mask], columns["count"][mask]
+        if bucket is None or not len(times):
+            return times, counts
+        start = since if since is not None else np.floor(times.min() / bucket) * bucket
+        index = ((times - start) // bucket).astype(np.int64)
+        sums = np.bincount(index, weights=counts)
+        samples = np.bincount(index)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / samples
+        return start + np.arange(len(means)) * bucket, means
+
+    def to_csv(self, path: str, table: str = "messages"):
+        """Write `messages` or `user_counts` as CSV, with room and user names instead of codes."""
+        columns = (self.messages if table == "messages" else self.user_counts).columns()
+        names = list(columns)
+        decoded = []
+        for name in names:
+            values = columns[name].tolist()
+            if name == "room":
+                values = [self.rooms[code] for code in values]
+            elif name == "user":
+                values = [self.users[code] for code in values]
+            decoded.append(values)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            writer.writerows(zip(*decoded))
+
+    def save_npz(self, path: str):
+        """Write both tables and the name tables to one compressed NPZ file."""
+        arrays = {f"messages_{name}": column for name, column in self.messages.columns().items()}
+        arrays.update({f"user_counts_{name}": column for name, column in self.user_counts.columns().items()})
+        np.savez_compressed(
+            path, rooms=np.array(self.rooms, dtype=str), users=np.array(self.users, dtype=str), **arrays
+        )
+
+    @classmethod
+    def load_npz(cls, path: str) -> "RoomAnalytics":
+        """Read a file written by `save_npz`."""
+        analytics = cls()
+        with np.load(path) as data:
+            for name in data["rooms"].tolist():
+                analytics.room_code(name)
+            for name in data["users"].tolist():
+                analytics.user_code(name)
+            analytics.messages.extend({name: data[f"messages_{name}"] for name, _ in MESSAGE_COLUMNS})
+            analytics.user_counts.extend({name: data[f"user_counts_{name}"] for name, _ in USER_COUNT_COLUMNS})
+        return analytics
@@ -0,0 +1,534 @@
+"""Append-only on-disk archive of room & PM messages, with memory-mapped time indexes."""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# One index entry per record: index time, byte offset & length in the log, message id (NUL padded)
+INDEX_ENTRY = struct.Struct("<dQI20s")
+_TIME = struct.Struct("<d")
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def message_record(msg) -> dict:
+    """Plain dict snapshot of a `RoomMessage` or `PMMessage`, as stored in the archive."""
+    record = {
+        "id": getattr(msg, "id", None),
+        "time": msg.time,
+        "user": msg.user.name if msg.user else None,
+        "body": msg.body,
+        "raw": msg.raw,
+    }
+    if hasattr(msg, "ip"):
+        record.update(ip=msg.ip, unid=msg.unid, puid=msg.puid, flags=int(msg.flags))
+    else:
+        record["offline"] = bool(getattr(msg, "_offline", False))
+    return record
+
+
+class Segment:
+    """
+    One `<seq>.log` / `<seq>.idx` pair. Both files are memory-mapped for reading and remapped when
+    they have grown since the last read.
+    """
+
+    def __init__(self, directory: str, seq: int):
+        self.seq = seq
+        self.log_path = os.path.join(directory, f"{seq:010d}.log")
+        self.idx_path = os.path.join(directory, f"{seq:010d}.idx")
+        self._log_map = None
+        self._idx_map = None
+        self._log_mapped = 0
+        self._idx_mapped = 0
+
+    def __len__(self):
+        return self.index_size() // INDEX_ENTRY.size
+
+    def __repr__(self):
+        return f"<Segment {self.seq} {len(self)} records>"
+
+    def index_size(self) -> int:
+        try:
+            return os.path.getsize(self.idx_path)
+        except FileNotFoundError:
+            return 0
+
+    def log_size(self) -> int:
+        try:
+            return os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _map(path: str, size: int):
+        if not size:
+            return None
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+    def _maps(self):
+        # Old maps are dropped, not closed: memoryviews handed out by `scan` keep them alive
+        idx_size = self.index_size() // INDEX_ENTRY.size * INDEX_ENTRY.size
+        if idx_size != self._idx_mapped:
+            self._idx_map, self._idx_mapped = self._map(self.idx_path, idx_size), idx_size
+        log_size = self.log_size()
+        if log_size != self._log_mapped:
+            self._log_map, self._log_mapped = self._map(self.log_path, log_size), log_size
+        return self._idx_map, self._log_map, idx_size // INDEX_ENTRY.size
+
+    def entry(self, i: int) -> Tuple[float, int, int, str]:
+        """(time, offset, length, message id) of the i-th record."""
+        idx, _, count = self._maps()
+        if not 0 <= i < count:
+            raise IndexError(i)
+        t, offset, length, msgid = INDEX_ENTRY.unpack_from(idx, i * INDEX_ENTRY.size)
+        return t, offset, length, msgid.rstrip(b"\0").decode()
+
+    def time_range(self) -> Optional[Tuple[float, float]]:
+        idx, _, count = self._maps()
+        if not count:
+            return None
+        return _TIME.unpack_from(idx, 0)[0], _TIME.unpack_from(idx, (count - 1) * INDEX_ENTRY.size)[0]
+
+    def _bisect(self, idx, count: int, t: float) -> int:
+        """First record with index time >= t; binary search straight over the mapped index."""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _TIME.unpack_from(idx, mid * INDEX_ENTRY.size)[0] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def scan(
+        self, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Iterator[Tuple[float, str, memoryview]]:
+        """
+        Records with `start <= time < end` as `(time, message id, memoryview)`; the views point into
+        the mapped log, nothing is copied.
+        """
+        idx, log, count = self._maps()
+        if not count:
+            return
+        i = self._bisect(idx, count, start) if start is not None else 0
+        view = memoryview(log)
+        for i in range(i, count):
+            t, offset, length, msgid = INDEX_ENTRY.unpack_from(idx, i * INDEX_ENTRY.size)
+            if end is not None and t >= end:
+                break
+            if offset + length > len(view):
+                break  # written after the log was mapped; picked up by the next scan
+            yield t, msgid.rstrip(b"\0").decode(), view[offset : offset + length]
+
+    def find(self, msgid: str) -> Optional[int]:
+        """Position of a message id, found with `mmap.find` over the index rather than a decoding loop."""
+        idx, _, count = self._maps()
+        if not count:
+            return None
+        needle = msgid.encode()[:20].ljust(20, b"\0")
+        id_offset = INDEX_ENTRY.size - 20
+        pos = idx.find(needle)
+        while pos != -1:
+            if pos % INDEX_ENTRY.size == id_offset:
+                return pos // INDEX_ENTRY.size
+            pos = idx.find(needle, pos + 1)
+        return None
+
+    def remove(self):
+        for path in (self.log_path, self.idx_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class Channel:
+    """Segments of one room (or one account's PMs); only the last segment is appended to."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        seqs = sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith(".idx"))
+        self.segments: List[Segment] = [Segment(directory, seq) for seq in seqs]
+        self.last_time = 0.0
+        self._log = None
+        self._idx = None
+        self._active_size = 0
+        self._active_first = None
+        if self.segments:
+            self._recover(self.segments[-1])
+
+    def _recover(self, segment: Segment):
+        """Drop a torn tail left by a crash: partial index entries and log bytes no entry points to."""
+        count = segment.index_size() // INDEX_ENTRY.size
+        log_size = segment.log_size()
+        end = 0
+        with open(segment.idx_path, "rb") as f:
+            data = f.read(count * INDEX_ENTRY.size)
+        valid = 0
+        for i in range(count):
+            t, offset, length, _ = INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size)
+            if offset + length > log_size:
+                break
+            valid, end = i + 1, offset + length
+            self.last_time = max(self.last_time, t)
+            if i == 0:
+                self._active_first = t
+        os.truncate(segment.idx_path, valid * INDEX_ENTRY.size)
+        if os.path.exists(segment.log_path):
+            os.truncate(segment.log_path, end)
+        self._active_size = end
+
+    def _open_active(self):
+        if not self.segments:
+            self.segments.append(Segment(self.directory, 0))
+        segment = self.segments[-1]
+        self._log = open(segment.log_path, "ab")
+        self._idx = open(segment.idx_path, "ab")
+
+    def close_active(self):
+        for f in (self._log, self._idx):
+            if f:
+                f.close()
+        self._log = self._idx = None
+
+    def rotate(self):
+        self.close_active()
+        seq = self.segments[-1].seq + 1 if self.segments else 0
+        self.segments.append(Segment(self.directory, seq))
+        self._active_size = 0
+        self._active_first = None
+
+    def write(self, records: List[Tuple[float, str, bytes]], segment_bytes: int, segment_seconds: float):
+        """
+        Append encoded records, rotating by size or age; one write per file per segment.
+
+        Records are removed from `records` once they are on disk. A failed write is truncated away and
+        re-raised, leaving the records still to be written in the list.
+        """
+        while records:
+            # Offsets and times are built on local counters and only kept once both files are written
+            size, last_time, first = self._active_size, self.last_time, self._active_first
+            log_chunk, idx_chunk = bytearray(), bytearray()
+            count = 0
+            for t, msgid, data in records:
+                # Index times never go backwards, so segments stay bisectable; the record keeps the real time
+                t = max(t, last_time)
+                if first is not None and (size + len(data) > segment_bytes or t - first >= segment_seconds):
+                    break
+                if first is None:
+                    first = t
+                idx_chunk += INDEX_ENTRY.pack(t, size, len(data), msgid.encode()[:20])
+                log_chunk += data
+                size += len(data)
+                last_time = t
+                count += 1
+            if not count:
+                self.rotate()
+                continue
+            self._append(log_chunk, idx_chunk)
+            self._active_size, self.last_time, self._active_first = size, last_time, first
+            del records[:count]
+
+    def _append(self, log_chunk: bytearray, idx_chunk: bytearray):
+        if self._log is None:
+            self._open_active()
+        segment = self.segments[-1]
+        idx_size = segment.index_size()
+        try:
+            # Log first: an index entry is only ever written after the bytes it points to
+            self._log.write(log_chunk)
+            self._log.flush()
+            self._idx.write(idx_chunk)
+            self._idx.flush()
+        except BaseException:
+            self._rollback(segment, self._active_size, idx_size)
+            raise
+
+    def _rollback(self, segment: Segment, log_size: int, idx_size: int):
+        """Cut both files back to their last committed sizes after a failed or partial write."""
+        for f in (self._log, self._idx):
+            try:
+                f.close()  # flushing what is left in the buffer may fail again
+            except OSError:
+                pass
+        self._log = self._idx = None
+        os.truncate(segment.log_path, log_size)
+        os.truncate(segment.idx_path, idx_size)
+
+
+class MessageArchive:
+    """
+    Append-only archive of every live `RoomMessage` & `PMMessage`, one directory per room.
+
+    Each channel is a sequence of segments: a `.log` of JSON lines plus a `.idx` of fixed-width
+    `INDEX_ENTRY` records, memory-mapped on read so time ranges are found by binary search and record
+    bytes are returned as views into the map. Messages are queued on the event loop and written in
+    batches from the default executor, so a busy room never waits on the disk::
+
+        archive = MessageArchive("archive/")
+        client = Client(username, password, rooms, archive=archive)
+        ...
+        for record in archive.read("pythonrpg", start=time.time() - 3600):
+            print(record["user"], record["body"])
+        await archive.close()
+
+    :param str directory: Root directory; created when missing.
+    :param int segment_bytes: Log size after which a new segment is started.
+    :param float segment_seconds: Age after which a new segment is started, so old days can be dropped whole.
+    :param float retention: Seconds of history kept by `compact`; None keeps everything.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        segment_seconds: float = 86400.0,
+        retention: Optional[float] = None,
+        flush_interval: float = 1.0,
+        batch_size: int = 1000,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.written = 0
+        os.makedirs(directory, exist_ok=True)
+        self._channels: Dict[str, Channel] = {}
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, float, str, dict]] = []
+        self._flushing: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def __repr__(self):
+        return f"<MessageArchive {self.directory}>"
+
+    def _channel(self, name: str) -> Channel:
+        channel = self._channels.get(name)
+        if channel is None:
+            self._check_channel(name)
+            channel = self._channels[name] = Channel(os.path.join(self.directory, name))
+        return channel
+
+    @staticmethod
+    def _check_channel(name: str):
+        if not name or name.startswith(".") or os.sep in name:
+            raise ValueError(f"Invalid archive channel {name!r}")
+
+    def channels(self) -> List[str]:
+        """Every channel on disk."""
+        return sorted(name for name in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, name)))
+
+    def append(self, msg, channel: Optional[str] = None):
+        """
+        Queue a message; it is written by the background flush task.
+
+        :param msg: `RoomMessage` or `PMMessage`.
+        :param str channel: Defaults to the name of the message's room.
+        """
+        channel = channel or msg.room.name
+        self._check_channel(channel)
+        self._pending.append((channel, msg.time, str(getattr(msg, "id", None) or ""), message_record(msg)))
+        self._ensure_flusher()
+        if len(self._pending) >= self.batch_size and self._wakeup:
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return  # no loop yet; flushed on the next append from a loop, or by close()
+            self._wakeup = asyncio.Event()
+            self._flush_task = loop.create_task(self._flush_forever())
+
+    def _write(self, rows: List[Tuple[str, float, str, dict]]) -> Tuple[list, Optional[Exception]]:
+        """
+        Write queued rows grouped by channel.
+
+        :returns: (rows not written, in queue order; the first error)
+        """
+        by_channel: Dict[str, Tuple[list, List[Tuple[float, str, bytes]]]] = {}
+        for row in rows:
+            name, t, msgid, record = row
+            data = (_ENCODER.encode(record) + "\n").encode()
+            channel_rows, records = by_channel.setdefault(name, ([], []))
+            channel_rows.append(row)
+            records.append((t, msgid, data))
+        unwritten, error = [], None
+        with self._lock:
+            for name, (channel_rows, records) in by_channel.items():
+                try:
+                    self._channel(name).write(records, self.segment_bytes, self.segment_seconds)
+                except Exception as e:  # pylint: disable=broad-except
+                    error = error or e
+                unwritten.extend(channel_rows[len(channel_rows) - len(records) :])
+        self.written += len(rows) - len(unwritten)
+        if unwritten:
+            order = {id(row): i for i, row in enumerate(rows)}
+            unwritten.sort(key=lambda row: order[id(row)])
+        return unwritten, error
+
+    async def flush(self):
+        """
+        Write all queued messages now. When the disk write fails, the messages not written are queued
+        again ahead of newer ones and the error is logged and raised.
+        """
+        if self._flushing is None:
+            self._flushing = asyncio.Lock()
+        async with self._flushing:  # batches must reach the disk in order
+            rows, self._pending = self._pending, []
+            if not rows:
+                return
+            unwritten, error = await asyncio.get_running_loop().run_in_executor(None, self._write, rows)
+            if unwritten:
+                self._pending[:0] = unwritten
+                logger.error("Archive write failed, %d messages queued again: %r", len(unwritten), error)
+            if error:
+                raise error
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:  # pylint: disable=broad-except
+                pass  # logged by flush; retried on the next interval
+
+    def segments(self, channel: str) -> List[Segment]:
+        with self._lock:
+            return list(self._channel(channel).segments)
+
+    def raw(
+        self, channel: str, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Iterator[Tuple[float, str, memoryview]]:
+        """
+        Zero-copy scan: `(time, message id, memoryview of the JSON line)` for `start <= time < end`.
+
+        Only messages already flushed are seen. Segments entirely outside the range are skipped using
+        their first and last index times.
+        """
+        for segment in self.segments(channel):
+            bounds = segment.time_range()
+            if bounds is None or (start is not None and bounds[1] < start) or (end is not None and bounds[0] >= end):
+                continue
+            yield from segment.scan(start, end)
+
+    def read(
+        self, channel: str, start: Optional[float] = None, end: Optional[float] = None, limit: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Decoded records of a time range, oldest first.
+
+        :returns: List[dict] as built by `message_record`.
+        """
+        records = []
+        for _, _, view in self.raw(channel, start, end):
+            records.append(json.loads(bytes(view)))
+            if limit and len(records) >= limit:
+                break
+        return records
+
+    def get(self, channel: str, msgid: str) -> Optional[dict]:
+        """A single archived record by message id, searching the newest segments first."""
+        for segment in reversed(self.segments(channel)):
+            i = segment.find(msgid)
+            if i is not None:
+                _, offset, length, _ = segment.entry(i)
+                return json.loads(segment._maps()[1][offset : offset + length])
+        return None
+
+    def _compact(self, channel: str, now: float) -> int:
+        with self._lock:
+            archive_channel = self._channel(channel)
+            sealed, active = archive_channel.segments[:-1], archive_channel.segments[-1:]
+            removed = 0
+            kept = []
+            for segment in sealed:
+                bounds = segment.time_range()
+                if bounds is None or (self.retention is not None and bounds[1] < now - self.retention):
+                    segment.remove()
+                    removed += 1
+                else:
+                    kept.append(segment)
+            # Merge runs of small sealed segments into the first of each run
+            merged: List[Segment] = []
+            run: List[Segment] = []
+            size = 0
+            for segment in kept + [None]:
+                if segment is not None and size + segment.log_size() <= self.segment_bytes:
+                    run.append(segment)
+                    size += segment.log_size()
+                    continue
+                if len(run) > 1:
+                    self._merge(run)
+                    removed += len(run) - 1
+                merged.extend(run[:1])
+                run, size = ([segment], segment.log_size()) if segment is not None else ([], 0)
+            archive_channel.segments = merged + active
+            return removed
+
+    @staticmethod
+    def _merge(run: List[Segment]):
+        target = run[0]
+        log_tmp, idx_tmp = target.log_path + ".tmp", target.idx_path + ".tmp"
+        offset = 0
+        with open(log_tmp, "wb") as log, open(idx_tmp, "wb") as idx:
+            for segment in run:
+                for t, msgid, view in segment.scan():
+                    log.write(view)
+                    idx.write(INDEX_ENTRY.pack(t, offset, len(view), msgid.encode()))
+                    offset += len(view)
+        os.replace(log_tmp, target.log_path)
+        os.replace(idx_tmp, target.idx_path)
+        target._idx_mapped = target._log_mapped = -1
+        for segment in run[1:]:
+            segment.remove()
+
+    async def compact(self, channel: Optional[str] = None) -> int:
+        """
+        Drop sealed segments older than `retention` and merge consecutive small sealed segments, in
+        the default executor. The segment being appended to is never touched.
+
+        :param str channel: One channel, or every channel when None.
+
+        :returns: int, segments removed.
+        """
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        now = time.time()
+        removed = 0
+        for name in [channel] if channel else self.channels():
+            removed += await loop.run_in_executor(None, self._compact, name, now)
+        return removed
+
+    async def close(self):
+        """Stop the flush task, write queued messages and close the open segment files."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        try:
+            await self.flush()
+        finally:
+            with self._lock:
+                for channel in self._channels.values():
+                    channel.close_active()
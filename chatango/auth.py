@@ -0,0 +1,162 @@
+"""Login token cache shared by every PM connection in the process."""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .utils import get_token
+
+# Chatango auth cookies are long lived; tokens are only dropped early when the server refuses them
+DEFAULT_TOKEN_TTL = 14 * 24 * 3600
+
+
+class TokenManager:
+    """
+    Cache of `auth.chatango.com` tokens keyed by `(login url, user name)`.
+
+    Tokens are kept in memory and, when `path` is given, in a JSON file readable only by the owner,
+    so restarts reuse them. Concurrent logins of the same account share one request. A token is
+    reused until it expires or `invalidate` is called, which PM does on `DENIED` and `kickingoff`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = DEFAULT_TOKEN_TTL,
+        login: Callable[..., Awaitable[Optional[str]]] = get_token,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.login = login
+        self.logins = 0
+        self._tokens: Optional[Dict[Tuple[str, str], Tuple[str, float]]] = None
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._saving: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    def _key(user_name: str, login_url: str) -> Tuple[str, str]:
+        return login_url, str(user_name).lower()
+
+    @property
+    def tokens(self) -> Dict[Tuple[str, str], Tuple[str, float]]:
+        """Cached tokens; read from `path` on first use, synchronously unless `get` loaded them already."""
+        if self._tokens is None:
+            self._tokens = self._load()
+        return self._tokens
+
+    async def _ensure_loaded(self):
+        if self._tokens is None:
+            tokens = await asyncio.get_running_loop().run_in_executor(None, self._load)
+            if self._tokens is None:  # another caller may have loaded them meanwhile
+                self._tokens = tokens
+
+    def _load(self) -> Dict[Tuple[str, str], Tuple[str, float]]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        now = time.time()
+        return {
+            (entry["login_url"], entry["user"]): (entry["token"], entry["expires"])
+            for entry in entries
+            if entry.get("expires", 0) > now
+        }
+
+    def _save(self, tokens: Dict[Tuple[str, str], Tuple[str, float]]):
+        entries = [
+            {"login_url": login_url, "user": user, "token": token, "expires": expires}
+            for (login_url, user), (token, expires) in tokens.items()
+        ]
+        # A unique file next to the target, created 0600, so the rename stays atomic and owner only
+        directory, name = os.path.split(self.path)
+        fd, tmp = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory or ".")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    async def _persist(self):
+        if not self.path:
+            return
+        if self._saving is None:
+            self._saving = asyncio.Lock()
+        # One save at a time, each writing the tokens as they are when it starts, so the newest wins
+        async with self._saving:
+            await asyncio.get_running_loop().run_in_executor(None, self._save, dict(self.tokens))
+
+    def peek(self, user_name: str, login_url: str = "http://chatango.com/login") -> Optional[str]:
+        """Cached token if present and unexpired, without logging in."""
+        entry = self.tokens.get(self._key(user_name, login_url))
+        if entry and entry[1] > time.time():
+            return entry[0]
+        return None
+
+    async def get(self, user_name: str, password: str, login_url: str = "http://chatango.com/login") -> Optional[str]:
+        """
+        Token for an account, logging in only when none is cached.
+
+        :param str user_name: Chatango account name.
+        :param str password: Account password, used only on a login.
+        :param str login_url: Login endpoint.
+
+        :returns: Optional[str] None when the login is refused.
+        """
+        await self._ensure_loaded()
+        token = self.peek(user_name, login_url)
+        if token:
+            return token
+        key = self._key(user_name, login_url)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            self.logins += 1
+            token = await self.login(user_name, password, login_url=login_url)
+            if token:
+                self.tokens[key] = (token, time.time() + self.ttl)
+                await self._persist()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            future.set_result(token)
+            return token
+        finally:
+            self._inflight.pop(key, None)
+
+    async def invalidate(self, user_name: str, login_url: str = "http://chatango.com/login"):
+        """Forget a token the server refused, so the next `get` logs in again."""
+        await self._ensure_loaded()
+        if self.tokens.pop(self._key(user_name, login_url), None):
+            await self._persist()
+
+
+_token_manager = None
+
+
+def get_token_manager() -> TokenManager:
+    global _token_manager
+    if _token_manager is None:
+        _token_manager = TokenManager()
+    return _token_manager
+
+
+def set_token_manager(manager: TokenManager):
+    """Replace the process-wide manager used by `PM` connections."""
+    global _token_manager
+    _token_manager = manager
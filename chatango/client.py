@@ -1,13 +1,41 @@
 """Top-level Chatango client event-handler."""
 import asyncio
-from typing import Dict, List, Optional
+import inspect
+import logging
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Union
 
+from .auth import TokenManager
 from .pm import PM
 from .room import Room
 from .handler import TaskHandler
-from .utils import public_attributes
-
-from logger import LOGGER
+from .prefetch import PrefetchProgress, prefetch_profiles
+from .profiles import get_profile_cache
+from .runner import run as run_loop
+from .stream import EventStream
+from .utils import get_server, public_attributes
+
+if TYPE_CHECKING:
+    from .analytics import RoomAnalytics
+    from .archive import MessageArchive
+    from .identity import IdentityIndex
+    from .profile_store import SQLiteProfileStore
+    from .search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _changed_options(base, **options) -> dict:
+    """
+    Keyword arguments that differ from the defaults of `base.__init__`, so `room_class` and `pm_class`
+    subclasses keeping a narrower constructor, e.g. `__init__(self, name)`, work until a feature needs them.
+    """
+    parameters = inspect.signature(base.__init__).parameters
+    changed = {}
+    for key, value in options.items():
+        default = parameters[key].default
+        if value is not default and value != default:
+            changed[key] = value
+    return changed
 
 
 class ConnectionListener:
@@ -32,9 +60,37 @@ class Client(TaskHandler):
         pm: bool = False,
         room_class=Room,
         pm_class=PM,
+        server_resolver: Callable[[str], str] = get_server,
+        room_port: int = 8080,
+        pm_server: str = "c1.chatango.com",
+        pm_port: int = 443,
+        login_url: str = "http://chatango.com/login",
+        auto_prefetch: bool = False,
+        prefetch_concurrency: int = 8,
+        token_manager: Optional[TokenManager] = None,
+        archive: Optional["MessageArchive"] = None,
+        search_index: Optional["SearchIndex"] = None,
+        identity_index: Optional["IdentityIndex"] = None,
+        analytics: Optional["RoomAnalytics"] = None,
+        profile_store: Union[str, "SQLiteProfileStore", None] = None,
     ):
         self._room_class = room_class
         self._pm_class = pm_class
+        self.server_resolver = server_resolver
+        self.room_port = room_port
+        self.pm_server = pm_server
+        self.pm_port = pm_port
+        self.login_url = login_url
+        self.auto_prefetch = auto_prefetch
+        self.prefetch_concurrency = prefetch_concurrency
+        self.token_manager = token_manager
+        self.archive = archive
+        self.search_index = search_index
+        self.identity_index = identity_index
+        self.analytics = analytics
+        # SQLite file path or store backing the process-wide profile cache, attached by `run`
+        self.profile_store = profile_store
+        self._streams: List[EventStream] = []
         self.running = False
         self.rooms: Dict[str, Room] = {}
         self.pm: Optional[PM] = None
@@ -52,11 +108,23 @@ class Client(TaskHandler):
         """Timeout for connection check in seconds."""
         return 5
 
+    def _attach_profile_store(self) -> Optional["SQLiteProfileStore"]:
+        """Back the process-wide profile cache with `profile_store`, unless it already has a store."""
+        cache = get_profile_cache()
+        if self.profile_store is not None and cache.store is None:
+            if isinstance(self.profile_store, str):
+                from .profile_store import SQLiteProfileStore
+
+                self.profile_store = SQLiteProfileStore(self.profile_store)
+            cache.store = self.profile_store
+        return cache.store if self.profile_store is not None else None
+
     async def run(self, *, forever=False):
         self.running = True
+        store = self._attach_profile_store()
 
         if not forever and not self.use_pm and not self.initial_rooms:
-            LOGGER.error("No rooms or PM to join. Exiting.")
+            logger.error("No rooms or PM to join. Exiting.")
             return
 
         if self.use_pm:
@@ -67,14 +135,47 @@ class Client(TaskHandler):
 
         self.add_task(self.confirm_connected())
 
-        if forever:
-            await self.task_loop
-        else:
-            await self.complete_tasks()
-        self.running = False
+        try:
+            if forever:
+                await self.task_loop
+            else:
+                await self.complete_tasks()
+        finally:
+            self.running = False
+            if store is not None:
+                await store.flush()
+
+    def start(
+        self,
+        *,
+        forever=False,
+        use_uvloop: Optional[bool] = None,
+        loop_factory: Optional[Callable[[], asyncio.AbstractEventLoop]] = None,
+        debug: bool = False,
+        slow_callback_duration: Optional[float] = None,
+        executor_workers: Optional[int] = None,
+    ):
+        """
+        Blocking entry point: run the client on a new event loop built by `chatango.runner`.
+
+        :param bool forever: Keep running after the initial rooms & PM have finished.
+        :param Optional[bool] use_uvloop: True requires uvloop, None uses it if installed, False never does.
+        :param Callable loop_factory: Zero-argument callable returning the loop to use instead.
+        :param bool debug: Enable asyncio debug mode.
+        :param float slow_callback_duration: Seconds after which debug mode logs a callback as slow.
+        :param int executor_workers: Threads of the loop's default executor.
+        """
+        return run_loop(
+            self.run(forever=forever),
+            use_uvloop=use_uvloop,
+            loop_factory=loop_factory,
+            debug=debug,
+            slow_callback_duration=slow_callback_duration,
+            executor_workers=executor_workers,
+        )
 
     async def on_connect(self, room: Room):
-        LOGGER.info(f"Connected to {room}")
+        logger.info(f"Connected to {room}")
         await room.send_message("Beep boop I'm dead inside 🤖", use_html=True)
 
     async def on_start(self):
@@ -84,25 +185,69 @@ class Client(TaskHandler):
                 task = room.join(room)
                 await asyncio.ensure_future(task)
             await asyncio.gather(*asyncio.all_tasks() - {asyncio.current_task()})
-            LOGGER.info(f"Bot successfully joined all rooms: {' ,'.join(self.rooms)}")
+            logger.info(f"Bot successfully joined all rooms: {' ,'.join(self.rooms)}")
 
     def join_pm(self):
         if not self.username or not self.password:
-            LOGGER.error("PM requires username and password.")
+            logger.error("PM requires username and password.")
             return
 
         self.add_task(self._watch_pm())
 
     async def _watch_pm(self):
         if self._pm_class is PM or issubclass(self._pm_class, PM):
-            pm = self._pm_class()
+            pm = self._pm_class(
+                **_changed_options(
+                    PM,
+                    server=self.pm_server,
+                    port=self.pm_port,
+                    login_url=self.login_url,
+                    token_manager=self.token_manager,
+                    archive=self.archive,
+                )
+            )
             pm.add_listener(self)
+            self._attach_streams(pm)
             self.pm = pm
             await pm.listen(self.username, self.password, reconnect=True)
             self.pm = None
         else:
             raise TypeError("Client: custom PM class does not inherit from PM")
 
+    def stream(self, events=None, maxsize: int = 1000, overflow: str = "block") -> EventStream:
+        """
+        Async iterator over the events of every room & the PM, including ones joined later.
+
+        Items are `StreamEvent(source, event, args)`; see `EventHandler.stream` for the parameters.
+
+        :returns: EventStream
+        """
+        stream = EventStream(events, maxsize, overflow)
+        self._streams.append(stream)
+        for room in list(self.rooms.values()):
+            stream.attach(room)
+        if self.pm:
+            stream.attach(self.pm)
+        return stream
+
+    def _attach_streams(self, source):
+        self._streams = [stream for stream in self._streams if not stream.closed]
+        for stream in self._streams:
+            stream.attach(source)
+
+    async def prefetch_profiles(
+        self,
+        concurrency: Optional[int] = None,
+        progress: Optional[Callable[[PrefetchProgress], None]] = None,
+    ) -> PrefetchProgress:
+        """
+        Warm styles & profiles of the participants of every joined room, recently active users first.
+
+        :returns: PrefetchProgress
+        """
+        users = [user for room in list(self.rooms.values()) for user in room.recently_active_users()]
+        return await prefetch_profiles(users, concurrency or self.prefetch_concurrency, progress)
+
     def leave_pm(self):
         if self.pm:
             self.add_task(self.pm.disconnect())
@@ -110,7 +255,7 @@ class Client(TaskHandler):
     def join_room(self, room_name: str):
         Room.assert_valid_name(room_name)
         if room_name in self.rooms:
-            LOGGER.error(f"Already joined room {room_name}")
+            logger.error(f"Already joined room {room_name}")
             # Attempt to reconnect existing room?
             return
 
@@ -118,13 +263,29 @@ class Client(TaskHandler):
 
     async def _watch_room(self, room_name: str):
         if self._room_class is Room or issubclass(self._room_class, Room):
-            room = self._room_class(room_name)
+            room = self._room_class(
+                room_name,
+                **_changed_options(
+                    Room,
+                    server=None if self.server_resolver is get_server else self.server_resolver(room_name),
+                    port=self.room_port,
+                    auto_prefetch=self.auto_prefetch,
+                    prefetch_concurrency=self.prefetch_concurrency,
+                    archive=self.archive,
+                    search_index=self.search_index,
+                    identity_index=self.identity_index,
+                    analytics=self.analytics,
+                ),
+            )
             room.add_listener(self)
             room.add_listener(ConnectionListener(self))
+            self._attach_streams(room)
             self.rooms[room_name] = room
             await room.listen(self.username, self.password, reconnect=True)
             # Client level reconnect?
             self.rooms.pop(room_name, None)
+            if self.search_index is not None:
+                self.search_index.discard_room(room)
         else:
             raise TypeError("Client: custom room class does not inherit from Room")
 
@@ -152,7 +313,7 @@ class Client(TaskHandler):
             await asyncio.wait_for(self.connection_checker(), timeout=self.connection_check_timeout)
         except asyncio.TimeoutError:
             problem_rooms = set(self.initial_rooms) - set(self.initial_rooms_connected)
-            LOGGER.error(f"Failed to connect: {', '.join(problem_rooms)}")
+            logger.error(f"Failed to connect: {', '.join(problem_rooms)}")
             self.add_task(self.on_started())
 
     async def on_started(self):
@@ -27,3 +27,13 @@ class InvalidRoomNameError(BaseRoomError):
     """Raised when attempting to connect to a room with an invalid name."""
 
     pass
+
+
+class OutboxOverflowError(Exception):
+    """Raised for a queued PM dropped because the outbound backlog was full."""
+
+    target: str
+
+    def __init__(self, target: str):
+        super().__init__(target)
+        self.target = target
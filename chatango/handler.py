@@ -4,10 +4,11 @@ import asyncio
 import logging
 import traceback
 from collections.abc import Iterable
-from typing import Coroutine
+from typing import Coroutine, Optional
 
 
 logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("chatango.trace")
 
 
 class TaskHandler:
@@ -91,6 +92,9 @@ class TaskHandler:
 class EventHandler(TaskHandler):
     """Handler for events and listeners."""
 
+    _streams = ()
+    _streams_released: Optional[asyncio.Future] = None
+
     def __init__(self):
         super().__init__()
         self._listeners = set()
@@ -106,10 +110,63 @@ class EventHandler(TaskHandler):
         """Add a listener for our events"""
         self.listeners.add(listener)
 
+    def add_stream(self, stream):
+        """Push our events into an `EventStream`, see `chatango.stream`."""
+        if not self._streams:
+            self._streams = []
+        self._streams.append(stream)
+
+    def remove_stream(self, stream):
+        if stream in self._streams:
+            self._streams.remove(stream)
+
+    def stream(self, events=None, maxsize: int = 1000, overflow: str = "block"):
+        """
+        Async iterator of our events as `StreamEvent(source, event, args)` items.
+
+        :param events: Event names to keep, e.g. `{"message", "join"}`; all events when None.
+        :param int maxsize: Buffered items before the overflow policy applies.
+        :param str overflow: `block` pauses reading frames, `drop_oldest` or `drop_newest` discard items.
+
+        :returns: EventStream
+        """
+        from .stream import EventStream
+
+        stream = EventStream(events, maxsize, overflow)
+        stream.attach(self)
+        return stream
+
+    async def _wait_streams(self):
+        """
+        Backpressure: hold the receive loop while a blocking stream is full, until its consumer takes an
+        item or the connection is closed (`_release_streams`).
+        """
+        for stream in list(self._streams):
+            if stream.writable:
+                continue
+            if not getattr(self, "connected", True):
+                return
+            released = self._streams_released = asyncio.get_running_loop().create_future()
+            writable = asyncio.ensure_future(stream.wait_writable())
+            try:
+                await asyncio.wait((writable, released), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                writable.cancel()
+                self._streams_released = None
+            if released.done():
+                return
+
+    def _release_streams(self):
+        """Let go of a receive loop held by a full stream, e.g. once disconnected."""
+        if self._streams_released and not self._streams_released.done():
+            self._streams_released.set_result(None)
+
     def call_event(self, event: str, *args, **kwargs):
         """Trigger an event which looks for callback methods on this and any listening objects."""
         attr = f"on_{event}"
         self._log_event(event, *args, **kwargs)
+        for stream in self._streams:
+            stream.offer(self, event, args)
         # Call a generic event handler for all events
         if hasattr(self, "on_event"):
             self.add_task(getattr(self, "on_event")(event, *args, **kwargs))
@@ -130,6 +187,8 @@ class EventHandler(TaskHandler):
 
     def _log_event(self, event: str, *args, **kwargs):
         """Event debug logger."""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         if len(args) == 0:
             args_section = ""
         elif len(args) == 1:
@@ -137,12 +196,87 @@ class EventHandler(TaskHandler):
         else:
             args_section = repr(args)
         kwargs_section = "" if not kwargs else repr(kwargs)
-        logger.debug(f"EVENT {event} {args_section} {kwargs_section}")
+        logger.debug("EVENT %s %s %s", event, args_section, kwargs_section)
+
+
+class ProtocolTrace:
+    """
+    Protocol trace of one connection, logged at INFO on the stdlib `chatango.trace` logger; nothing shows
+    unless that logger has a handler, e.g. `logger.bridge_stdlib()` (called by `create_logger`) or
+    `logging.basicConfig(level=logging.INFO)`.
+
+    Logs a deterministic `sample_rate` fraction of frames, optionally only the given `actions`, and
+    truncates payloads to `max_length` characters.
+    """
+
+    def __init__(
+        self, name: str, sample_rate: float = 1.0, max_length: int = 512, actions: Optional[Iterable[str]] = None
+    ):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.max_length = max_length
+        self.actions = set(actions) if actions else None
+        self.seen = 0
+        self.logged = 0
+        self._credit = 0.0
+
+    def __call__(self, direction: str, command: str):
+        self.seen += 1
+        if self.actions is not None and command.split(":", 1)[0] not in self.actions:
+            return
+        self._credit += self.sample_rate
+        if self._credit < 1:
+            return
+        self._credit -= 1
+        self.logged += 1
+        if len(command) > self.max_length:
+            trace_logger.info(
+                "%s %s %s... (+%d chars)",
+                self.name,
+                direction,
+                command[: self.max_length],
+                len(command) - self.max_length,
+            )
+        else:
+            trace_logger.info("%s %s %s", self.name, direction, command)
 
 
 class CommandHandler:
     """Abstract class to enable chat room to send commands, customs bots to implement handlers."""
 
+    _recorder = None
+    _trace: Optional[ProtocolTrace] = None
+
+    def enable_trace(self, sample_rate: float = 1.0, max_length: int = 512, actions: Optional[Iterable[str]] = None):
+        """
+        Trace this connection's frames at runtime without turning on DEBUG logging everywhere. Frames go to
+        the stdlib `chatango.trace` logger, see `ProtocolTrace`.
+
+        :param float sample_rate: Fraction of frames to log.
+        :param int max_length: Characters of each payload to keep.
+        :param Iterable[str] actions: Only trace these commands, e.g. `["b", "u"]`.
+
+        :returns: ProtocolTrace
+        """
+        self._trace = ProtocolTrace(getattr(self, "name", repr(self)), sample_rate, max_length, actions)
+        return self._trace
+
+    def disable_trace(self):
+        self._trace = None
+
+    def start_recording(self, path: str):
+        """Append every inbound frame with its receive time to a recording file, see `chatango.recorder`."""
+        from .recorder import FrameRecorder
+
+        self.stop_recording()
+        self._recorder = FrameRecorder(path)
+
+    def stop_recording(self):
+        """Stop recording inbound frames."""
+        if self._recorder:
+            self._recorder.close()
+            self._recorder = None
+
     async def _send_command(self, *args, **kwargs):
         """Internal method to send a command using the protocol of the subclass (websocket, tcp, etc.)"""
         raise TypeError("CommandHandler child class must implement _send_command")
@@ -150,20 +284,43 @@ class CommandHandler:
     async def send_command(self, *args):
         """Public send method"""
         command = ":".join(args)
-        logger.debug(f"OUT {command}")
+        if self._trace:
+            self._trace("OUT", command)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("OUT %s", command)
         await self._send_command(command)
 
+    async def _send_commands(self, commands):
+        """Send several commands; transports that can pipeline writes override this."""
+        for command in commands:
+            await self._send_command(command)
+
+    async def send_commands(self, commands):
+        """Send a burst of commands, each given as a sequence of its parts."""
+        commands = [":".join(args) for args in commands]
+        if self._trace or logger.isEnabledFor(logging.DEBUG):
+            for command in commands:
+                if self._trace:
+                    self._trace("OUT", command)
+                logger.debug("OUT %s", command)
+        await self._send_commands(commands)
+
     async def _receive_command(self, command: str):
         """Receive an incoming command and dynamically call a handler."""
         if not command:
             return
-        logger.debug(f" IN {command}")
+        if self._trace:
+            self._trace(" IN", command)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(" IN %s", command)
         action, *args = command.split(":")
         if hasattr(self, f"_rcmd_{action}"):
             try:
                 await getattr(self, f"_rcmd_{action}")(args)
             except Exception as e:
-                logger.error(f"Error while handling command {action}")
+                logger.error("Error while handling command %s", action)
                 traceback.print_exception(e, file=sys.stderr)
         else:
-            logger.error(f"Unhandled received command {action}")
+            logger.error("Unhandled received command %s", action)
+        if getattr(self, "_streams", None):
+            await self._wait_streams()
@@ -1,273 +1,176 @@
 """Chatango md5-lite hashing algorithm to lookup a server based on the group name."""
-import ctypes
-
-
-FFFFVAL = ctypes.c_int32(0xFFFFFFFF).value
-
-
-def left(a, b):
-    m = ctypes.c_int32(a)
-    m.value <<= b
-    return m.value
-
-
-def right(val, n):
-    max_shift = 31
-    n = n % max_shift
-
-    mask = (1 << 32) - 1
-    val = val & mask
-
-    if n > 0:
-        val >>= n
-
-    return val
-
-
-def xor(a, b):
-    a = ctypes.c_int32(a).value
-    b = ctypes.c_int32(b).value
-    return a ^ b
-
-
-def andd(a, b):
-    a = ctypes.c_int32(a).value
-    b = ctypes.c_int32(b).value
-    return a & b
-
-
-def orr(a, b):
-    a = ctypes.c_int32(a).value
-    b = ctypes.c_int32(b).value
-    return a | b
-
-
-def nott(val):
-    mask = (1 << 32) - 1
-    return ~(val & mask)
+import struct
+from typing import Iterable, List, Union
+
+MASK = 0xFFFFFFFF
+BLOCK = struct.Struct("<16I")
+
+# Per-step additive constants, rotations and message word indexes of the four rounds
+K = (
+    3614090360, 3905402710, 606105819, 3250441966, 4118548399, 1200080426, 2821735955, 4249261313,
+    1770035416, 2336552879, 4294925233, 2304563134, 1804603682, 4254626195, 2792965006, 1236535329,
+    4129170786, 3225465664, 643717713, 3921069994, 3593408605, 38016083, 3634488961, 3889429448,
+    568446438, 3275163606, 4107603335, 1163531501, 2850285829, 4243563512, 1735328473, 2368359562,
+    4294588738, 2272392833, 1839030562, 4259657740, 2763975236, 1272893353, 4139469664, 3200236656,
+    681279174, 3936430074, 3572445317, 76029189, 3654602809, 3873151461, 530742520, 3299628645,
+    4096336452, 1126891415, 2878612391, 4237533241, 1700485571, 2399980690, 4293915773, 2240044497,
+    1873313359, 4264355552, 2734768916, 1309151649, 4149444226, 3174756917, 718787259, 3951481745,
+)  # fmt: skip
+S = (7, 12, 17, 22) * 4 + (5, 9, 14, 20) * 4 + (4, 11, 16, 23) * 4 + (6, 10, 15, 21) * 4
+G = (
+    tuple(range(16))
+    + tuple((5 * i + 1) % 16 for i in range(16))
+    + tuple((3 * i + 5) % 16 for i in range(16))
+    + tuple((7 * i) % 16 for i in range(16))
+)
+ROUND1 = tuple(zip(K[0:16], S[0:16], G[0:16]))
+ROUND2 = tuple(zip(K[16:32], S[16:32], G[16:32]))
+ROUND3 = tuple(zip(K[32:48], S[32:48], G[32:48]))
+ROUND4 = tuple(zip(K[48:64], S[48:64], G[48:64]))
+
+INITIAL_STATE = (1732584193, 4023233417, 2562383102, 271733878)
+
+Buffer = Union[str, bytes, bytearray, memoryview, List[int]]
+
+
+def _as_bytes(message: Buffer) -> Union[bytes, bytearray, memoryview, List[int]]:
+    if isinstance(message, str):
+        # One unit per character, like the original per-character `ord` hasher: Latin-1 bytes, or the
+        # code points themselves when a character is above 255
+        try:
+            return message.encode("latin-1")
+        except UnicodeEncodeError:
+            return [ord(char) for char in message]
+    if isinstance(message, (bytes, bytearray)):
+        return message
+    if isinstance(message, memoryview):
+        return message.cast("B") if message.format != "B" or message.ndim != 1 else message
+    try:
+        return bytes(message)
+    except ValueError:  # values above 255, handled like code points
+        return list(message)
 
 
 class Hasher:
-    def __init__(self):
-        self.block_size = 64
-        self.state = [1732584193, 4023233417, 2562383102, 271733878]
-        self.message_array = [0] * self.block_size
-        self.message_length = self.buffer_length = 0
-
-    def compress(self, msg, i=None):
-        if not i:
-            i = 0
-
-        tmp = [0] * 16
-
-        if isinstance(msg, str):
-            for f in range(16):
-                tmp[f] = ord(msg[i]) | (ord(msg[i + 1]) << 8) | (ord(msg[i + 2]) << 16) | (ord(msg[i + 3]) << 24)
-                i += 4
+    """
+    Incremental hasher using plain int arithmetic masked to 32 bits.
+
+    Accepts `str` (one unit per character, not UTF-8 encoded), `bytes`, `bytearray`, `memoryview` or lists
+    of byte values::
+
+        Hasher().update(b"python").update(memoryview(b"rpg")).hexdigest()
+    """
+
+    block_size = 64
+
+    def __init__(self, message: Buffer = b""):
+        self.state = list(INITIAL_STATE)
+        self.message_length = 0
+        self._buffer = bytearray()
+        if message:
+            self.update(message)
+
+    @property
+    def buffer_length(self) -> int:
+        return len(self._buffer)
+
+    def compress(self, block, offset: int = 0):
+        """Mix one 64 byte block starting at `offset` into the state."""
+        if isinstance(block, list):  # code points above 255, see `_as_bytes`
+            x = [
+                (block[i] | (block[i + 1] << 8) | (block[i + 2] << 16) | (block[i + 3] << 24)) & MASK
+                for i in range(offset, offset + self.block_size, 4)
+            ]
         else:
-            for f in range(16):
-                tmp[f] = msg[i] | (msg[i + 1] << 8) | (msg[i + 2] << 16) | (msg[i + 3] << 24)
-                i += 4
-
-        a, b, c, d, t = self.state[0], self.state[1], self.state[2], self.state[3], 0
-        t = andd(a + xor(d, andd(b, xor(c, d))) + tmp[0] + 3614090360, FFFFVAL)
-        a = b + ((left(t, 7)) & FFFFVAL | right(t, 25))
-        t = andd(d + xor(c, andd(a, xor(b, c))) + tmp[1] + 3905402710, FFFFVAL)
-        d = a + (left(t, 12) & FFFFVAL | right(t, 20))
-        t = andd(c + xor(b, andd(d, xor(a, b))) + tmp[2] + 606105819, FFFFVAL)
-        c = d + ((left(t, 17)) & FFFFVAL | right(t, 15))
-        t = andd(b + xor(a, andd(c, xor(d, a))) + tmp[3] + 3250441966, FFFFVAL)
-        b = c + ((left(t, 22)) & FFFFVAL | right(t, 10))
-        t = andd(a + xor(d, andd(b, xor(c, d))) + tmp[4] + 4118548399, FFFFVAL)
-        a = b + ((left(t, 7)) & FFFFVAL | right(t, 25))
-        t = andd(d + xor(c, andd(a, xor(b, c))) + tmp[5] + 1200080426, FFFFVAL)
-        d = a + ((left(t, 12)) & FFFFVAL | right(t, 20))
-        t = andd(c + xor(b, andd(d, xor(a, b))) + tmp[6] + 2821735955, FFFFVAL)
-        c = d + ((left(t, 17)) & FFFFVAL | right(t, 15))
-        t = andd(b + xor(a, andd(c, xor(d, a))) + tmp[7] + 4249261313, FFFFVAL)
-        b = c + ((left(t, 22)) & FFFFVAL | right(t, 10))
-        t = andd(a + xor(d, andd(b, xor(c, d))) + tmp[8] + 1770035416, FFFFVAL)
-        a = b + ((left(t, 7)) & FFFFVAL | right(t, 25))
-        t = andd(d + xor(c, andd(a, xor(b, c))) + tmp[9] + 2336552879, FFFFVAL)
-        d = a + ((left(t, 12)) & FFFFVAL | right(t, 20))
-        t = andd(c + xor(b, andd(d, xor(a, b))) + tmp[10] + 4294925233, FFFFVAL)
-        c = d + ((left(t, 17)) & FFFFVAL | right(t, 15))
-        t = andd(b + xor(a, andd(c, xor(d, a))) + tmp[11] + 2304563134, FFFFVAL)
-        b = c + ((left(t, 22)) & FFFFVAL | right(t, 10))
-        t = andd(a + xor(d, andd(b, xor(c, d))) + tmp[12] + 1804603682, FFFFVAL)
-        a = b + ((left(t, 7)) & FFFFVAL | right(t, 25))
-        t = andd(d + xor(c, andd(a, xor(b, c))) + tmp[13] + 4254626195, FFFFVAL)
-        d = a + ((left(t, 12)) & FFFFVAL | right(t, 20))
-        t = andd(c + xor(b, andd(d, xor(a, b))) + tmp[14] + 2792965006, FFFFVAL)
-        c = d + ((left(t, 17)) & FFFFVAL | right(t, 15))
-        t = andd(b + xor(a, andd(c, xor(d, a))) + tmp[15] + 1236535329, FFFFVAL)
-        b = c + ((left(t, 22)) & FFFFVAL | right(t, 10))
-        t = andd(a + xor(c, andd(d, xor(b, c))) + tmp[1] + 4129170786, FFFFVAL)
-        a = b + ((left(t, 5)) & FFFFVAL | right(t, 27))
-        t = andd(d + xor(b, andd(c, xor(a, b))) + tmp[6] + 3225465664, FFFFVAL)
-        d = a + ((left(t, 9)) & FFFFVAL | right(t, 23))
-        t = andd(c + xor(a, andd(b, xor(d, a))) + tmp[11] + 643717713, FFFFVAL)
-        c = d + ((left(t, 14)) & FFFFVAL | right(t, 18))
-        t = andd(b + xor(d, andd(a, xor(c, d))) + tmp[0] + 3921069994, FFFFVAL)
-        b = c + ((left(t, 20)) & FFFFVAL | right(t, 12))
-        t = andd(a + xor(c, andd(d, xor(b, c))) + tmp[5] + 3593408605, FFFFVAL)
-        a = b + ((left(t, 5)) & FFFFVAL | right(t, 27))
-        t = andd(d + xor(b, andd(c, xor(a, b))) + tmp[10] + 38016083, FFFFVAL)
-        d = a + ((left(t, 9)) & FFFFVAL | right(t, 23))
-        t = andd(c + xor(a, andd(b, xor(d, a))) + tmp[15] + 3634488961, FFFFVAL)
-        c = d + ((left(t, 14)) & FFFFVAL | right(t, 18))
-        t = andd(b + xor(d, andd(a, xor(c, d))) + tmp[4] + 3889429448, FFFFVAL)
-        b = c + ((left(t, 20)) & FFFFVAL | right(t, 12))
-        t = andd(a + xor(c, andd(d, xor(b, c))) + tmp[9] + 568446438, FFFFVAL)
-        a = b + ((left(t, 5)) & FFFFVAL | right(t, 27))
-        t = andd(d + xor(b, andd(c, xor(a, b))) + tmp[14] + 3275163606, FFFFVAL)
-        d = a + ((left(t, 9)) & FFFFVAL | right(t, 23))
-        t = andd(c + xor(a, andd(b, xor(d, a))) + tmp[3] + 4107603335, FFFFVAL)
-        c = d + ((left(t, 14)) & FFFFVAL | right(t, 18))
-        t = andd(b + xor(d, andd(a, xor(c, d))) + tmp[8] + 1163531501, FFFFVAL)
-        b = c + ((left(t, 20)) & FFFFVAL | right(t, 12))
-        t = andd(a + xor(c, andd(d, xor(b, c))) + tmp[13] + 2850285829, FFFFVAL)
-        a = b + ((left(t, 5)) & FFFFVAL | right(t, 27))
-        t = andd(d + xor(b, andd(c, xor(a, b))) + tmp[2] + 4243563512, FFFFVAL)
-        d = a + ((left(t, 9)) & FFFFVAL | right(t, 23))
-        t = andd(c + xor(a, andd(b, xor(d, a))) + tmp[7] + 1735328473, FFFFVAL)
-        c = d + ((left(t, 14)) & FFFFVAL | right(t, 18))
-        t = andd(b + xor(d, andd(a, xor(c, d))) + tmp[12] + 2368359562, FFFFVAL)
-        b = c + ((left(t, 20)) & FFFFVAL | right(t, 12))
-        t = andd(a + xor(xor(b, c), d) + tmp[5] + 4294588738, FFFFVAL)
-        a = b + ((left(t, 4)) & FFFFVAL | right(t, 28))
-        t = andd(d + xor(xor(a, b), c) + tmp[8] + 2272392833, FFFFVAL)
-        d = a + ((left(t, 11)) & FFFFVAL | right(t, 21))
-        t = andd(c + xor(xor(d, a), b) + tmp[11] + 1839030562, FFFFVAL)
-        c = d + ((left(t, 16)) & FFFFVAL | right(t, 16))
-        t = andd(b + xor(xor(c, d), a) + tmp[14] + 4259657740, FFFFVAL)
-        b = c + ((left(t, 23)) & FFFFVAL | right(t, 9))
-        t = andd(a + xor(xor(b, c), d) + tmp[1] + 2763975236, FFFFVAL)
-        a = b + ((left(t, 4)) & FFFFVAL | right(t, 28))
-        t = andd(d + xor(xor(a, b), c) + tmp[4] + 1272893353, FFFFVAL)
-        d = a + ((left(t, 11)) & FFFFVAL | right(t, 21))
-        t = andd(c + xor(xor(a, b), d) + tmp[7] + 4139469664, FFFFVAL)
-        c = d + ((left(t, 16)) & FFFFVAL | right(t, 16))
-        t = andd(b + xor(xor(c, d), a) + tmp[10] + 3200236656, FFFFVAL)
-        b = c + ((left(t, 23)) & FFFFVAL | right(t, 9))
-        t = andd(a + xor(xor(b, c), d) + tmp[13] + 681279174, FFFFVAL)
-        a = b + ((left(t, 4)) & FFFFVAL | right(t, 28))
-        t = andd(d + xor(xor(a, b), c) + tmp[0] + 3936430074, FFFFVAL)
-        d = a + ((left(t, 11)) & FFFFVAL | right(t, 21))
-        t = andd(c + xor(xor(a, b), d) + tmp[3] + 3572445317, FFFFVAL)
-        c = d + ((left(t, 16)) & FFFFVAL | right(t, 16))
-        t = andd(b + xor(xor(c, d), a) + tmp[6] + 76029189, FFFFVAL)
-        b = c + ((left(t, 23)) & FFFFVAL | right(t, 9))
-        t = andd(a + xor(xor(b, c), d) + tmp[9] + 3654602809, FFFFVAL)
-        a = b + ((left(t, 4)) & FFFFVAL | right(t, 28))
-        t = andd(d + xor(xor(a, b), c) + tmp[12] + 3873151461, FFFFVAL)
-        d = a + ((left(t, 11)) & FFFFVAL | right(t, 21))
-        t = andd(c + xor(xor(a, b), d) + tmp[15] + 530742520, FFFFVAL)
-        c = d + ((left(t, 16)) & FFFFVAL | right(t, 16))
-        t = andd(b + xor(xor(c, d), a) + tmp[2] + 3299628645, FFFFVAL)
-        b = c + ((left(t, 23)) & FFFFVAL | right(t, 9))
-        t = andd(a + xor(c, orr(b, nott(d))) + tmp[0] + 4096336452, FFFFVAL)
-        a = b + ((left(t, 6)) & FFFFVAL | right(t, 26))
-        t = andd(d + xor(b, orr(a, nott(c))) + tmp[7] + 1126891415, FFFFVAL)
-        d = a + ((left(t, 10)) & FFFFVAL | right(t, 22))
-        t = andd(c + xor(a, orr(d, nott(b))) + tmp[14] + 2878612391, FFFFVAL)
-        c = d + ((left(t, 15)) & FFFFVAL | right(t, 17))
-        t = andd(b + xor(d, orr(c, nott(a))) + tmp[5] + 4237533241, FFFFVAL)
-        b = c + ((left(t, 21)) & FFFFVAL | right(t, 11))
-        t = andd(a + xor(c, orr(b, nott(d))) + tmp[12] + 1700485571, FFFFVAL)
-        a = b + ((left(t, 6)) & FFFFVAL | right(t, 26))
-        t = andd(d + xor(b, orr(a, nott(c))) + tmp[3] + 2399980690, FFFFVAL)
-        d = a + ((left(t, 10)) & FFFFVAL | right(t, 22))
-        t = andd(c + xor(a, orr(d, nott(b))) + tmp[10] + 4293915773, FFFFVAL)
-        c = d + ((left(t, 15)) & FFFFVAL | right(t, 17))
-        t = andd(b + xor(d, orr(c, nott(a))) + tmp[1] + 2240044497, FFFFVAL)
-        b = c + ((left(t, 21)) & FFFFVAL | right(t, 11))
-        t = andd(a + xor(c, orr(b, nott(d))) + tmp[8] + 1873313359, FFFFVAL)
-        a = b + ((left(t, 6)) & FFFFVAL | right(t, 26))
-        t = andd(d + xor(b, orr(a, nott(c))) + tmp[15] + 4264355552, FFFFVAL)
-        d = a + ((left(t, 10)) & FFFFVAL | right(t, 22))
-        t = andd(c + xor(a, orr(d, nott(b))) + tmp[6] + 2734768916, FFFFVAL)
-        c = d + ((left(t, 15)) & FFFFVAL | right(t, 17))
-        t = andd(b + xor(d, orr(c, nott(a))) + tmp[13] + 1309151649, FFFFVAL)
-        b = c + ((left(t, 21)) & FFFFVAL | right(t, 11))
-        t = andd(a + xor(c, orr(b, nott(d))) + tmp[4] + 4149444226, FFFFVAL)
-        a = b + ((left(t, 6)) & FFFFVAL | right(t, 26))
-        t = andd(d + xor(b, orr(a, nott(c))) + tmp[11] + 3174756917, FFFFVAL)
-        d = a + ((left(t, 10)) & FFFFVAL | right(t, 22))
-        t = andd(c + xor(a, orr(d, nott(b))) + tmp[2] + 718787259, FFFFVAL)
-        c = d + ((left(t, 15)) & FFFFVAL | right(t, 17))
-        t = andd(b + xor(d, orr(c, nott(a))) + tmp[9] + 3951481745, FFFFVAL)
-
-        self.state[0] = self.state[0] + andd(a, FFFFVAL)
-        self.state[1] = self.state[1] + andd(c + orr(andd(left(t, 21), FFFFVAL), right(t, 11)), FFFFVAL)
-        self.state[2] = self.state[2] + andd(c, FFFFVAL)
-        self.state[3] = self.state[3] + andd(d, FFFFVAL)
-
-    def update(self, message, length=None):
-        if not length:
-            length = len(message)
-
-        c = length - self.block_size
-        msg_array = self.message_array
-        l = self.buffer_length
-        m = 0
-
-        while m < length:
-            if l == 0:
-                while m <= c:
-                    self.compress(message, m)
-                    m += self.block_size
-
-            if isinstance(message, str):
-                while m < length:
-                    msg_array[l] = ord(message[m])
-                    l += 1
-                    m += 1
-
-                    if l == self.block_size:
-                        self.compress(msg_array)
-                        l = 0
-                        break
-            else:
-                while m < length:
-                    msg_array[l] = message[m]
-                    l += 1
-                    m += 1
-
-                    if l == self.block_size:
-                        self.compress(msg_array)
-                        l = 0
-                        break
-
-        self.buffer_length = l
-        self.message_length += length
+            x = BLOCK.unpack_from(block, offset)
+        a, b, c, d = self.state
+        for k, s, g in ROUND1:
+            t = (a + (d ^ (b & (c ^ d))) + k + x[g]) & MASK
+            a, d, c, b = d, c, b, (b + ((t << s) | (t >> (32 - s)))) & MASK
+        for k, s, g in ROUND2:
+            t = (a + (c ^ (d & (b ^ c))) + k + x[g]) & MASK
+            a, d, c, b = d, c, b, (b + ((t << s) | (t >> (32 - s)))) & MASK
+        for k, s, g in ROUND3:
+            t = (a + (b ^ c ^ d) + k + x[g]) & MASK
+            a, d, c, b = d, c, b, (b + ((t << s) | (t >> (32 - s)))) & MASK
+        for k, s, g in ROUND4:
+            t = (a + (c ^ (b | (~d & MASK))) + k + x[g]) & MASK
+            a, d, c, b = d, c, b, (b + ((t << s) | (t >> (32 - s)))) & MASK
+        state = self.state
+        state[0] = (state[0] + a) & MASK
+        state[1] = (state[1] + b) & MASK
+        state[2] = (state[2] + c) & MASK
+        state[3] = (state[3] + d) & MASK
+
+    def update(self, message: Buffer, length: int = None) -> "Hasher":
+        """
+        Feed more input; returns self so calls can be chained.
+
+        :param int length: Only hash the first `length` units; None or 0 hash all of `message`.
+        """
+        data = _as_bytes(message)
+        if length:
+            data = data[:length]
+        if isinstance(data, list) and not isinstance(self._buffer, list):
+            self._buffer = list(self._buffer)
+        size = len(data)
+        self.message_length += size
+        offset = 0
+        if self._buffer:
+            needed = self.block_size - len(self._buffer)
+            self._buffer += data[:needed]
+            offset = needed
+            if len(self._buffer) < self.block_size:
+                return self
+            self.compress(self._buffer)
+            self._buffer.clear()
+        while offset + self.block_size <= size:
+            self.compress(data, offset)
+            offset += self.block_size
+        if offset < size:
+            self._buffer += data[offset:]
         return self
 
-    def finalize(self):
-        size = (self.block_size if self.buffer_length < 56 else 2 * self.block_size) - self.buffer_length
-
-        a = [0] * size
-
-        a[0] = 128
-        for i in range(1, size - 8):
-            a[i] = 0
-
-        c = 8 * self.message_length
-        for i in range(size - 8, size):
-            a[i] = int(c) & 255
-            c /= 256
-
-        self.update(a)
-
-        a = [0] * 16
-        c = 0
-        for i in range(4):
-            for j in range(0, 32, 8):
-                a[c] = (self.state[i] >> j) & 255
-                c += 1
-
-        return a
-
-    def hash(self, input):
-        message = self.update(input).finalize()
-        return "".join(["{:02x}".format(num) for num in message])
+    def digest(self) -> bytes:
+        """Digest of everything fed so far; the hasher can keep receiving input afterwards."""
+        state, buffer, length = list(self.state), self._buffer[:], self.message_length
+        padding = (55 - length) % self.block_size
+        self.update(b"\x80" + b"\x00" * padding + struct.pack("<Q", (8 * length) & 0xFFFFFFFFFFFFFFFF))
+        result = struct.pack("<4I", *self.state)
+        self.state, self._buffer, self.message_length = state, buffer, length
+        return result
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+    def finalize(self) -> List[int]:
+        """Digest as a list of byte values."""
+        return list(self.digest())
+
+    def hash(self, input: Buffer) -> str:
+        """Hex digest of `input` appended to anything fed so far."""
+        return self.update(input).hexdigest()
+
+
+def hash_many(messages: Iterable[Buffer]) -> List[str]:
+    """
+    Hex digests of many short inputs, such as room names.
+
+    Inputs that fit in a single padded block skip the incremental buffering and are compressed directly.
+
+    :returns: List[str]
+    """
+    digests = []
+    hasher = Hasher()
+    compress = hasher.compress
+    pack_length = struct.Struct("<Q").pack
+    for message in messages:
+        data = _as_bytes(message)
+        size = len(data)
+        if size < 56 and not isinstance(data, list):
+            hasher.state[:] = INITIAL_STATE
+            compress(bytes(data) + b"\x80" + b"\x00" * (55 - size) + pack_length(8 * size))
+            digests.append(struct.pack("<4I", *hasher.state).hex())
+        else:
+            digests.append(Hasher(data).hexdigest())
+    return digests
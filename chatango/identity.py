@@ -0,0 +1,199 @@
+"""Cross-room index linking IPs, puids, user names and rooms, for spotting ban evasion."""
+import time
+from bisect import bisect_left
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# An identity key: ("ip" | "puid" | "name" | "room", value)
+Key = Tuple[str, str]
+
+KINDS = ("ip", "puid", "name", "room")
+
+
+class Link:
+    """How often & how recently two identity keys were seen together, decayed exponentially."""
+
+    __slots__ = ("a", "b", "score", "last_seen", "first_seen", "count")
+
+    def __init__(self, a: Key, b: Key, when: float):
+        self.a = a
+        self.b = b
+        self.score = 0.0
+        self.last_seen = when
+        self.first_seen = when
+        self.count = 0
+
+    def __repr__(self):
+        return f"<Link count:{self.count} score:{self.score:.2f}>"
+
+    def decayed(self, now: float, half_life: float) -> float:
+        """Score as of `now`: every sighting counts 1, halved for each `half_life` seconds since."""
+        return self.score * 0.5 ** (max(now - self.last_seen, 0.0) / half_life)
+
+    def touch(self, when: float, half_life: float):
+        if when >= self.last_seen:
+            self.score = self.decayed(when, half_life) + 1.0
+            self.last_seen = when
+        else:  # an older sighting, e.g. from room history
+            self.score += 0.5 ** ((self.last_seen - when) / half_life)
+            self.first_seen = min(self.first_seen, when)
+        self.count += 1
+
+
+class IdentityIndex:
+    """
+    Graph of which IPs, puids and names were seen together, and in which rooms, shared by every room of
+    a client. Rooms feed it from each message (`_process`) and participant update (`_rcmd_participant`);
+    IPs are only known to moderators.
+
+    Links decay with `half_life` so that a shared NAT address seen once months ago ranks below a puid
+    seen every day. Memory is bounded by `max_links`: past it, the weakest links are dropped::
+
+        identities = IdentityIndex()
+        client = Client(username, password, rooms, identity_index=identities)
+        ...
+        identities.associates(name="banned_user")  # [("new_account", 3.7), ...]
+    """
+
+    def __init__(self, half_life: float = 7 * 86400.0, max_links: int = 200_000, min_score: float = 0.05):
+        self.half_life = half_life
+        self.max_links = max_links
+        self.min_score = min_score
+        self._links: Dict[Key, Dict[Key, Link]] = {}
+        self._all: Set[Link] = set()
+
+    def __len__(self):
+        return len(self._all)
+
+    def __contains__(self, key: Key):
+        return key in self._links
+
+    def observe(
+        self,
+        ip: Optional[str] = None,
+        puid: Optional[str] = None,
+        name: Optional[str] = None,
+        room: Optional[str] = None,
+        when: Optional[float] = None,
+    ):
+        """
+        Record that these identifiers were seen together; empty values are ignored.
+
+        :param str ip: Client IP.
+        :param str puid: Chatango puid.
+        :param str name: Registered user name; anon names are derived from the puid and add nothing.
+        :param str room: Room name.
+        :param float when: Unix time of the sighting, defaults to now.
+        """
+        when = time.time() if when is None else when
+        keys = [(kind, value) for kind, value in (("ip", ip), ("puid", puid), ("name", name and name.lower())) if value]
+        if not keys:
+            return
+        if room:
+            keys.append(("room", room))
+        for i, a in enumerate(keys):
+            for b in keys[i + 1 :]:
+                self._link(a, b, when).touch(when, self.half_life)
+        if len(self._all) > self.max_links:
+            self.prune(when)
+
+    def _link(self, a: Key, b: Key, when: float) -> Link:
+        link = self._links.get(a, {}).get(b)
+        if link is None:
+            link = Link(a, b, when)
+            self._links.setdefault(a, {})[b] = link
+            self._links.setdefault(b, {})[a] = link
+            self._all.add(link)
+        return link
+
+    def _unlink(self, link: Link):
+        self._all.discard(link)
+        for x, y in ((link.a, link.b), (link.b, link.a)):
+            neighbours = self._links[x]
+            del neighbours[y]
+            if not neighbours:
+                del self._links[x]
+
+    def prune(self, now: Optional[float] = None):
+        """
+        Drop links decayed under `min_score`, then the weakest until 75% of `max_links` remain, so the
+        full scan is paid once per quarter of `max_links` new links rather than on every insert.
+        """
+        now = time.time() if now is None else now
+        rate = -1.0 / self.half_life
+        scored = [(link.score * 2.0 ** ((now - link.last_seen) * rate), link) for link in self._all]
+        scored.sort(key=itemgetter(0))
+        drop = max(len(scored) - int(self.max_links * 0.75), bisect_left(scored, self.min_score, key=itemgetter(0)))
+        for _, link in scored[:drop]:
+            self._unlink(link)
+
+    def related(
+        self, kind: str, value: str, kinds: Optional[Iterable[str]] = None, now: Optional[float] = None
+    ) -> List[Tuple[str, str, float, float]]:
+        """
+        Keys directly linked to one identifier, strongest first.
+
+        :param str kind: One of `KINDS`.
+        :param str value: Identifier; names are case insensitive.
+        :param kinds: Only return keys of these kinds.
+
+        :returns: List of (kind, value, decayed score, last seen).
+        """
+        now = time.time() if now is None else now
+        if kind == "name":
+            value = value.lower()
+        wanted = set(kinds) if kinds else None
+        found = [
+            (other[0], other[1], link.decayed(now, self.half_life), link.last_seen)
+            for other, link in self._links.get((kind, value), {}).items()
+            if wanted is None or other[0] in wanted
+        ]
+        found = [item for item in found if item[2] >= self.min_score]
+        found.sort(key=lambda item: item[2], reverse=True)
+        return found
+
+    def names(self, kind: str, value: str, now: Optional[float] = None) -> List[str]:
+        """Names that used an IP or puid, strongest first."""
+        return [item[1] for item in self.related(kind, value, ("name",), now)]
+
+    def rooms(self, kind: str, value: str, now: Optional[float] = None) -> List[str]:
+        """Rooms an identifier was seen in, most recently active first."""
+        return [item[1] for item in sorted(self.related(kind, value, ("room",), now), key=lambda item: -item[3])]
+
+    def associates(
+        self,
+        name: Optional[str] = None,
+        ip: Optional[str] = None,
+        puid: Optional[str] = None,
+        now: Optional[float] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Other names sharing an IP or puid with the given identity, e.g. the message behind a ban.
+
+        A name's score is the weaker of the two links joining it through the shared identifier, taking
+        the strongest such path.
+
+        :returns: List of (name, score), strongest first.
+        """
+        now = time.time() if now is None else now
+        start = name.lower() if name else None
+        # Identifiers to look through, with the strength of their tie to the starting identity
+        shared: Dict[Key, float] = {key: float("inf") for key in (("ip", ip), ("puid", puid)) if key[1]}
+        if start:
+            for other, link in self._links.get(("name", start), {}).items():
+                if other[0] in ("ip", "puid") and other not in shared:
+                    shared[other] = link.decayed(now, self.half_life)
+        found: Dict[str, float] = {}
+        for key, bound in shared.items():
+            for other, link in self._links.get(key, {}).items():
+                if other[0] != "name" or other[1] == start:
+                    continue
+                score = min(bound, link.decayed(now, self.half_life))
+                if score >= self.min_score and score > found.get(other[1], 0.0):
+                    found[other[1]] = score
+        return sorted(found.items(), key=lambda item: item[1], reverse=True)
+
+    def associates_of(self, msg, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """`associates` of a `RoomMessage` sender, using its ip, puid and registered name."""
+        name = None if msg.user.is_anon else msg.user.name
+        return self.associates(name=name, ip=msg.ip or None, puid=msg.puid or None, now=now)
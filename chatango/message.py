@@ -109,8 +109,8 @@ async def _process(room, args):
         else:
             name_color = None
     msg.user = User(name, ip=ip, is_anon=is_anon)
-    msg.user._styles._name_color = name_color
-    msg.styles = msg.user._styles
+    msg.styles = msg.user.styles
+    msg.styles._name_color = name_color
     msg.styles._font_size, msg.styles._font_color, msg.styles._font_face = _parseFont(f.strip())
     if msg.styles._font_size == None:
         msg.styles._font_size = 11
@@ -126,6 +126,9 @@ async def _process(room, args):
         msg.user._is_premium = is_premium
         if evt:
             room.call_event("premium_change", msg.user, is_premium)
+    identities = getattr(room, "identity_index", None)
+    if identities is not None:
+        identities.observe(ip=ip, puid=puid, name=None if is_anon else name, room=room.name, when=msg.time)
     return msg
 
 
@@ -145,7 +148,7 @@ async def _process_pm(room, args):
     msg.time = mtime
     msg.body = body
     msg.raw = rawmsg
-    msg.styles = msg.user._styles
+    msg.styles = msg.user.styles
     msg.styles._name_color = name_color
     msg.styles._font_size = font_size
     msg.styles._font_color = font_color
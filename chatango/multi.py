@@ -0,0 +1,111 @@
+"""Host many Chatango accounts on one event loop."""
+import asyncio
+from typing import Dict, Iterable, Optional
+
+from .auth import TokenManager, get_token_manager
+from .client import Client
+from .handler import TaskHandler
+from .runner import run as run_loop
+from .utils import public_attributes
+
+
+class MultiClient(TaskHandler):
+    """
+    One `Client` per account, all running on the same event loop.
+
+    The accounts share the process-wide HTTP session, profile cache and one `TokenManager`, while every
+    account keeps its own rooms, PM connection, outbox and rate governor::
+
+        multi = MultiClient(client_class=MyBot)
+        multi.add_account("bot1", "password", rooms=["pythonrpg"], pm=True)
+        multi.add_account("bot2", "password", pm=True)
+        await multi.run(forever=True)
+    """
+
+    def __init__(self, client_class=Client, token_manager: Optional[TokenManager] = None, **client_kwargs):
+        if not issubclass(client_class, Client):
+            raise TypeError("MultiClient: client class does not inherit from Client")
+        self._client_class = client_class
+        self.token_manager = token_manager or get_token_manager()
+        self.client_kwargs = client_kwargs
+        self.clients: Dict[str, Client] = {}
+        self._runs: Dict[str, asyncio.Task] = {}
+        self.running = False
+
+    def __dir__(self):
+        return public_attributes(self)
+
+    def __len__(self):
+        return len(self.clients)
+
+    def __contains__(self, username: str):
+        return username.lower() in self.clients
+
+    def get_client(self, username: str) -> Optional[Client]:
+        return self.clients.get(username.lower())
+
+    def add_account(
+        self, username: str, password: str, rooms: Iterable[str] = (), pm: bool = False, **kwargs
+    ) -> Client:
+        """
+        Add an account; it starts right away when the multi-client is already running.
+
+        :param str username: Account name.
+        :param str password: Account password.
+        :param Iterable[str] rooms: Rooms the account joins.
+        :param bool pm: Whether the account connects to PM.
+        :param kwargs: Per-account overrides of the shared `Client` keyword arguments.
+
+        :returns: Client
+        """
+        key = username.lower()
+        if key in self.clients:
+            raise ValueError(f"Account {username} already added")
+        options = dict(self.client_kwargs, **kwargs)
+        options.setdefault("token_manager", self.token_manager)
+        client = self._client_class(username, password, list(rooms), pm=pm, **options)
+        self.clients[key] = client
+        if self.running:
+            self._runs[key] = self.add_task(client.run(forever=True))
+        return client
+
+    def remove_account(self, username: str) -> Optional[Client]:
+        """Disconnect an account's rooms and PM, end its run task and forget it."""
+        key = username.lower()
+        client = self.clients.pop(key, None)
+        if client:
+            client.stop()
+        run_task = self._runs.pop(key, None)
+        if run_task:
+            if run_task in self.tasks:
+                self.tasks.remove(run_task)
+            self.add_task(self._retire(client, run_task))
+        return client
+
+    async def _retire(self, client: Client, run_task: asyncio.Task, timeout: float = 5.0):
+        """Give a removed account's disconnects up to `timeout` seconds, then end its tasks and run."""
+        if client.tasks:
+            await asyncio.wait(list(client.tasks), timeout=timeout)
+        client.end_tasks()
+        await asyncio.gather(run_task, return_exceptions=True)
+
+    async def run(self, *, forever=False):
+        self.running = True
+        for key, client in list(self.clients.items()):
+            self._runs[key] = self.add_task(client.run(forever=forever))
+        try:
+            if forever:
+                await self.task_loop
+            else:
+                await self.complete_tasks()
+        finally:
+            self.running = False
+            self._runs.clear()
+
+    def start(self, *, forever=False, **loop_options):
+        """Blocking entry point; `loop_options` are those of `Client.start`."""
+        return run_loop(self.run(forever=forever), **loop_options)
+
+    def stop(self):
+        for client in list(self.clients.values()):
+            client.stop()
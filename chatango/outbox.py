@@ -0,0 +1,180 @@
+"""Queued outbound PM delivery paced by the server's rate-limit replies."""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Optional
+
+from .exceptions import OutboxOverflowError
+
+OVERFLOW_POLICIES = ("drop_oldest", "reject")
+
+
+class RateGovernor:
+    """
+    Minimum spacing between sends, learned from server feedback.
+
+    Sends are not spaced at all until the server complains. From the first `toofast` or `msglexceeded` on,
+    the spacing never drops below `min_interval`: `toofast` silences sending for `silence` seconds and
+    doubles the spacing, `msglexceeded` widens it by half, and every successful send shrinks it slightly
+    back towards the floor.
+    """
+
+    def __init__(
+        self, interval: float = 0.0, min_interval: float = 0.25, max_interval: float = 10.0, silence: float = 12.0
+    ):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.silence = silence
+        self.silent_until = 0.0
+        self.last_sent = 0.0
+        # Lowest spacing allowed; zero until the server has asked us to slow down
+        self.floor = 0.0
+
+    def delay(self) -> float:
+        """Seconds to wait before the next send is allowed."""
+        return max(self.silent_until, self.last_sent + self.interval) - time.monotonic()
+
+    def on_sent(self):
+        self.last_sent = time.monotonic()
+        self.interval = max(self.floor, self.interval * 0.95)
+
+    def _back_off(self, factor: float):
+        self.floor = self.min_interval
+        self.interval = min(self.max_interval, max(self.floor, self.interval * factor))
+
+    def on_toofast(self):
+        self.silent_until = time.monotonic() + self.silence
+        self._back_off(2)
+
+    def on_msglexceeded(self):
+        self._back_off(1.5)
+        self.silent_until = max(self.silent_until, time.monotonic() + self.interval)
+
+
+class _Pending:
+    __slots__ = ("message", "future", "queued_at")
+
+    def __init__(self, message: str, future: asyncio.Future):
+        self.message = message
+        self.future = future
+        self.queued_at = time.monotonic()
+
+
+class PMOutbox:
+    """
+    Per-recipient queues of outbound PMs, released round-robin at the pace of a `RateGovernor`.
+
+    Queuing the same text to the same contact again within `merge_window` seconds, while the first copy is
+    still queued, returns the first copy's future instead of sending twice. When `max_backlog` messages are
+    queued, the overflow policy either fails the oldest queued message (`drop_oldest`) or the new one (`reject`)
+    with `OutboxOverflowError`; the new one is also rejected when there is nothing queued to drop.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str], Awaitable[None]],
+        max_backlog: int = 500,
+        overflow: str = "drop_oldest",
+        merge_window: float = 2.0,
+        governor: Optional[RateGovernor] = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        self.send = send
+        self.max_backlog = max_backlog
+        self.overflow = overflow
+        self.merge_window = merge_window
+        self.governor = governor or RateGovernor()
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self._queues: "OrderedDict[str, Deque[_Pending]]" = OrderedDict()
+        self._size = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def silenced(self) -> bool:
+        return self.governor.silent_until > time.monotonic()
+
+    def submit(self, target: str, message: str) -> asyncio.Future:
+        """
+        Queue a message.
+
+        :returns: asyncio.Future resolved once the message is written, or failed with the send error
+            or `OutboxOverflowError`.
+        """
+        queue = self._queues.get(target)
+        if queue:
+            last = queue[-1]
+            if (
+                last.message == message
+                and not last.future.done()
+                and time.monotonic() - last.queued_at <= self.merge_window
+            ):
+                self.merged += 1
+                return last.future
+        future = asyncio.get_running_loop().create_future()
+        if self._size >= self.max_backlog:
+            self.dropped += 1
+            if self.overflow == "reject" or not self._queues:
+                future.set_exception(OutboxOverflowError(target))
+                return future
+            self._drop_oldest()
+        self._queues.setdefault(target, deque()).append(_Pending(message, future))
+        self._size += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._release())
+        return future
+
+    def _drop_oldest(self):
+        oldest_target, oldest = None, None
+        for target, queue in self._queues.items():
+            if oldest is None or queue[0].queued_at < oldest.queued_at:
+                oldest_target, oldest = target, queue[0]
+        self._pop(oldest_target)
+        if not oldest.future.done():
+            oldest.future.set_exception(OutboxOverflowError(oldest_target))
+
+    def _pop(self, target: str) -> _Pending:
+        queue = self._queues[target]
+        item = queue.popleft()
+        self._size -= 1
+        if queue:
+            self._queues.move_to_end(target)
+        else:
+            del self._queues[target]
+        return item
+
+    async def _release(self):
+        while self._queues:
+            delay = self.governor.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            target = next(iter(self._queues))
+            item = self._pop(target)
+            if item.future.done():
+                continue
+            try:
+                await self.send(target, item.message)
+            except Exception as e:
+                item.future.set_exception(e)
+            else:
+                self.sent += 1
+                self.governor.on_sent()
+                item.future.set_result(None)
+
+    def cancel(self):
+        """Stop releasing and fail every queued message."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for queue in self._queues.values():
+            for item in queue:
+                item.future.cancel()
+        self._queues.clear()
+        self._size = 0
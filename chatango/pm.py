@@ -1,12 +1,19 @@
 import time
 import asyncio
-from typing import Optional
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional
 
-from .utils import get_token, gen_uid, public_attributes
-from .exceptions import AlreadyConnectedError
+from .auth import TokenManager, get_token_manager
+from .utils import gen_uid, public_attributes
+from .exceptions import AlreadyConnectedError, NotConnectedError
 from .handler import CommandHandler, EventHandler
 from .user import User, Friend
-from .message import _process_pm, message_cut
+from .message import PMMessage, _process_pm, message_cut
+from .outbox import PMOutbox
+from .presence import Presence
+
+if TYPE_CHECKING:
+    from .archive import MessageArchive
 
 
 class Socket(CommandHandler):
@@ -38,6 +45,7 @@ class Socket(CommandHandler):
             self._connection.close()
             await self._connection.wait_closed()
         self._reset()
+        self._release_streams()
 
     async def _send_command(self, command, terminator="\r\n\0"):
         if self._first_command:
@@ -50,6 +58,16 @@ class Socket(CommandHandler):
             self._connection.write(message.encode())
             await self._connection.drain()
 
+    async def _send_commands(self, commands):
+        """Write the whole burst, then drain once."""
+        if not self._connection:
+            return
+        for command in commands:
+            terminator = "\x00" if self._first_command else "\r\n\0"
+            self._first_command = False
+            self._connection.write((command + terminator).encode())
+        await self._connection.drain()
+
     async def _do_ping(self):
         """
         Ping the socket every minute to keep alive
@@ -70,6 +88,8 @@ class Socket(CommandHandler):
                 if data_str != "\r\n\x00":  # pong
                     cmds = data_str.split("\r\n\x00")
                     for cmd in cmds:
+                        if self._recorder and cmd:
+                            self._recorder.write(cmd)
                         await self._receive_command(cmd)
             else:
                 break
@@ -77,24 +97,122 @@ class Socket(CommandHandler):
         await self._disconnect()
 
 
+class PMHistory:
+    """
+    Fixed-capacity ring buffer of PM messages, oldest first, with a per-contact index.
+
+    Appending never copies; once full, each new message overwrites the oldest one and drops it from
+    its contact's index.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self._buffer: List[Optional[PMMessage]] = [None] * capacity
+        self._count = 0  # messages ever appended; the next one goes to slot `_count % capacity`
+        self._by_contact: Dict[str, Deque[int]] = {}
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def __bool__(self):
+        return self._count > 0
+
+    def _first(self) -> int:
+        return max(self._count - self.capacity, 0)
+
+    def __iter__(self) -> Iterator[PMMessage]:
+        for seq in range(self._first(), self._count):
+            yield self._buffer[seq % self.capacity]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("PM history index out of range")
+        return self._buffer[(self._first() + index) % self.capacity]
+
+    def append(self, msg: PMMessage):
+        slot = self._count % self.capacity
+        evicted = self._buffer[slot]
+        if evicted is not None:
+            seqs = self._by_contact[evicted.user.name]
+            seqs.popleft()
+            if not seqs:
+                del self._by_contact[evicted.user.name]
+        self._buffer[slot] = msg
+        self._by_contact.setdefault(msg.user.name, deque()).append(self._count)
+        self._count += 1
+
+    def contacts(self) -> List[str]:
+        """Names of users with messages in the buffer."""
+        return list(self._by_contact)
+
+    def with_contact(self, user, limit: Optional[int] = None) -> List[PMMessage]:
+        """
+        Messages exchanged with one user, oldest first.
+
+        :param user: User or user name.
+        :param int limit: Only the last `limit` messages.
+
+        :returns: List[PMMessage]
+        """
+        name = user.name if isinstance(user, User) else user.lower()
+        seqs = self._by_contact.get(name, ())
+        if limit is not None:
+            seqs = list(seqs)[-limit:] if limit > 0 else []
+        return [self._buffer[seq % self.capacity] for seq in seqs]
+
+    def last(self, limit: int) -> List[PMMessage]:
+        return self[-limit:] if limit > 0 else []
+
+    def clear(self):
+        self._buffer = [None] * self.capacity
+        self._count = 0
+        self._by_contact.clear()
+
+
 class PM(Socket, EventHandler):
-    def __init__(self):
+    def __init__(
+        self,
+        server: str = "c1.chatango.com",
+        port: int = 443,
+        login_url: str = "http://chatango.com/login",
+        token_manager: Optional[TokenManager] = None,
+        history_size: int = 10000,
+        offline_batch_delay: float = 0.5,
+        presence_tick: float = 0.25,
+        outbox: Optional[PMOutbox] = None,
+        archive: Optional["MessageArchive"] = None,
+    ):
         super().__init__()
-        self.server = "c1.chatango.com"
-        self.port = 443
+        self.server = server
+        self.port = port
+        self.login_url = login_url
         self.user = None
         self.reconnect = False
-        self.__token = None
+        self._token_manager = token_manager
+        self._login_name = None
+        self.archive = archive
         self._correctiontime = 0
 
         # misc
         self._uid = gen_uid()
-        self._silent = 0
+        self.outbox = outbox or PMOutbox(self._send_pm)
         self._maxlen = 11600
-        self._friends = dict()
+        self.presence = Presence()
+        self.presence_tick = presence_tick
+        self._presence_task = None
+        self._friends = self.presence.friends
         self._blocked = list()
         self._premium = False
-        self._history = list()
+        self._history = PMHistory(history_size)
+        self.offline_batch_delay = offline_batch_delay
+        self._offline_batch: List[PMMessage] = []
+        self._offline_last = 0.0
+        self._offline_task = None
 
     def __dir__(self):
         return public_attributes(self)
@@ -110,6 +228,15 @@ class PM(Socket, EventHandler):
     def is_pm(self):
         return True
 
+    @property
+    def token_manager(self) -> TokenManager:
+        return self._token_manager or get_token_manager()
+
+    @property
+    def silent(self) -> bool:
+        """Whether `toofast` has paused sending; the outbox's rate governor decides when it resumes."""
+        return self.outbox.silenced
+
     @property
     def premium(self):
         return self._premium
@@ -123,8 +250,9 @@ class PM(Socket, EventHandler):
         return self._blocked
 
     @property
-    def friends(self):
-        return list(self._friends.keys())
+    def friends(self) -> Dict[str, Friend]:
+        """Watch-list contacts by name; iterating yields names."""
+        return self._friends
 
     async def connect(self, user_name: str, password: str):
         if self.connected:
@@ -133,10 +261,10 @@ class PM(Socket, EventHandler):
         await self._login(user_name, password)
 
     async def _login(self, user_name: str, password: str):
-        if not self.__token:
-            self.__token = await get_token(user_name, password)
-        if self.__token:
-            await self.send_command("tlogin", self.__token, "2", self._uid)
+        self._login_name = user_name
+        token = await self.token_manager.get(user_name, password, self.login_url)
+        if token:
+            await self.send_command("tlogin", token, "2", self._uid)
             self.user = User(user_name)
 
     async def connection_wait(self):
@@ -146,6 +274,7 @@ class PM(Socket, EventHandler):
 
     async def disconnect(self):
         self.reconnect = False
+        self.outbox.cancel()
         await self._disconnect()
 
     async def listen(self, user_name: str, password: str, reconnect=False):
@@ -159,23 +288,38 @@ class PM(Socket, EventHandler):
         await self.complete_tasks()
         self.end_tasks()
 
-    async def send_message(self, target, message: str, use_html: bool = False):
+    def queue_message(self, target, message: str) -> asyncio.Future:
+        """
+        Queue a PM in the outbox without waiting for it to be sent.
+
+        While silenced by `toofast`, messages wait in the outbox and `pm_silent` fires instead of dropping them.
+
+        :returns: asyncio.Future resolved once the message is written.
+        """
         if isinstance(target, User):
             target = target.name
-        if self._silent > time.time():
+        if self.outbox.silenced:
             self.call_event("pm_silent", message)
-        else:
-            if len(message) > 0:
-                message = message  # format_videos(self.user, message)
-                nc, fs, fc, ff = (
-                    f"<n{self.user.styles.name_color}/>",
-                    f"{self.user.styles.font_size}",
-                    f"{self.user.styles.font_color}",
-                    f"{self.user.styles.font_face}",
-                )
-                for msg in message_cut(message, self._maxlen):
-                    msg = f'{nc}<m v="1"><g xs0="0"><g x{fs}s{fc}="{ff}">{msg}</g></g></m>'
-                    await self.send_command("msg", target.lower(), msg)
+        return self.outbox.submit(target.lower(), message)
+
+    async def send_message(self, target, message: str, use_html: bool = False):
+        """Queue a PM and wait until it has been sent."""
+        if len(message) > 0:
+            await self.queue_message(target, message)
+
+    async def _send_pm(self, target: str, message: str):
+        if not self.connected:
+            raise NotConnectedError(self.name)
+        message = message  # format_videos(self.user, message)
+        nc, fs, fc, ff = (
+            f"<n{self.user.styles.name_color}/>",
+            f"{self.user.styles.font_size}",
+            f"{self.user.styles.font_color}",
+            f"{self.user.styles.font_face}",
+        )
+        for msg in message_cut(message, self._maxlen):
+            msg = f'{nc}<m v="1"><g xs0="0"><g x{fs}s{fc}="{ff}">{msg}</g></g></m>'
+            await self.send_command("msg", target, msg)
 
     async def block(self, user):  # TODO
         if isinstance(user, User):
@@ -196,14 +340,12 @@ class PM(Socket, EventHandler):
     def get_friend(self, user):
         if isinstance(user, User):
             user = user.name
-        if user.lower() in self.friends:
-            return self._friends[user]
-        return None
+        return self._friends.get(user.lower())
 
-    def _add_to_history(self, args):
-        if len(self.history) >= 10000:
-            self._history = self._history[1:]
-        self._history.append(args)
+    def _add_to_history(self, msg):
+        self._history.append(msg)
+        if self.archive:
+            self.archive.append(msg, channel=f"pm.{(self._login_name or '').lower()}")
 
     async def enable_bg(self):
         await self.send_command("msgbg", "1")
@@ -238,29 +380,36 @@ class PM(Socket, EventHandler):
         self._connectiontime = float(args[0])
         self._correctiontime = float(self._connectiontime) - time.time()
 
+    async def _drop_token(self):
+        if self._login_name:
+            await self.token_manager.invalidate(self._login_name, self.login_url)
+
     async def _rcmd_kickingoff(self, args):
         self.call_event("pm_kickingoff", args)
-        self.__token = None
+        self.outbox.cancel()
+        await self._drop_token()
         await self._disconnect()
 
     async def _rcmd_DENIED(self, args):
         self.call_event("pm_denied", args)
-        self.__token = None
+        self.outbox.cancel()
+        await self._drop_token()
         await self._disconnect()
 
     async def _rcmd_OK(self, args):
         if self.friends or self.blocked:
-            self.friends.clear()
+            self.presence.clear()
             self.blocked.clear()
         await self.send_command("getpremium")
         await self.send_command("wl")
         await self.send_command("getblock")
 
     async def _rcmd_toofast(self, args):
-        self._silent = time.time() + 12  # seconds to wait
+        self.outbox.governor.on_toofast()
         self.call_event("pm_toofast")
 
     async def _rcmd_msglexceeded(self, args):
+        self.outbox.governor.on_msglexceeded()
         self.call_event("pm_msglexceeded")
 
     async def _rcmd_msg(self, args):
@@ -272,6 +421,19 @@ class PM(Socket, EventHandler):
         msg = await _process_pm(self, args)
         msg._offline = True
         self._add_to_history(msg)
+        self._offline_batch.append(msg)
+        self._offline_last = asyncio.get_running_loop().time()
+        if self._offline_task is None:
+            self._offline_task = self.add_task(self._flush_offline())
+
+    async def _flush_offline(self):
+        """Fire `pm_offline_messages` once with everything received until `offline_batch_delay` of quiet."""
+        loop = asyncio.get_running_loop()
+        while (delay := self._offline_last + self.offline_batch_delay - loop.time()) > 0:
+            await asyncio.sleep(delay)
+        batch, self._offline_batch = self._offline_batch, []
+        self._offline_task = None
+        self.call_event("pm_offline_messages", batch)
 
     async def _rcmd_wlapp(self, args):
         pass
@@ -284,7 +446,7 @@ class PM(Socket, EventHandler):
 
     async def _rcmd_wl(self, args):
         # Restart contact list
-        self._friends.clear()
+        self.presence.clear()
         # Iterate over each contact
         for i in range(len(args) // 4):
             name, last_on, is_on, idle = args[i * 4 : i * 4 + 4]
@@ -299,11 +461,23 @@ class PM(Socket, EventHandler):
             elif is_on in ["app"]:
                 friend._status = "app"
             friend._check_status(float(last_on), None, int(idle))
-            self._friends[str(user.name)] = friend
-            await self.send_command("track", user.name)
+            self.presence.add(friend, notify=False)
+        await self.send_commands(("track", name) for name in list(self._friends))
+
+    def _presence_changed(self, friend: Friend):
+        if self.presence.update(friend) and self._presence_task is None:
+            self._presence_task = self.add_task(self._flush_presence())
+
+    async def _flush_presence(self):
+        """Fire `pm_presence` once per `presence_tick` with every friend whose presence changed."""
+        await asyncio.sleep(self.presence_tick)
+        self._presence_task = None
+        changed = self.presence.drain()
+        if changed:
+            self.call_event("pm_presence", changed)
 
     async def _rcmd_track(self, args):
-        friend = self._friends[args[0]] if args[0] in self.friends else None
+        friend = self._friends.get(args[0])
         if friend:
             friend._idle = False
             if args[2] == "online":
@@ -314,20 +488,23 @@ class PM(Socket, EventHandler):
                 friend._status = "app"
             else:
                 friend._status = args[2]
+            self._presence_changed(friend)
 
     async def _rcmd_idleupdate(self, args):
-        friend = self._friends[args[0]] if args[0] in self.friends else None
+        friend = self._friends.get(args[0])
         if friend:
             friend._last_active = time.time()
             friend._idle = True if args[1] == "0" else False
+            self._presence_changed(friend)
 
     async def _rcmd_status(self, args):
-        friend = self._friends[args[0]] if args[0] in self.friends else None
+        friend = self._friends.get(args[0])
         if friend == None:
             return
         status = True if args[2] == "online" else False
+        friend._status = args[2]
         friend._check_status(float(args[1]), status, 0)
-        self.call_event(f"pm_contact_{args[2]}", friend)
+        self._presence_changed(friend)
 
     async def _rcmd_block_list(self, args):
         self.call_event("pm_block_list")
@@ -335,17 +512,15 @@ class PM(Socket, EventHandler):
     async def _rcmd_wladd(self, args):
         if args[1] == "invalid":
             return
-        friend = self._friends[args[0]] if args[0] in self.friends else None
-        if not friend:
+        if args[0] not in self._friends:
             friend = Friend(User(args[0]), self)
-            self._friends[args[0]] = friend
+            self.presence.add(friend, notify=False)
             self.call_event("pm_contact_addfriend", friend)
-            await self.send_command("wl")
-            await self.send_command("track", args[0].lower())
+            await self.send_commands([("wl",), ("track", args[0].lower())])
 
     async def _rcmd_wldelete(self, args):
         if args[1] == "deleted":
             friend = args[0]
             if friend in self._friends:
-                del self._friends[friend]
+                self.presence.remove(friend)
                 self.call_event("pm_contact_unfriend", args[0])
@@ -0,0 +1,72 @@
+"""Bulk prefetching of user styles & profiles with bounded concurrency."""
+import asyncio
+import logging
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchProgress:
+    """Running totals of one prefetch batch, passed to the progress callback after every user."""
+
+    __slots__ = ("total", "done", "failed", "current")
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.current = None
+
+    @property
+    def fraction(self) -> float:
+        return (self.done + self.failed) / self.total if self.total else 1.0
+
+    @property
+    def finished(self) -> bool:
+        return self.done + self.failed >= self.total
+
+    def __repr__(self):
+        return f"<PrefetchProgress {self.done + self.failed}/{self.total} failed={self.failed}>"
+
+
+async def prefetch_profiles(
+    users: Iterable,
+    concurrency: int = 8,
+    progress: Optional[Callable[[PrefetchProgress], None]] = None,
+) -> PrefetchProgress:
+    """
+    Fetch styles & main profile of many users, at most `concurrency` users at a time.
+
+    Users are fetched in the order given, so callers put the ones they care about first. Anons and
+    duplicates are skipped. Each user fetch goes through the shared profile cache, so cached users are cheap.
+
+    :param Iterable users: Users to fetch.
+    :param int concurrency: Users fetched concurrently; each user issues up to four requests.
+    :param Callable progress: Optional callback invoked with the `PrefetchProgress` after every user.
+
+    :returns: PrefetchProgress
+    """
+    seen = set()
+    pending = []
+    for user in users:
+        if not user.is_anon and user.name not in seen:
+            seen.add(user.name)
+            pending.append(user)
+    state = PrefetchProgress(len(pending))
+    queue = iter(pending)
+
+    async def worker():
+        for user in queue:
+            state.current = user
+            try:
+                await user.get_profile()
+            except Exception as e:
+                state.failed += 1
+                logger.debug("Prefetch of %s failed: %r", user.name, e)
+            else:
+                state.done += 1
+            if progress:
+                progress(state)
+
+    await asyncio.gather(*(worker() for _ in range(min(max(concurrency, 1), len(pending)))))
+    return state
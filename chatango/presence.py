@@ -0,0 +1,84 @@
+"""Watch-list presence index for PM contacts."""
+from typing import Dict, List, Optional, Set, Tuple
+
+from .user import Friend
+
+
+class Presence:
+    """
+    Friends by name plus the sets of names currently online, idle and on the mobile app.
+
+    `update` refreshes the sets after a friend's status changed and remembers the friend until the
+    next `drain`, so many updates in a burst can be reported together.
+    """
+
+    def __init__(self):
+        self.friends: Dict[str, Friend] = {}
+        self.online: Set[str] = set()
+        self.idle: Set[str] = set()
+        self.app: Set[str] = set()
+        self._states: Dict[str, Tuple[Optional[str], Optional[bool]]] = {}
+        self._changed: Dict[str, Friend] = {}
+
+    def __len__(self):
+        return len(self.friends)
+
+    def __contains__(self, name: str):
+        return name in self.friends
+
+    def get(self, name: str) -> Optional[Friend]:
+        return self.friends.get(name)
+
+    def add(self, friend: Friend, notify: bool = True):
+        self.friends[friend.name] = friend
+        self.update(friend, notify)
+
+    def remove(self, name: str) -> Optional[Friend]:
+        friend = self.friends.pop(name, None)
+        self._states.pop(name, None)
+        self._changed.pop(name, None)
+        self.online.discard(name)
+        self.idle.discard(name)
+        self.app.discard(name)
+        return friend
+
+    def clear(self):
+        self.friends.clear()
+        self.online.clear()
+        self.idle.clear()
+        self.app.clear()
+        self._states.clear()
+        self._changed.clear()
+
+    def update(self, friend: Friend, notify: bool = True) -> bool:
+        """
+        Re-index a friend after its status or idle flag changed.
+
+        :returns: bool True when the indexed state actually changed.
+        """
+        name = friend.name
+        state = (friend.status, bool(friend.idle))
+        if self._states.get(name) == state:
+            return False
+        self._states[name] = state
+        for members, member in (
+            (self.online, state[0] == "online"),
+            (self.app, state[0] == "app"),
+            (self.idle, state[1]),
+        ):
+            if member:
+                members.add(name)
+            else:
+                members.discard(name)
+        if notify:
+            self._changed[name] = friend
+        return True
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._changed)
+
+    def drain(self) -> List[Friend]:
+        """Friends whose presence changed since the last drain."""
+        changed, self._changed = list(self._changed.values()), {}
+        return changed
@@ -0,0 +1,193 @@
+"""Persistent SQLite store for fetched profile & style resources, so restarts start with a warm cache."""
+import asyncio
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    user TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    content TEXT,
+    fetched_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (user, resource)
+)
+"""
+
+
+class StoredResource:
+    """One persisted resource with its fetch time and HTTP validators."""
+
+    __slots__ = ("content", "fetched_at", "etag", "last_modified")
+
+    def __init__(self, content: Optional[str], fetched_at: float, etag: Optional[str], last_modified: Optional[str]):
+        self.content = content
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class SQLiteProfileStore:
+    """
+    SQLite (WAL mode) backing store for `ProfileCache`.
+
+    Reads run in the default executor. Writes and deletes are queued in order and committed in batches
+    by a background task every `flush_interval` seconds, or sooner once `batch_size` are pending.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0, batch_size: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        self._lock = threading.Lock()
+        # Queued operations: (user, resource, content, fetched_at, etag, last_modified) writes and
+        # (user, resource) deletes, where a None resource deletes all of a user's resources
+        self._pending: List[Tuple] = []
+        self._writing: List[Tuple] = []  # the batch being committed
+        self._flushing: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+
+    async def count(self) -> int:
+        """Number of stored resources, after committing queued operations."""
+        await self.flush()
+        return await asyncio.get_running_loop().run_in_executor(None, self._count)
+
+    def _select(self, user: str, resource: str) -> Optional[StoredResource]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content, fetched_at, etag, last_modified FROM resources WHERE user = ? AND resource = ?",
+                (user, resource),
+            ).fetchone()
+        return StoredResource(*row) if row else None
+
+    async def get(self, user: str, resource: str) -> Optional[StoredResource]:
+        """Persisted resource, including writes & deletes queued or still being committed."""
+        for op in itertools.chain(reversed(self._pending), reversed(self._writing)):
+            if op[0] == user and (op[1] == resource or op[1] is None):
+                return StoredResource(*op[2:]) if len(op) > 2 else None
+        return await asyncio.get_running_loop().run_in_executor(None, self._select, user, resource)
+
+    def put(
+        self,
+        user: str,
+        resource: str,
+        content: Optional[str],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        fetched_at: Optional[float] = None,
+    ):
+        """Queue a write; it is committed by the background flush task."""
+        self._queue((user, resource, content, fetched_at or time.time(), etag, last_modified))
+
+    def delete(self, user: str, resource: Optional[str] = None):
+        """Queue the removal of one resource of a user, or all of them."""
+        self._queue((user, resource))
+
+    def _queue(self, op: Tuple):
+        self._pending.append(op)
+        self._ensure_flusher()
+        if len(self._pending) >= self.batch_size and self._wakeup:
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return  # no loop yet; flushed on the next put from a loop, or by close()
+            self._wakeup = asyncio.Event()
+            self._flush_task = loop.create_task(self._flush_forever())
+
+    def _write(self, ops: List[Tuple]):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._apply(ops)
+                self._db.execute("COMMIT")
+            except BaseException:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+
+    def _apply(self, ops: List[Tuple]):
+        # Runs of writes go in one executemany; deletes are applied in queue order between them
+        for is_write, group in itertools.groupby(ops, key=lambda op: len(op) > 2):
+            if is_write:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO resources (user, resource, content, fetched_at, etag, last_modified) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    group,
+                )
+                continue
+            for user, resource in group:
+                if resource:
+                    self._db.execute("DELETE FROM resources WHERE user = ? AND resource = ?", (user, resource))
+                else:
+                    self._db.execute("DELETE FROM resources WHERE user = ?", (user,))
+
+    async def flush(self):
+        """
+        Commit all queued operations now. When the commit fails, the batch is rolled back and queued
+        again ahead of newer operations, and the error is logged and raised.
+        """
+        if self._flushing is None:
+            self._flushing = asyncio.Lock()
+        async with self._flushing:  # batches must be committed in order
+            ops, self._pending = self._pending, []
+            if not ops:
+                return
+            self._writing = ops
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, ops)
+            except Exception as e:
+                self._pending[:0] = ops
+                logger.error("Profile store write failed, %d operations queued again: %r", len(ops), e)
+                raise
+            finally:
+                self._writing = []
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:  # pylint: disable=broad-except
+                pass  # logged by flush; retried on the next interval
+
+    async def close(self):
+        """Stop the flush task, commit queued writes and close the database."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        try:
+            await self.flush()
+        finally:
+            with self._lock:
+                self._db.close()
@@ -0,0 +1,176 @@
+"""Cached, de-duplicated fetching of user profile & style resources from ust.chatango.com."""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from .utils import http_get, http_get_conditional
+
+logger = logging.getLogger(__name__)
+
+# Seconds a fetched resource stays fresh, per resource name of `User.links`
+DEFAULT_TTLS = {
+    "msgstyles": 600,
+    "msgbg": 600,
+    "mod1": 1800,
+    "mod2": 1800,
+}
+
+
+class ProfileCache:
+    """
+    TTL cache of profile resources keyed by `(user name, resource)`.
+
+    Concurrent requests for the same key share one in-flight fetch, which runs as its own task so that
+    a cancelled caller does not cancel it for the others. Failed fetches (None) are only remembered for
+    `failure_ttl` seconds, and the least recently used entries are evicted once `max_entries` is exceeded.
+
+    With a persistent `store` (see `chatango.profile_store`), misses are served from disk: fresh entries
+    directly, stale ones immediately while they are revalidated upstream in the background.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = 600,
+        failure_ttl: float = 30,
+        max_entries: int = 20000,
+        fetcher: Callable[[str], Awaitable[Optional[str]]] = http_get,
+        store=None,
+        revalidator: Callable[..., Awaitable[Tuple]] = http_get_conditional,
+    ):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.failure_ttl = failure_ttl
+        self.max_entries = max_entries
+        self.fetcher = fetcher
+        self.store = store
+        self.revalidator = revalidator
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Optional[str]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ttl(self, resource: str) -> float:
+        return self.ttls.get(resource, self.default_ttl)
+
+    def peek(self, user_name: str, resource: str) -> Optional[str]:
+        """Cached value if present and fresh, without fetching."""
+        entry = self._entries.get((user_name, resource))
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def put(self, user_name: str, resource: str, value: Optional[str], ttl: Optional[float] = None):
+        key = (user_name, resource)
+        if ttl is None:
+            ttl = self.ttl(resource) if value is not None else self.failure_ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_name: str, resource: Optional[str] = None):
+        """Drop one cached resource of a user, or all of them."""
+        resources = [resource] if resource else list(self.ttls)
+        for name in resources:
+            self._entries.pop((user_name, name), None)
+        if self.store:
+            self.store.delete(user_name, resource)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get(self, user_name: str, resource: str, url: str) -> Optional[str]:
+        """
+        Fetch a resource through the cache.
+
+        :param str user_name: Lower-cased Chatango user name.
+        :param str resource: Resource name, e.g. `msgstyles` or `mod1`.
+        :param str url: URL to fetch on a miss.
+
+        :returns: Optional[str]
+        """
+        key = (user_name, resource)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._load(user_name, resource, url))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._load_done(key, task))
+        return await asyncio.shield(task)
+
+    def _load_done(self, key: Tuple[str, str], task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved when every caller was cancelled
+
+    async def _load(self, user_name: str, resource: str, url: str) -> Optional[str]:
+        if self.store is None:
+            value = await self.fetcher(url)
+            self.put(user_name, resource, value)
+            return value
+
+        stored = await self.store.get(user_name, resource)
+        if stored is None:
+            return await self._revalidate(user_name, resource, url)
+        remaining = self.ttl(resource) - stored.age()
+        if remaining > 0:
+            self.put(user_name, resource, stored.content, ttl=remaining)
+        else:
+            self.stale_hits += 1
+            self.put(user_name, resource, stored.content)
+            task = asyncio.create_task(self._revalidate(user_name, resource, url, stored))
+            self._refreshing.add(task)
+            task.add_done_callback(self._refresh_done)
+        return stored.content
+
+    async def _revalidate(self, user_name: str, resource: str, url: str, stored=None) -> Optional[str]:
+        """Fetch upstream, conditionally when validators are stored, and write through to memory & disk."""
+        etag = stored.etag if stored else None
+        last_modified = stored.last_modified if stored else None
+        status, value, etag, last_modified = await self.revalidator(url, etag, last_modified)
+        if status == 304:
+            value = stored.content
+        self.put(user_name, resource, value)
+        if value is not None:  # a failed fetch is retried rather than persisted
+            self.store.put(user_name, resource, value, etag, last_modified)
+        return value
+
+    def _refresh_done(self, task: asyncio.Task):
+        self._refreshing.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.debug("Background profile refresh failed: %r", task.exception())
+
+
+_profile_cache = None
+
+
+def get_profile_cache() -> ProfileCache:
+    global _profile_cache
+    if _profile_cache is None:
+        _profile_cache = ProfileCache()
+    return _profile_cache
+
+
+def set_profile_cache(cache: ProfileCache):
+    """Replace the process-wide cache used by `User.get_styles` & `User.get_main_profile`."""
+    global _profile_cache
+    _profile_cache = cache
@@ -0,0 +1,186 @@
+"""Record raw inbound protocol frames and replay them offline through `Room` or `PM` handlers.
+
+Recordings are append-only: an 8 byte magic header followed by records of a little-endian
+`float64` receive timestamp, a `uint32` payload length and the UTF-8 frame itself.
+"""
+import argparse
+import asyncio
+import struct
+import sys
+import time
+import tracemalloc
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MAGIC = b"CHREC\x00\x01\n"
+RECORD_HEADER = struct.Struct("<dI")
+
+
+class FrameRecorder:
+    """Append-only writer of timestamped inbound frames."""
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.frames = 0
+        self._file = open(path, "ab", buffering=64 * 1024)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._last_flush = time.monotonic()
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def write(self, frame: str, timestamp: Optional[float] = None):
+        """Append one frame; the file is flushed at most every `flush_interval` seconds."""
+        payload = frame.encode()
+        self._file.write(RECORD_HEADER.pack(timestamp if timestamp is not None else time.time(), len(payload)))
+        self._file.write(payload)
+        self.frames += 1
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_frames(path: str) -> Iterator[Tuple[float, str]]:
+    """
+    Iterate over `(timestamp, frame)` pairs of a recording.
+
+    :param str path: Recording written by `FrameRecorder`.
+
+    :returns: Iterator[Tuple[float, str]]
+    """
+    # Streamed through a buffered reader, so replaying a large capture does not hold it in memory
+    with open(path, "rb", buffering=1024 * 1024) as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        read = f.read
+        while True:
+            header = read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            timestamp, length = RECORD_HEADER.unpack(header)
+            payload = read(length)
+            if len(payload) < length:
+                break  # truncated tail of a recording that is still being written
+            yield timestamp, payload.decode()
+
+
+def max_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes, or None where `resource` is unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB elsewhere
+
+
+class ReplayReport:
+    """
+    Throughput, latency and memory figures of one replay run.
+
+    Latencies time `_receive_command` alone: the parsing and state updates it does inline. Event handlers
+    and listeners it schedules as tasks run afterwards and are not included.
+    """
+
+    def __init__(self, frames: int, elapsed: float, latencies: List[float], max_lag: float, peak_memory: int):
+        self.frames = frames
+        self.elapsed = elapsed
+        self.latencies = sorted(latencies)
+        self.max_lag = max_lag
+        self.peak_memory = peak_memory
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """Frame dispatch latency in seconds at the given percentile."""
+        if not self.latencies:
+            return 0.0
+        index = min(len(self.latencies) - 1, int(len(self.latencies) * pct / 100))
+        return self.latencies[index]
+
+    def __repr__(self):
+        return (
+            f"<ReplayReport frames:{self.frames} fps:{self.frames_per_second:.0f} "
+            f"p50:{self.percentile(50) * 1e6:.0f}us p99:{self.percentile(99) * 1e6:.0f}us "
+            f"max_lag:{self.max_lag * 1e3:.1f}ms peak_mem:{self.peak_memory / 1024:.0f}KiB>"
+        )
+
+
+async def replay(path: str, target, speed: Optional[float] = None, trace_memory: bool = False) -> ReplayReport:
+    """
+    Feed a recording through `target._receive_command`.
+
+    :param str path: Recording written by `FrameRecorder`.
+    :param target: Disconnected `Room` or `PM` instance to dispatch frames on.
+    :param Optional[float] speed: Playback rate relative to real time; `None` replays as fast as possible.
+    :param bool trace_memory: Report the Python heap peak via `tracemalloc` (slower) instead of the process max RSS;
+        always used where `resource` is unavailable.
+
+    :returns: ReplayReport
+    """
+    loop = asyncio.get_running_loop()
+    latencies = []
+    max_lag = 0.0
+    first_timestamp = None
+    tracing = tracemalloc.is_tracing()
+    trace_memory = trace_memory or resource is None
+    if trace_memory:
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    started = loop.time()
+    for timestamp, frame in read_frames(path):
+        if speed:
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            due = started + (timestamp - first_timestamp) / speed
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        handled = time.perf_counter()
+        await target._receive_command(frame)
+        latencies.append(time.perf_counter() - handled)
+    elapsed = loop.time() - started
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+    else:
+        peak = max_rss()
+    return ReplayReport(len(latencies), elapsed, latencies, max_lag, peak)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded Chatango frame capture.")
+    parser.add_argument("path")
+    parser.add_argument("--room", help="Room name to replay as; replays as PM when omitted.")
+    parser.add_argument("--speed", type=float, default=None, help="Playback rate, e.g. 1 or 10. Omit for max speed.")
+    parser.add_argument("--trace-memory", action="store_true", help="Measure Python heap peak with tracemalloc.")
+    args = parser.parse_args()
+
+    async def run():
+        from .pm import PM
+        from .room import Room
+
+        target = Room(args.room) if args.room else PM()
+        print(await replay(args.path, target, args.speed, args.trace_memory))
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 """Chatango Rooms."""
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional
 from collections import deque, namedtuple
 import html
 import time
@@ -7,9 +7,15 @@ import enum
 import re
 import logging
 import asyncio
-import urllib.request as urlreq
+from urllib.parse import quote, unquote
 
-import aiohttp
+if TYPE_CHECKING:
+    import aiohttp
+
+    from .analytics import RoomAnalytics
+    from .archive import MessageArchive
+    from .identity import IdentityIndex
+    from .search import SearchIndex
 
 from .utils import (
     get_aiohttp_session,
@@ -23,6 +29,7 @@ from .message import Message, MessageFlags, _process, message_cut
 from .user import User, ModeratorFlags, AdminFlags
 from .exceptions import AlreadyConnectedError, InvalidRoomNameError
 from .handler import CommandHandler, EventHandler
+from .prefetch import PrefetchProgress, prefetch_profiles
 
 logger = logging.getLogger(__name__)
 
@@ -65,7 +72,7 @@ class Connection(CommandHandler):
         self._connected = False
         self._first_command = True
         self._connected = False
-        self._connection: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._connection: Optional["aiohttp.ClientWebSocketResponse"] = None
         self._recv_task: Optional[asyncio.Task] = None
         self._ping_task: Optional[asyncio.Task] = None
 
@@ -73,10 +80,12 @@ class Connection(CommandHandler):
     def connected(self):
         return self._connected
 
-    async def _connect(self, server: str):
+    async def _connect(self, server: str, port: int = 8080):
+        import aiohttp
+
         try:
             self._connection = await get_aiohttp_session().ws_connect(
-                f"ws://{server}:8080/", origin="http://st.chatango.com"
+                f"ws://{server}:{port}/", origin="http://st.chatango.com"
             )
             self._connected = True
             self._recv_task = asyncio.create_task(self._do_recv())
@@ -91,6 +100,7 @@ class Connection(CommandHandler):
         if self._connection:
             await self._connection.close()
         self._reset()
+        self._release_streams()
 
     async def _send_command(self, command, terminator="\r\n\0"):
         message = command + terminator
@@ -105,18 +115,22 @@ class Connection(CommandHandler):
                 await self._send_command("\r\n", terminator="\x00")
 
     async def _do_recv(self):
+        from aiohttp import WSMsgType
+
         while self._connection:
             message = await self._connection.receive()
             if not self.connected:
                 break
-            if message.type == aiohttp.WSMsgType.TEXT:
+            if message.type == WSMsgType.TEXT:
                 if message.data:
+                    if self._recorder:
+                        self._recorder.write(message.data)
                     await self._receive_command(message.data)
             elif (
-                message.type == aiohttp.WSMsgType.CLOSE
-                or message.type == aiohttp.WSMsgType.CLOSING
-                or message.type == aiohttp.WSMsgType.CLOSED
-                or message.type == aiohttp.WSMsgType.ERROR
+                message.type == WSMsgType.CLOSE
+                or message.type == WSMsgType.CLOSING
+                or message.type == WSMsgType.CLOSED
+                or message.type == WSMsgType.ERROR
             ):
                 break
             else:
@@ -133,12 +147,30 @@ class Room(Connection, EventHandler):
     def __dir__(self):
         return public_attributes(self)
 
-    def __init__(self, name: str):
+    def __init__(
+        self,
+        name: str,
+        server: Optional[str] = None,
+        port: int = 8080,
+        auto_prefetch: bool = False,
+        prefetch_concurrency: int = 8,
+        archive: Optional["MessageArchive"] = None,
+        search_index: Optional["SearchIndex"] = None,
+        identity_index: Optional["IdentityIndex"] = None,
+        analytics: Optional["RoomAnalytics"] = None,
+    ):
         super().__init__()
         self.assert_valid_name(name)
         self.name = name
-        self.server = get_server(name)
+        self.server = server or get_server(name)
+        self.port = port
         self.reconnect = False
+        self.auto_prefetch = auto_prefetch
+        self.prefetch_concurrency = prefetch_concurrency
+        self.archive = archive
+        self.search_index = search_index
+        self.identity_index = identity_index
+        self.analytics = analytics
         self.owner: Optional[User] = None
         self._uid = gen_uid()
         self._banned_words = ("", "")
@@ -252,7 +284,7 @@ class Room(Connection, EventHandler):
         """
         if self.connected:
             raise AlreadyConnectedError(self.name)
-        await self._connect(self.server)
+        await self._connect(self.server, self.port)
         await self._auth(user_name, password)
 
     async def connection_wait(self):
@@ -265,7 +297,7 @@ class Room(Connection, EventHandler):
         Force this room to disconnect
         """
         for x in self.user_list:
-            x.removeSessionId(self, 0)
+            x.remove_session_id(self, 0)
         self.reconnect = False
         await self._disconnect()
 
@@ -330,13 +362,13 @@ class Room(Connection, EventHandler):
 
     def set_font(self, name_color=None, font_color=None, font_size=None, font_face=None):
         if name_color:
-            self._user._styles._name_color = str(name_color)
+            self._user.styles._name_color = str(name_color)
         if font_color:
-            self._user._styles._font_color = str(font_color)
+            self._user.styles._font_color = str(font_color)
         if font_size:
-            self._user._styles._font_size = int(font_size)
+            self._user.styles._font_size = int(font_size)
         if font_face:
-            self._user._styles._font_face = int(font_face)
+            self._user.styles._font_face = int(font_face)
 
     async def enable_bg(self):
         await self.set_bg_mode(1)
@@ -365,6 +397,53 @@ class Room(Connection, EventHandler):
             ul = set(ul)
         return sorted(list(ul), key=lambda x: x.name.lower())
 
+    def messages_stream(self, maxsize: int = 1000, overflow: str = "block"):
+        """
+        Async iterator of this room's chat messages, see `EventHandler.stream`.
+
+        :returns: EventStream yielding `Message` objects.
+        """
+        from .stream import EventStream, _message_only
+
+        stream = EventStream({"message"}, maxsize, overflow, transform=_message_only)
+        stream.attach(self)
+        return stream
+
+    def recently_active_users(self) -> List[User]:
+        """Registered participants, most recent message senders first, then everyone else."""
+        ordered = {}
+        for msg in reversed(self._history):
+            if not msg.user.is_anon:
+                ordered.setdefault(msg.user.name, msg.user)
+        for user in self._get_user_list():
+            ordered.setdefault(user.name, user)
+        return list(ordered.values())
+
+    async def prefetch_profiles(
+        self,
+        users: Optional[Iterable[User]] = None,
+        concurrency: Optional[int] = None,
+        progress: Optional[Callable[[PrefetchProgress], None]] = None,
+    ) -> PrefetchProgress:
+        """
+        Warm styles & profiles of participants, recently active users first.
+
+        Fires `profiles_prefetched` with the final `PrefetchProgress` when done.
+
+        :param Iterable[User] users: Users to fetch instead of the current participants.
+        :param int concurrency: Users fetched at once, defaults to `prefetch_concurrency`.
+        :param Callable progress: Called with the `PrefetchProgress` after every user.
+
+        :returns: PrefetchProgress
+        """
+        result = await prefetch_profiles(
+            self.recently_active_users() if users is None else users,
+            concurrency or self.prefetch_concurrency,
+            progress,
+        )
+        self.call_event("profiles_prefetched", result)
+        return result
+
     def get_level(self, user):
         if isinstance(user, str):
             user = User(user)
@@ -400,21 +479,35 @@ class Room(Connection, EventHandler):
         await self.send_command("removeblock", unid, ip, name)
 
     def _add_history(self, msg):
-        if len(self._history) == 2900:
+        if len(self._history) >= 2900:
             rest = self._history.popleft()
-            rest.detach()
+            if self._messages.get(rest.id) is rest:
+                del self._messages[rest.id]
+            if self.search_index is not None:
+                self.search_index.evict(rest)
         self._history.append(msg)
+        self._messages[msg.id] = msg
+        if self.search_index is not None:
+            self.search_index.add(msg)
+        if self.archive:
+            self.archive.append(msg)
+        if self.analytics is not None:
+            self.analytics.add_message(msg)
 
     def _add_history_left(self, msg):
         """Add older history unless full."""
         if self.history.maxlen and len(self._history) < self.history.maxlen:
             self._history.appendleft(msg)
             self._messages[msg.id] = msg
+            if self.search_index is not None:
+                self.search_index.add(msg)
 
     def _remove_history(self, msgid):
         msg = self._messages.pop(msgid, None)
         if msg and msg in self._history:
             self._history.remove(msg)
+            if self.search_index is not None:
+                self.search_index.remove(msg)
         return msg
 
     async def unban_user(self, user):
@@ -519,7 +612,7 @@ class Room(Connection, EventHandler):
         :param str whole: List of all banned words (separated by comma)
         """
         if self.user in self._mods and ModeratorFlags.EDIT_BW in self._mods[self.user]:
-            await self.send_command("setbannedwords", urlreq.quote(part), urlreq.quote(whole))
+            await self.send_command("setbannedwords", quote(part), quote(whole))
             return True
         return False
 
@@ -601,6 +694,8 @@ class Room(Connection, EventHandler):
     async def _rcmd_n(self, args):
         """user count"""
         self._user_count = int(args[0], 16)
+        if self.analytics is not None:
+            self.analytics.add_user_count(self.name, self._user_count)
 
     async def _rcmd_i(self, args):
         """history past messages"""
@@ -659,6 +754,8 @@ class Room(Connection, EventHandler):
                 user.set_name(name)
             user.add_session_id(self, ssid)
             self._user_dict[ssid] = [contime, user]
+        if self.auto_prefetch:
+            self.add_task(self.prefetch_profiles())
 
     async def _rcmd_participant(self, args):
         cambio = args[0]  # Leave Join Change
@@ -677,6 +774,14 @@ class Room(Connection, EventHandler):
             is_anon = True
         user = User(name, is_anon=is_anon, puid=puid, ip=unknown)
         user.set_name(name)
+        if self.identity_index is not None:
+            self.identity_index.observe(
+                ip=unknown if unknown != "None" else None,
+                puid=puid,
+                name=None if is_anon else name,
+                room=self.name,
+                when=float(contime) - self._correctiontime,
+            )
         before = None
         if ssid in self._user_dict:
             before = self._user_dict[ssid][1]
@@ -776,6 +881,9 @@ class Room(Connection, EventHandler):
         else:
             self.call_event("ban", user, target)
         self._ban_list[target] = self._BANDATA(args[0], args[1], target, float(args[4]), user)
+        if self.identity_index is not None:
+            name = None if target.is_anon or target.name == "ANON" else target.name
+            self.call_event("ban_associates", target, self.identity_index.associates(name=name, ip=args[1] or None))
 
     async def _rcmd_blocklist(self, args):
         self._ban_list = {}
@@ -801,7 +909,7 @@ class Room(Connection, EventHandler):
         self._unban_queue.append(self._BANDATA(unid, ip, target, float(time), ubsrc))
         if target == "":
             msx = [msg for msg in self._history if msg.unid == unid]
-            target = msx and msx[0].user or User("anon", isanon=True)
+            target = msx and msx[0].user or User("anon", is_anon=True)
             self.call_event("anon_unban", ubsrc, target)
         else:
             target = User(target)
@@ -869,9 +977,9 @@ class Room(Connection, EventHandler):
         """Receive banned word lists from server."""
         part, whole = "", ""
         if args:
-            part = urlreq.unquote(args[0])
+            part = unquote(args[0])
         if len(args) > 1:
-            whole = urlreq.unquote(args[1])
+            whole = unquote(args[1])
         self._banned_words = (part, whole)
         self.call_event("banned_words")
 
@@ -914,16 +1022,16 @@ class Room(Connection, EventHandler):
     async def _rcmd_logoutok(self, args, Force=False):
         """Log out & login as anon."""
         name = get_anon_name(str(self._correctiontime).split(".")[0][-4:], self._puid)
-        self._user = User(name, isanon=True, ip=self._currentIP)
+        self._user = User(name, is_anon=True, ip=self._currentIP)
         self.call_event("logout", self._user, "?")
 
     async def _rcmd_updateprofile(self, args):
         """Cuando alguien actualiza su perfil en un chat"""
         user = User(args[0])
-        user._profile = None
+        user.del_profile()
         self.call_event("profile_changes", user)
 
     async def _rcmd_reload_profile(self, args):
         user = User(args[0])
-        user._profile = None
+        user.del_profile()
         self.call_event("profile_reload", user)
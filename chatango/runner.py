@@ -0,0 +1,86 @@
+"""Event loop construction and tuning for running clients."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+
+def new_event_loop(
+    use_uvloop: Optional[bool] = None,
+    loop_factory: Optional[Callable[[], asyncio.AbstractEventLoop]] = None,
+) -> asyncio.AbstractEventLoop:
+    """
+    Create an event loop, from `loop_factory` if given, else uvloop when wanted and installed.
+
+    :param Optional[bool] use_uvloop: True requires uvloop, None uses it if installed, False never does.
+    :param Callable loop_factory: Zero-argument callable returning a new loop; overrides `use_uvloop`.
+
+    :returns: asyncio.AbstractEventLoop
+    """
+    if loop_factory:
+        return loop_factory()
+    if use_uvloop is not False:
+        try:
+            import uvloop
+        except ImportError:
+            if use_uvloop:
+                raise
+        else:
+            return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def configure_loop(
+    loop: asyncio.AbstractEventLoop,
+    debug: bool = False,
+    slow_callback_duration: Optional[float] = None,
+    executor_workers: Optional[int] = None,
+):
+    """
+    Apply debug mode, the slow callback warning threshold and the default executor size.
+
+    :param bool debug: Enable asyncio debug mode.
+    :param float slow_callback_duration: Seconds after which a callback is logged as slow in debug mode.
+    :param int executor_workers: Threads of the default executor used by `run_in_executor(None, ...)`.
+    """
+    loop.set_debug(debug)
+    if slow_callback_duration is not None:
+        loop.slow_callback_duration = slow_callback_duration
+    if executor_workers:
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="chatango"))
+
+
+def _cancel_all_tasks(loop: asyncio.AbstractEventLoop):
+    tasks = asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+
+def run(
+    main: Awaitable,
+    *,
+    use_uvloop: Optional[bool] = None,
+    loop_factory: Optional[Callable[[], asyncio.AbstractEventLoop]] = None,
+    debug: bool = False,
+    slow_callback_duration: Optional[float] = None,
+    executor_workers: Optional[int] = None,
+) -> Any:
+    """
+    Run `main` to completion on a new, configured event loop, like `asyncio.run`.
+
+    :returns: The result of `main`.
+    """
+    loop = new_event_loop(use_uvloop, loop_factory)
+    configure_loop(loop, debug, slow_callback_duration, executor_workers)
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(main)
+    finally:
+        try:
+            _cancel_all_tasks(loop)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -0,0 +1,478 @@
+"""Inverted index over room history for moderation search across rooms."""
+import asyncio
+import heapq
+import logging
+import re
+import sqlite3
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+FIELDS = ("user", "ip", "unid")
+
+
+def tokenize(text: str) -> Set[str]:
+    """Lowercased words of a message body."""
+    return set(_WORD.findall(text.lower()))
+
+
+def message_terms(msg) -> Set[str]:
+    """Body words plus `user:`, `ip:` and `unid:` field terms of a message."""
+    terms = tokenize(msg.body or "")
+    if msg.user:
+        terms.add(f"user:{msg.user.name.lower()}")
+    if getattr(msg, "ip", None):
+        terms.add(f"ip:{msg.ip}")
+    if getattr(msg, "unid", None):
+        terms.add(f"unid:{msg.unid}")
+    return terms
+
+
+def parse_query(query: str) -> Tuple[List[str], List[str]]:
+    """
+    Split a query into exact & prefix terms: `spam user:someone ip:1.2.* hel*`.
+
+    :returns: (exact terms, prefixes)
+    """
+    exact, prefixes = [], []
+    for part in query.split():
+        field, sep, value = part.partition(":")
+        if sep and field.lower() in FIELDS:
+            term = f"{field.lower()}:{value.lower() if field.lower() == 'user' else value}"
+        else:
+            words = _WORD.findall(part.lower())
+            if not words:
+                continue
+            term = words.pop()
+            exact.extend(words)
+        if part.endswith("*"):
+            prefixes.append(term.rstrip("*"))
+        else:
+            exact.append(term)
+    return exact, prefixes
+
+
+def _bucket(term: str) -> str:
+    """Vocabulary bucket of a term: the field name plus the first two characters of the value."""
+    field, sep, value = term.rpartition(":")
+    return f"{field}{sep}{value[:2]}"
+
+
+def _contains(postings: List[int], doc: int) -> bool:
+    i = bisect_left(postings, doc)
+    return i < len(postings) and postings[i] == doc
+
+
+def _merge_newest_first(lists: List[List[int]]) -> Iterator[int]:
+    """Union of posting lists, newest first, produced lazily so a `limit` stops the merge early."""
+    last = None
+    for doc in heapq.merge(*(reversed(postings) for postings in lists), reverse=True):
+        if doc != last:
+            last = doc
+            yield doc
+
+
+class SearchIndex:
+    """
+    In-memory inverted index of the messages held in `Room.history`, shared by every room of a client.
+
+    Messages are added as they enter a room's history and dropped when they leave it, so the index
+    never outgrows the histories. Posting lists hold document numbers in arrival order: membership is a
+    binary search and removal is lazy, with dead entries swept once they outnumber live documents::
+
+        index = SearchIndex()
+        client = Client(username, password, rooms, search_index=index)
+        ...
+        index.search("free* nitro", since=time.time() - 3600)
+    """
+
+    def __init__(self):
+        self._docs: Dict[int, object] = {}  # document number -> message, oldest first
+        self._numbers: Dict[int, int] = {}  # id(message) -> document number
+        self._postings: Dict[str, List[int]] = {}
+        self._vocabulary: Dict[str, Set[str]] = {}  # bucket -> terms
+        self._next = 0
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, msg):
+        return id(msg) in self._numbers
+
+    @property
+    def terms(self) -> int:
+        return len(self._postings)
+
+    def add(self, msg):
+        """Index a `RoomMessage`."""
+        if id(msg) in self._numbers:
+            return
+        doc = self._next
+        self._next += 1
+        self._docs[doc] = msg
+        self._numbers[id(msg)] = doc
+        for term in message_terms(msg):
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = []
+                self._vocabulary.setdefault(_bucket(term), set()).add(term)
+            postings.append(doc)
+
+    def remove(self, msg):
+        """Forget a message, e.g. evicted from or deleted in its room's history."""
+        doc = self._numbers.pop(id(msg), None)
+        if doc is None:
+            return
+        del self._docs[doc]
+        self._dead += 1
+        if self._dead > 1000 and self._dead > len(self._docs):
+            self._sweep()
+
+    def evict(self, msg):
+        """A message left its room's history."""
+        self.remove(msg)
+
+    def discard_room(self, room):
+        """Forget every message of a room that was left."""
+        for msg in [msg for msg in self._docs.values() if msg.room is room]:
+            self.remove(msg)
+
+    def _sweep(self):
+        docs = self._docs
+        for term in list(self._postings):
+            postings = [doc for doc in self._postings[term] if doc in docs]
+            if postings:
+                self._postings[term] = postings
+            else:
+                del self._postings[term]
+                bucket = self._vocabulary[_bucket(term)]
+                bucket.discard(term)
+                if not bucket:
+                    del self._vocabulary[_bucket(term)]
+        self._dead = 0
+
+    def _expand(self, prefix: str) -> List[List[int]]:
+        """Posting lists of every term starting with `prefix`."""
+        key = _bucket(prefix)
+        if len(prefix.rpartition(":")[2]) >= 2:
+            buckets = [self._vocabulary.get(key, ())]
+        else:
+            buckets = [terms for bucket, terms in self._vocabulary.items() if bucket.startswith(key)]
+        fielded = ":" in prefix  # a plain word prefix never matches field terms
+        return [
+            self._postings[term]
+            for terms in buckets
+            for term in terms
+            if term.startswith(prefix) and (fielded or ":" not in term)
+        ]
+
+    def search(
+        self,
+        query: str = "",
+        user: Optional[str] = None,
+        ip: Optional[str] = None,
+        unid: Optional[str] = None,
+        rooms: Optional[Iterable[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: Optional[int] = 100,
+    ) -> list:
+        """
+        Messages matching every term of `query` and every given filter, most recently indexed first.
+
+        :param str query: Words, `field:value` terms for user/ip/unid, and `prefix*` terms.
+        :param str user: Sender name.
+        :param str ip: Sender IP (only visible to moderators).
+        :param str unid: Sender unid.
+        :param rooms: Room names to search; all rooms when None.
+        :param float since: Earliest message time.
+        :param float until: Latest message time (exclusive).
+        :param int limit: Maximum number of results; None for all.
+
+        :returns: List[RoomMessage]
+        """
+        exact, prefixes = parse_query(query)
+        for field, value in (("user", user and user.lower()), ("ip", ip), ("unid", unid)):
+            if value:
+                exact.append(f"{field}:{value}")
+        required: List[List[int]] = []
+        for term in exact:
+            postings = self._postings.get(term)
+            if not postings:
+                return []
+            required.append(postings)
+        alternatives: List[List[List[int]]] = []
+        for prefix in prefixes:
+            expanded = self._expand(prefix)
+            if not expanded:
+                return []
+            alternatives.append(expanded)
+
+        if required:
+            required.sort(key=len)
+            candidates, required = reversed(required[0]), required[1:]
+        elif alternatives:
+            alternatives.sort(key=lambda lists: sum(map(len, lists)))
+            candidates, alternatives = _merge_newest_first(alternatives[0]), alternatives[1:]
+        else:
+            candidates = reversed(list(self._docs))
+        room_names = set(rooms) if rooms is not None else None
+
+        results = []
+        for doc in candidates:
+            msg = self._docs.get(doc)
+            if msg is None:
+                continue
+            if since is not None and msg.time < since or until is not None and msg.time >= until:
+                continue
+            if room_names is not None and msg.room.name not in room_names:
+                continue
+            if not all(_contains(postings, doc) for postings in required):
+                continue
+            if not all(any(_contains(postings, doc) for postings in lists) for lists in alternatives):
+                continue
+            results.append(msg)
+            if limit and len(results) >= limit:
+                break
+        return results
+
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(
+    body, user UNINDEXED, ip UNINDEXED, unid UNINDEXED, room UNINDEXED, msgid UNINDEXED, time UNINDEXED
+)
+"""
+# FTS5 cannot index the UNINDEXED columns, so (room, msgid) is looked up here and joined on rowid
+KEYS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_keys (rowid INTEGER PRIMARY KEY, room TEXT NOT NULL, msgid TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS message_keys_room_msgid ON message_keys (room, msgid);
+"""
+
+
+class SQLiteSearchIndex:
+    """
+    On-disk counterpart of `SearchIndex` on an SQLite FTS5 table, for searches beyond what the room
+    histories hold. Messages are kept when they leave history and only dropped by `purge`; a message
+    deleted by a moderator is removed. Writes are batched like `SQLiteProfileStore`, and `search` runs
+    in the default executor and returns records instead of `RoomMessage` objects. Deletes are queued into
+    the same batches and found through an indexed `(room, msgid)` table rather than a scan of the FTS table.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0, batch_size: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(SCHEMA)
+        new = not self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'message_keys'").fetchone()
+        self._db.executescript(KEYS_SCHEMA)
+        if new:  # index created before the key table existed
+            self._db.execute("INSERT INTO message_keys (rowid, room, msgid) SELECT rowid, room, msgid FROM messages")
+        self._lock = threading.Lock()
+        self._pending: List[Tuple] = []
+        self._deletes: List[Tuple[str, str]] = []
+        self._flushing: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def add(self, msg):
+        self._pending.append(
+            (
+                msg.body,
+                msg.user.name.lower() if msg.user else "",
+                getattr(msg, "ip", ""),
+                getattr(msg, "unid", ""),
+                msg.room.name,
+                getattr(msg, "id", None),
+                msg.time,
+            )
+        )
+        self._ensure_flusher()
+        if len(self._pending) >= self.batch_size and self._wakeup:
+            self._wakeup.set()
+
+    def evict(self, msg):
+        """Messages leaving history stay on disk."""
+
+    def remove(self, msg):
+        """Drop a deleted message, with the next batch."""
+        self._pending = [row for row in self._pending if not (row[4] == msg.room.name and row[5] == msg.id)]
+        self._deletes.append((msg.room.name, msg.id))
+        self._ensure_flusher()
+
+    def discard_room(self, room):
+        """Rooms left are still searchable on disk."""
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._wakeup = asyncio.Event()
+            self._flush_task = loop.create_task(self._flush_forever())
+
+    def _write(self, rows: List[Tuple], deletes: List[Tuple[str, str]]):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._apply(rows, deletes)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._rollback()
+                raise
+
+    def _rollback(self):
+        if self._db.in_transaction:
+            self._db.execute("ROLLBACK")
+
+    def _apply(self, rows: List[Tuple], deletes: List[Tuple[str, str]]):
+        if rows:
+            # Both tables share explicit rowids, so a key row points at its FTS row
+            first = self._db.execute("SELECT coalesce(max(rowid), 0) + 1 FROM message_keys").fetchone()[0]
+            self._db.executemany(
+                "INSERT INTO messages (rowid, body, user, ip, unid, room, msgid, time)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(first + i, *row) for i, row in enumerate(rows)],
+            )
+            self._db.executemany(
+                "INSERT INTO message_keys (rowid, room, msgid) VALUES (?, ?, ?)",
+                [(first + i, row[4], row[5]) for i, row in enumerate(rows)],
+            )
+        if deletes:
+            self._db.executemany(
+                "DELETE FROM messages WHERE rowid IN (SELECT rowid FROM message_keys WHERE room = ? AND msgid = ?)",
+                deletes,
+            )
+            self._db.executemany("DELETE FROM message_keys WHERE room = ? AND msgid = ?", deletes)
+
+    async def flush(self):
+        """
+        Commit queued messages and deletes now. When the commit fails, the batch is rolled back and queued
+        again ahead of newer ones, and the error is logged and raised.
+        """
+        if self._flushing is None:
+            self._flushing = asyncio.Lock()
+        async with self._flushing:  # a delete must not overtake the insert of its message
+            rows, self._pending = self._pending, []
+            deletes, self._deletes = self._deletes, []
+            if not (rows or deletes):
+                return
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, rows, deletes)
+            except Exception as e:
+                self._pending[:0] = rows
+                self._deletes[:0] = deletes
+                logger.error(
+                    "Search index write failed, %d messages and %d deletes queued again: %r", len(rows), len(deletes), e
+                )
+                raise
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:  # pylint: disable=broad-except
+                pass  # logged by flush; retried on the next interval
+
+    def _select(self, query: str, filters: Dict[str, object], since, until, rooms, limit) -> List[dict]:
+        exact, prefixes = parse_query(query)
+        words = [f'"{term}"' for term in exact if ":" not in term] + [f'"{p}"*' for p in prefixes if ":" not in p]
+        for term in exact:
+            field, sep, value = term.partition(":")
+            if sep:
+                filters.setdefault(field, value)
+        clauses, params = [], []
+        if words:
+            clauses.append("body MATCH ?")
+            params.append(" ".join(words))
+        for field, value in filters.items():
+            if value:
+                clauses.append(f"{field} = ?")
+                params.append(value)
+        for prefix in prefixes:
+            field, sep, value = prefix.partition(":")
+            if sep:
+                clauses.append(f"{field} LIKE ?")
+                params.append(value.replace("%", r"\%").replace("_", r"\_") + "%")
+        if since is not None:
+            clauses.append("time >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("time < ?")
+            params.append(until)
+        if rooms is not None:
+            rooms = list(rooms)
+            clauses.append(f"room IN ({','.join('?' * len(rooms))})")
+            params.extend(rooms)
+        sql = "SELECT body, user, ip, unid, room, msgid, time FROM messages"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY rowid DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        keys = ("body", "user", "ip", "unid", "room", "id", "time")
+        with self._lock:
+            return [dict(zip(keys, row)) for row in self._db.execute(sql, params)]
+
+    async def search(
+        self,
+        query: str = "",
+        user: Optional[str] = None,
+        ip: Optional[str] = None,
+        unid: Optional[str] = None,
+        rooms: Optional[Iterable[str]] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: Optional[int] = 100,
+    ) -> List[dict]:
+        """Same parameters as `SearchIndex.search`; flushes queued messages first."""
+        await self.flush()
+        filters = {"user": user and user.lower(), "ip": ip, "unid": unid}
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._select, query, filters, since, until, rooms, limit
+        )
+
+    async def purge(self, before: float) -> int:
+        """Delete messages older than `before`; returns the number removed."""
+        await self.flush()
+
+        def delete():
+            with self._lock:
+                self._db.execute("BEGIN")
+                try:
+                    self._db.execute(
+                        "DELETE FROM message_keys WHERE rowid IN (SELECT rowid FROM messages WHERE time < ?)", (before,)
+                    )
+                    removed = self._db.execute("DELETE FROM messages WHERE time < ?", (before,)).rowcount
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._rollback()
+                    raise
+                return removed
+
+        return await asyncio.get_running_loop().run_in_executor(None, delete)
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        try:
+            await self.flush()
+        finally:
+            with self._lock:
+                self._db.close()
@@ -0,0 +1,502 @@
+"""Local Chatango protocol simulator for load and regression testing.
+
+Serves the room websocket protocol and the PM TCP protocol on localhost so `Room`, `PM` and `Client`
+can run without credentials or network access::
+
+    async with ChatangoSimulator(script=SimulationScript(message_rate=50)) as sim:
+        client = Client("bot", "secret", ["lobby"], **sim.client_kwargs())
+        await client.run()
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set
+
+import aiohttp
+from aiohttp import web
+
+TERMINATOR = "\r\n\x00"
+
+
+def room_message_frame(
+    msg_time: float,
+    name: str,
+    body: str,
+    puid: str = "12345678",
+    unid: str = "",
+    msgid: str = "",
+    ip: str = "",
+    flags: int = 0,
+    tname: str = "",
+    command: str = "b",
+) -> str:
+    """
+    Build a `b` (live) or `i` (history) room message frame.
+
+    :returns: str
+    """
+    styled = f'<n000000/><f x11000000="0">{body}</f>'
+    return f"{command}:{msg_time}:{name}:{tname}:{puid}:{unid}:{msgid}:{ip}:{flags}::{styled}"
+
+
+def participant_frame(change: str, ssid: str, puid: str, name: str, tname: str, ip: str, contime: float) -> str:
+    """
+    Build a `participant` frame; `change` is "0" for leave, "1" for join and "2" for a login change.
+
+    :returns: str
+    """
+    return f"participant:{change}:{ssid}:{puid}:{name}:{tname}:{ip}:{contime}"
+
+
+def participants_frame(participants: List[tuple]) -> str:
+    """
+    Build a `g_participants` frame from `(ssid, contime, puid, name, tname)` tuples.
+
+    :returns: str
+    """
+    return "g_participants:" + ";".join(f"{s}:{c}:{p}:{n}:{t}:0" for s, c, p, n, t in participants)
+
+
+def blocklist_frame(bans: List[tuple], command: str = "blocklist") -> str:
+    """
+    Build a `blocklist` or `unblocklist` frame from `(unid, ip, name, time, src)` tuples.
+
+    :returns: str
+    """
+    return f"{command}:" + ";".join(f"{u}:{i}:{n}:{t}:{s}" for u, i, n, t, s in bans)
+
+
+def pm_message_frame(sender: str, msg_time: float, body: str, command: str = "msg") -> str:
+    """
+    Build a `msg` (live) or `msgoff` (offline) PM frame.
+
+    :returns: str
+    """
+    return f'{command}:{sender}::{sender}:{msg_time}:0:<n000000/><m v="1"><g x11s000000="0">{body}</g></m>'
+
+
+def watchlist_frame(friends: List[tuple]) -> str:
+    """
+    Build a `wl` frame from `(name, last_on, status, idle)` tuples.
+
+    :returns: str
+    """
+    return "wl:" + ":".join(f"{n}:{l}:{s}:{i}" for n, l, s, i in friends)
+
+
+class SimulationScript:
+    """Scripted load profile applied to every simulated room."""
+
+    def __init__(
+        self,
+        participants: int = 20,
+        anon_ratio: float = 0.3,
+        message_rate: float = 1.0,
+        join_rate: float = 0.0,
+        leave_rate: float = 0.0,
+        disconnect_after: Optional[float] = None,
+        history: int = 20,
+        bans: int = 5,
+        friends: int = 10,
+        tick: float = 0.05,
+        seed: Optional[int] = None,
+    ):
+        """
+        :param int participants: Users present in a room when it is first joined.
+        :param float anon_ratio: Share of generated users that are anons.
+        :param float message_rate: Chat messages per second, per room.
+        :param float join_rate: Joins per second, per room.
+        :param float leave_rate: Leaves per second, per room.
+        :param Optional[float] disconnect_after: Seconds before the server drops each connection.
+        :param int history: Past messages sent with `i` frames after `inited`.
+        :param int bans: Entries in the room ban list.
+        :param int friends: Contacts in the PM watch list.
+        :param float tick: Scheduling granularity of the room drivers, in seconds.
+        :param Optional[int] seed: Seed for reproducible runs.
+        """
+        self.participants = participants
+        self.anon_ratio = anon_ratio
+        self.message_rate = message_rate
+        self.join_rate = join_rate
+        self.leave_rate = leave_rate
+        self.disconnect_after = disconnect_after
+        self.history = history
+        self.bans = bans
+        self.friends = friends
+        self.tick = tick
+        self.seed = seed
+
+
+class _SimRoom:
+    """Server-side state of one simulated room."""
+
+    def __init__(self, name: str, script: SimulationScript, rng: random.Random):
+        self.name = name
+        self.script = script
+        self.rng = rng
+        self.clients: Set[web.WebSocketResponse] = set()
+        self.participants: Dict[str, tuple] = {}
+        self.history = deque(maxlen=max(script.history, 1))
+        self.driver: Optional[asyncio.Task] = None
+        self.messages_sent = 0
+        self._next_id = 0
+        self._sends: Set[asyncio.Task] = set()
+        for _ in range(script.participants):
+            self._add_participant()
+        for _ in range(script.history):
+            self.history.append(self._message_frame("i"))
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _add_participant(self) -> tuple:
+        n = self._new_id()
+        ssid = str(100000 + n)
+        puid = str(10000000 + n)
+        contime = f"{time.time():.2f}"
+        if self.rng.random() < self.script.anon_ratio:
+            entry = (ssid, contime, puid, "None", "None")
+        else:
+            entry = (ssid, contime, puid, f"simuser{n}", "None")
+        self.participants[ssid] = entry
+        return entry
+
+    def _message_frame(self, command: str, body: Optional[str] = None, msgid: Optional[str] = None) -> str:
+        if self.participants:
+            _, _, puid, name, _ = self.rng.choice(list(self.participants.values()))
+        else:
+            puid, name = "10000000", "simuser0"
+        n = self._new_id()
+        if name == "None":
+            name = ""
+        return room_message_frame(
+            time.time(),
+            name,
+            body or f"simulated message {n} @simuser{self.rng.randint(1, n)}",
+            puid=puid,
+            unid=f"unid{puid}",
+            msgid=msgid or str(n),
+            ip=f"10.0.{n % 256}.{(n // 256) % 256}",
+            command=command,
+        )
+
+    def broadcast(self, frame: str):
+        for ws in list(self.clients):
+            if not ws.closed:
+                task = asyncio.ensure_future(ws.send_str(frame))
+                self._sends.add(task)
+                task.add_done_callback(self._sends.discard)
+
+    def post_message(self, body: Optional[str] = None):
+        temp_id = f"t{self._new_id()}"
+        frame = self._message_frame("b", body, msgid=temp_id)
+        self.history.append("i" + frame[1:])
+        self.broadcast(frame)
+        self.broadcast(f"u:{temp_id}:{self._new_id()}")
+        self.messages_sent += 1
+
+    def join(self):
+        ssid, contime, puid, name, tname = self._add_participant()
+        self.broadcast(participant_frame("1", ssid, puid, name, tname, "", float(contime)))
+
+    def leave(self):
+        if not self.participants:
+            return
+        ssid = self.rng.choice(list(self.participants))
+        _, contime, puid, name, tname = self.participants.pop(ssid)
+        self.broadcast(participant_frame("0", ssid, puid, name, tname, "", float(contime)))
+
+    async def drive(self):
+        """Emit scripted messages and churn while at least one client is connected."""
+        script = self.script
+        budget = {"message": 0.0, "join": 0.0, "leave": 0.0}
+        while self.clients:
+            await asyncio.sleep(script.tick)
+            budget["message"] += script.message_rate * script.tick
+            budget["join"] += script.join_rate * script.tick
+            budget["leave"] += script.leave_rate * script.tick
+            while budget["message"] >= 1:
+                budget["message"] -= 1
+                self.post_message()
+            while budget["join"] >= 1:
+                budget["join"] -= 1
+                self.join()
+            while budget["leave"] >= 1:
+                budget["leave"] -= 1
+                self.leave()
+        self.driver = None
+
+
+class ChatangoSimulator:
+    """Local stand-in for the Chatango room and PM servers."""
+
+    def __init__(
+        self, host: str = "127.0.0.1", ws_port: int = 0, pm_port: int = 0, script: Optional[SimulationScript] = None
+    ):
+        self.host = host
+        self.ws_port = ws_port
+        self.pm_port = pm_port
+        self.script = script or SimulationScript()
+        self.rooms: Dict[str, _SimRoom] = {}
+        self.pm_clients: Dict[str, asyncio.StreamWriter] = {}
+        self.received: deque = deque(maxlen=10000)
+        self._rng = random.Random(self.script.seed)
+        self._runner: Optional[web.AppRunner] = None
+        self._pm_server: Optional[asyncio.AbstractServer] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    @property
+    def login_url(self) -> str:
+        return f"http://{self.host}:{self.ws_port}/login"
+
+    def server_resolver(self, room_name: str) -> str:
+        """Drop-in replacement for `get_server` that routes every room to the simulator."""
+        return self.host
+
+    def client_kwargs(self) -> dict:
+        """
+        Keyword arguments pointing a `Client` at this simulator.
+
+        :returns: dict
+        """
+        return {
+            "server_resolver": self.server_resolver,
+            "room_port": self.ws_port,
+            "pm_server": self.host,
+            "pm_port": self.pm_port,
+            "login_url": self.login_url,
+        }
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/", self._handle_ws)
+        app.router.add_post("/login", self._handle_login)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.ws_port)
+        await site.start()
+        self.ws_port = site._server.sockets[0].getsockname()[1]
+        self._pm_server = await asyncio.start_server(self._handle_pm, self.host, self.pm_port)
+        self.pm_port = self._pm_server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for room in self.rooms.values():
+            for ws in list(room.clients):
+                await ws.close()
+            if room.driver:
+                room.driver.cancel()
+        for writer in list(self.pm_clients.values()):
+            writer.close()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pm_server:
+            self._pm_server.close()
+            await self._pm_server.wait_closed()
+        if self._runner:
+            await self._runner.cleanup()
+
+    def get_room(self, name: str) -> _SimRoom:
+        if name not in self.rooms:
+            self.rooms[name] = _SimRoom(name, self.script, self._rng)
+        return self.rooms[name]
+
+    def post_message(self, room_name: str, body: str):
+        """Inject a chat message into a simulated room."""
+        self.get_room(room_name).post_message(body)
+
+    async def disconnect_room(self, room_name: str):
+        """Drop every client connected to a room."""
+        room = self.rooms.get(room_name)
+        if room:
+            for ws in list(room.clients):
+                await ws.close()
+
+    async def send_pm(self, user_name: str, sender: str, body: str):
+        """Deliver a PM to a connected PM client."""
+        writer = self.pm_clients.get(user_name.lower())
+        if writer:
+            writer.write((pm_message_frame(sender, time.time(), body) + TERMINATOR).encode())
+            await writer.drain()
+
+    def _schedule_disconnect(self, close):
+        if self.script.disconnect_after is not None:
+            task = asyncio.create_task(self._delayed_close(close))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _delayed_close(self, close):
+        await asyncio.sleep(self.script.disconnect_after)
+        await close()
+
+    async def _handle_login(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        response = web.Response(text="ok")
+        if data.get("user_id") and data.get("password"):
+            response.cookies["auth.chatango.com"] = f"simtoken-{data['user_id']}"
+        return response
+
+    async def _handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        room: Optional[_SimRoom] = None
+        try:
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                for command in message.data.split(TERMINATOR):
+                    command = command.strip("\r\n\x00")
+                    if not command:
+                        continue
+                    self.received.append(command)
+                    action, *args = command.split(":")
+                    if action == "bauth":
+                        room = self.get_room(args[0])
+                        room.clients.add(ws)
+                        await self._room_login(ws, room, args)
+                        self._schedule_disconnect(ws.close)
+                        if room.driver is None:
+                            room.driver = asyncio.create_task(room.drive())
+                    elif room is not None:
+                        await self._room_command(ws, room, action, args)
+        finally:
+            if room is not None:
+                room.clients.discard(ws)
+        return ws
+
+    async def _room_login(self, ws: web.WebSocketResponse, room: _SimRoom, args: List[str]):
+        user_name = args[2] if len(args) > 2 else ""
+        password = args[3] if len(args) > 3 else ""
+        login_as = "M" if user_name and password else "C"
+        await ws.send_str(f"ok:simowner:24351234:{login_as}:{user_name}:{time.time():.2f}:127.0.0.1::0")
+        await ws.send_str("inited")
+
+    async def _room_command(self, ws: web.WebSocketResponse, room: _SimRoom, action: str, args: List[str]):
+        reply = []
+        if action in ("g_participants", "gparticipants"):
+            reply.append(participants_frame(list(room.participants.values())))
+            reply.append(f"n:{len(room.participants):x}")
+            reply.extend(room.history)
+        elif action == "blocklist":
+            now = time.time()
+            bans = [(f"unid{i}", f"10.1.0.{i}", f"banned{i}", now - i, "simowner") for i in range(room.script.bans)]
+            reply.append(blocklist_frame(bans, "blocklist" if args and args[0] == "block" else "unblocklist"))
+        elif action == "getpremium":
+            reply.append("premium:200:0")
+        elif action == "getannouncement":
+            reply.append("getannc:none")
+        elif action == "getbannedwords":
+            reply.append("bw::")
+        elif action == "getratelimit":
+            reply.append("getratelimit:0:0")
+        elif action == "bm":
+            room.post_message(":".join(args[2:]))
+        for frame in reply:
+            await ws.send_str(frame)
+
+    async def _handle_pm(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        user_name = None
+        buffer = ""
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                buffer += data.decode()
+                *commands, buffer = buffer.split("\x00")
+                for command in commands:
+                    command = command.strip("\r\n")
+                    if not command:
+                        continue
+                    self.received.append(command)
+                    action, *args = command.split(":")
+                    if action == "tlogin":
+                        user_name = args[0].replace("simtoken-", "", 1).lower()
+                        self.pm_clients[user_name] = writer
+                        self._schedule_disconnect(self._closer(writer))
+                        self._pm_write(writer, "OK", f"time:{time.time():.2f}", "seller_name:0:")
+                    else:
+                        self._pm_command(writer, action, args)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if user_name and self.pm_clients.get(user_name) is writer:
+                del self.pm_clients[user_name]
+            writer.close()
+
+    def _closer(self, writer: asyncio.StreamWriter):
+        async def close():
+            writer.close()
+
+        return close
+
+    def _pm_write(self, writer: asyncio.StreamWriter, *frames: str):
+        writer.write("".join(frame + TERMINATOR for frame in frames).encode())
+
+    def _pm_command(self, writer: asyncio.StreamWriter, action: str, args: List[str]):
+        if action == "getpremium":
+            self._pm_write(writer, "premium:200:0")
+        elif action == "wl":
+            friends = [
+                (f"simfriend{i}", f"{time.time() - i * 60:.0f}", "on" if i % 2 else "off", "0")
+                for i in range(self.script.friends)
+            ]
+            self._pm_write(writer, watchlist_frame(friends))
+        elif action == "getblock":
+            self._pm_write(writer, "block_list:")
+        elif action == "track":
+            self._pm_write(writer, f"track:{args[0]}:0:online")
+        elif action == "wladd":
+            self._pm_write(writer, f"wladd:{args[0]}:on:{time.time():.0f}")
+        elif action == "wldelete":
+            self._pm_write(writer, f"wldelete:{args[0]}:deleted:0")
+        elif action == "msg":
+            target = self.pm_clients.get(args[0].lower())
+            if target:
+                sender = next((name for name, w in self.pm_clients.items() if w is writer), "anon")
+                self._pm_write(target, f"msg:{sender}::{sender}:{time.time():.2f}:0:{':'.join(args[1:])}")
+
+
+async def _serve(args):
+    script = SimulationScript(
+        participants=args.participants,
+        message_rate=args.message_rate,
+        join_rate=args.join_rate,
+        leave_rate=args.leave_rate,
+        disconnect_after=args.disconnect_after,
+        seed=args.seed,
+    )
+    async with ChatangoSimulator(args.host, args.ws_port, args.pm_port, script) as sim:
+        print(f"Simulating rooms on ws://{sim.host}:{sim.ws_port}/ and PM on {sim.host}:{sim.pm_port}")
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Chatango protocol simulator.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ws-port", type=int, default=8080)
+    parser.add_argument("--pm-port", type=int, default=8443)
+    parser.add_argument("--participants", type=int, default=20)
+    parser.add_argument("--message-rate", type=float, default=1.0)
+    parser.add_argument("--join-rate", type=float, default=0.0)
+    parser.add_argument("--leave-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-after", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Async iterators over room & PM events, backed by bounded buffers."""
+import asyncio
+from collections import deque, namedtuple
+from typing import Any, Callable, Iterable, List, Optional
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+StreamEvent = namedtuple("StreamEvent", ["source", "event", "args"])
+
+
+class EventStream:
+    """
+    Buffer of events pushed by `EventHandler.call_event`, consumed with `async for` or in batches::
+
+        async with room.messages_stream() as messages:
+            while True:
+                batch = await messages.get_batch(100, timeout=0.05)
+
+    With the `block` overflow policy the buffer is soft-bounded: once `maxsize` items are waiting, the
+    connection feeding the stream stops reading frames until the consumer catches up. The `drop_oldest`
+    and `drop_newest` policies never hold up the connection and count discarded items in `dropped`.
+    """
+
+    def __init__(
+        self,
+        events: Optional[Iterable[str]] = None,
+        maxsize: int = 1000,
+        overflow: str = "block",
+        transform: Optional[Callable[[Any, str, tuple], Any]] = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        self.events = set(events) if events else None
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.transform = transform or StreamEvent
+        self.dropped = 0
+        self.closed = False
+        self._buffer: deque = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._sources: List[Any] = []
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.get()
+        except EOFError:
+            raise StopAsyncIteration from None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def offer(self, source, event: str, args: tuple):
+        """Called by the event source for every event; filters and buffers without awaiting."""
+        if self.closed or (self.events is not None and event not in self.events):
+            return
+        if len(self._buffer) >= self.maxsize:
+            if self.overflow == "drop_newest":
+                self.dropped += 1
+                return
+            if self.overflow == "drop_oldest":
+                self.dropped += 1
+                self._buffer.popleft()
+        self._buffer.append(self.transform(source, event, args))
+        self._readable.set()
+        if self.overflow == "block" and len(self._buffer) >= self.maxsize:
+            self._writable.clear()
+
+    @property
+    def writable(self) -> bool:
+        """False while a `block` stream is full."""
+        return self._writable.is_set()
+
+    async def wait_writable(self):
+        """Wait until the buffer has room again; only ever waits with the `block` policy."""
+        if not self._writable.is_set():
+            await self._writable.wait()
+
+    def _taken(self):
+        if not self._buffer:
+            self._readable.clear()
+        if len(self._buffer) < self.maxsize:
+            self._writable.set()
+
+    async def get(self):
+        """Next item; raises `EOFError` once the stream is closed and drained."""
+        while not self._buffer:
+            if self.closed:
+                raise EOFError("stream closed")
+            await self._readable.wait()
+        item = self._buffer.popleft()
+        self._taken()
+        return item
+
+    async def get_batch(self, max_items: int, timeout: float) -> list:
+        """
+        Up to `max_items` items, waiting at most `timeout` seconds for the batch to fill.
+
+        :returns: list, empty when nothing arrived in time.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # A full buffer cannot grow further, as the producer is paused until we take from it
+        while len(self._buffer) < min(max_items, self.maxsize) and not self.closed:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._readable.clear()
+            try:
+                await asyncio.wait_for(self._readable.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        batch = [self._buffer.popleft() for _ in range(min(max_items, len(self._buffer)))]
+        self._taken()
+        return batch
+
+    def attach(self, source):
+        """Start receiving the events of an `EventHandler`."""
+        if not self.closed and source not in self._sources:
+            source.add_stream(self)
+            self._sources.append(source)
+
+    def close(self):
+        """Detach from every source; buffered items can still be read."""
+        self.closed = True
+        for source in self._sources:
+            source.remove_stream(self)
+        self._sources.clear()
+        self._readable.set()
+        self._writable.set()
+
+
+def _message_only(source, event: str, args: tuple):
+    return args[0]
@@ -1,4 +1,5 @@
 """Chatango User objects."""
+import asyncio
 import enum
 import json, urllib
 from typing import Any, Optional
@@ -6,9 +7,11 @@ import html
 import re
 import time
 import datetime
-from collections import deque
+import weakref
+from collections import OrderedDict, deque
 
-from .utils import http_get, public_attributes
+from .profiles import get_profile_cache
+from .utils import public_attributes
 
 
 class ModeratorFlags(enum.IntFlag):
@@ -42,39 +45,112 @@ AdminFlags = (
 )
 
 
-class User:
-    _users = {}
+class UserRegistry:
+    """
+    Interning registry for `User` objects.
 
-    def __new__(cls, name, **kwargs):
-        key = name.lower()
-        if key in User._users:
-            user = User._users[key]
+    Users are held weakly, so they stay interned only while a room, message, friend list or history
+    still references them. The most recently seen users are also kept alive by a bounded LRU so that
+    passers-by keep their identity (and fetched styles) across short gaps.
+    """
+
+    def __init__(self, recent: int = 2000):
+        self._refs = weakref.WeakValueDictionary()
+        self._recent = OrderedDict()
+        self._recent_limit = recent
+
+    def __len__(self):
+        return len(self._refs)
+
+    def __contains__(self, key):
+        return key in self._refs
+
+    @property
+    def recent_limit(self) -> int:
+        return self._recent_limit
+
+    def get(self, key: str):
+        user = self._refs.get(key)
+        if user is not None:
+            self._touch(key, user)
+        return user
+
+    def add(self, key: str, user):
+        self._refs[key] = user
+        self._touch(key, user)
+
+    def _touch(self, key: str, user):
+        if not self._recent_limit:
+            return
+        recent = self._recent
+        if key in recent:
+            recent.move_to_end(key)
         else:
+            recent[key] = user
+            if len(recent) > self._recent_limit:
+                recent.popitem(last=False)
+
+    def resize(self, recent: int):
+        """Change how many recently seen users are kept alive without other references."""
+        self._recent_limit = recent
+        while len(self._recent) > recent:
+            self._recent.popitem(last=False)
+
+    def clear(self):
+        self._recent.clear()
+        self._refs.clear()
+
+
+class User:
+    __slots__ = (
+        "_styles",
+        "_name",
+        "_ip",
+        "_flags",
+        "_history",
+        "_is_anon",
+        "_sids",
+        "_show_name",
+        "_is_premium",
+        "_puid",
+        "_client",
+        "_last_time",
+        "__weakref__",
+    )
+
+    _users = UserRegistry()
+
+    def __new__(cls, name, *args, **kwargs):
+        key = name.lower()
+        user = User._users.get(key)
+        if user is None:
             user = super().__new__(cls)
-            setattr(user, "__new_obj", True)
-            User._users[key] = user
+            user._styles = None
+            user._name = key
+            user._ip = None
+            user._flags = 0
+            user._history = None
+            user._is_anon = False
+            user._sids = None
+            user._show_name = name
+            user._is_premium = None
+            user._puid = ""
+            user._client = None
+            user._last_time = None
+            User._users.add(key, user)
         return user
 
-    def __init__(self, name, **kwargs):
-        if hasattr(self, "__new_obj"):
-            self._styles = Styles()
-            self._name = name.lower()
-            self._ip = None
-            self._flags = 0
-            self._history = deque(maxlen=5)
-            self._is_anon = False
-            self._sids = {}
-            self._show_name = name
-            self._is_premium = None
-            self._puid = str()
-            self._client = None
-            self._last_time = None
-            delattr(self, "__new_obj")
-
+    def __init__(self, name, ip=None, is_anon=None, puid=None, **kwargs):
+        if ip:
+            self._ip = ip  # only valid ips
+        if is_anon is not None:
+            self._is_anon = is_anon
+        if puid is not None:
+            self._puid = puid
         for attr, val in kwargs.items():
-            if attr == "ip" and not val:
-                continue  # only valid ips
-            setattr(self, "_" + attr, val)
+            # Users are slotted: keys without a matching field are ignored rather than stored
+            if "_" + attr in User.__slots__:
+                setattr(self, "_" + attr, val)
 
     def __dir__(self):
         return public_attributes(self)
@@ -84,19 +160,19 @@ class User:
 
     @property
     def age(self):
-        return self.styles._profile["about"]["age"]
+        return self.styles.profile["about"]["age"]
 
     @property
     def last_change(self):
-        return self.styles._profile["about"]["last_change"]
+        return self.styles.profile["about"]["last_change"]
 
     @property
     def gender(self):
-        return self.styles._profile["about"]["gender"]
+        return self.styles.profile["about"]["gender"]
 
     @property
     def location(self):
-        return self.styles._profile["about"]["location"]
+        return self.styles.profile["about"]["location"]
 
     @property
     def get_user_dir(self):
@@ -121,8 +197,16 @@ class User:
 
     @property
     def styles(self):
+        if self._styles is None:
+            self._styles = Styles()
         return self._styles
 
+    @property
+    def history(self):
+        if self._history is None:
+            self._history = deque(maxlen=5)
+        return self._history
+
     @property
     def thumb(self):
         if not self.is_anon:
@@ -171,23 +255,27 @@ class User:
         self._name = val.lower()
 
     def del_profile(self):
-        if self.styles._profile:
-            del self._styles._profile
-            self._styles._profile.update(dict(about={}, full={}))
+        if self._styles is not None:
+            self._styles._profile = None
+        get_profile_cache().invalidate(self.name)
 
     def add_session_id(self, room, sid):
+        if self._sids is None:
+            self._sids = {}
         if room not in self._sids:
             self._sids[room] = set()
         self._sids[room].add(sid)
 
     def get_session_ids(self, room=None):
+        if not self._sids:
+            return set()
         if room:
             return self._sids.get(room, set())
         else:
             return set.union(*self._sids.values())
 
     def remove_session_id(self, room, sid):
-        if room in self._sids:
+        if self._sids and room in self._sids:
             if not sid:
                 self._sids[room].clear()
             elif sid in self._sids[room]:
@@ -195,74 +283,123 @@ class User:
             if len(self._sids[room]) == 0:
                 del self._sids[room]
 
+    async def _fetch(self, *resources):
+        """Fetch profile resources concurrently through the shared profile cache."""
+        cache = get_profile_cache()
+        links = self.links
+        return await asyncio.gather(*(cache.get(self.name, resource, links[resource]) for resource in resources))
+
     async def get_styles(self):
+        if not self.is_anon:
+            msg_styles, msg_bg = await self._fetch("msgstyles", "msgbg")
+            self._apply_styles(msg_styles, msg_bg)
+
+    async def get_main_profile(self):
+        if not self.is_anon:
+            mod1, mod2 = await self._fetch("mod1", "mod2")
+            self._apply_main_profile(mod1, mod2)
+
+    async def get_profile(self):
+        """Fetch styles, background and profile, all four resources at once."""
+        if not self.is_anon:
+            msg_styles, msg_bg, mod1, mod2 = await self._fetch("msgstyles", "msgbg", "mod1", "mod2")
+            self._apply_styles(msg_styles, msg_bg)
+            self._apply_main_profile(mod1, mod2)
+
+    def _apply_styles(self, msg_styles, msg_bg):
         position_dict = {
             "tl": "top left",
             "tr": "top right",
             "bl": "bottom left",
             "br": "bottom right",
         }
-        if not self.is_anon:
-            msg_styles = await http_get(self.links["msgstyles"])
-            msg_bg = await http_get(self.links["msgbg"])
-            if msg_bg:
-                bg = msg_bg.replace('<?xml version="1.0" ?>', "")
-                bg_dict = dict(url.replace('"', "").split("=") for url in re.findall(r'(\w+=".*?")', bg))
-                self._styles._bg_style.update(bg_dict)
-                self._styles._bg_style["align"] = position_dict.get(self._styles._bg_style["align"])
-            if msg_styles:
-                try:
-                    styles = json.loads(msg_styles)
-                    self._styles._name_color = styles["nameColor"]
-                    self._styles._font_face = int(styles["fontFamily"])
-                    self._styles._font_size = int(styles["fontSize"])
-                    self._styles._font_color = styles["textColor"]
-                    self._styles._use_background = int(styles["usebackground"])
-                except json.JSONDecodeError:
-                    pass
-
-    async def get_main_profile(self):
-        if not self.is_anon:
-            items = await http_get(self.links["mod1"])
-            if items is not None:
-                about = items.replace('<?xml version="1.0" ?>', "")
-                gender_start = about.find("<s>")
-                gender_end = about.find("</s>", gender_start)
-                gender = about[gender_start + 3 : gender_end] if gender_start != -1 else "?"
-                self._styles._profile["about"]["gender"] = gender
-
-                location_start = about.find("<l")
-                location_end = about.find("</l>", location_start)
-                location = about[location_start + 2 : location_end] if location_start != -1 else ""
-                self._styles._profile["about"]["location"] = location
-
-                last_change_start = about.find("<b>")
-                last_change_end = about.find("</b>", last_change_start)
-                last_change = about[last_change_start + 3 : last_change_end] if last_change_start != -1 else ""
-                self._styles._profile["about"]["last_change"] = last_change
-
-                if last_change:
-                    age = abs(datetime.datetime.now().year - int(last_change.split("-")[0]))
-                    self._styles._profile["about"]["age"] = age
-                body_start = about.find("<body>")
-                body_end = about.find("</body>", body_start)
-                body = about[body_start + 6 : body_end] if body_start != -1 else ""
-                self._styles._profile["about"].update({"body": urllib.parse.unquote(body)})
-
+        if msg_bg:
+            bg = msg_bg.replace('<?xml version="1.0" ?>', "")
+            bg_dict = dict(url.replace('"', "").split("=") for url in re.findall(r'(\w+=".*?")', bg))
+            self.styles.bg_style.update(bg_dict)
+            self.styles.bg_style["align"] = position_dict.get(self.styles.bg_style["align"])
+        if msg_styles:
             try:
-                full_prof = await http_get(self.links["mod2"])
-                if full_prof is not None and str(full_prof)[:5] == "<?xml":
-                    full_prof_start = full_prof.find("<body")
-                    full_prof_end = full_prof.find("</body>", full_prof_start)
-                    full_prof_body = (
-                        full_prof[full_prof_start + len("<body") : full_prof_end] if full_prof_start != -1 else ""
-                    )
-                    self._styles._profile["full"] = full_prof_body
-            except (AttributeError, KeyError):
+                styles = json.loads(msg_styles)
+                self.styles._name_color = styles["nameColor"]
+                self.styles._font_face = int(styles["fontFamily"])
+                self.styles._font_size = int(styles["fontSize"])
+                self.styles._font_color = styles["textColor"]
+                self.styles._use_background = int(styles["usebackground"])
+            except json.JSONDecodeError:
                 pass
 
+    def _apply_main_profile(self, items, full_prof):
+        if items is not None:
+            about = items.replace('<?xml version="1.0" ?>', "")
+            gender_start = about.find("<s>")
+            gender_end = about.find("</s>", gender_start)
+            gender = about[gender_start + 3 : gender_end] if gender_start != -1 else "?"
+            self.styles.profile["about"]["gender"] = gender
+
+            location_start = about.find("<l")
+            location_end = about.find("</l>", location_start)
+            location = about[location_start + 2 : location_end] if location_start != -1 else ""
+            self.styles.profile["about"]["location"] = location
+
+            last_change_start = about.find("<b>")
+            last_change_end = about.find("</b>", last_change_start)
+            last_change = about[last_change_start + 3 : last_change_end] if last_change_start != -1 else ""
+            self.styles.profile["about"]["last_change"] = last_change
+
+            if last_change:
+                age = abs(datetime.datetime.now().year - int(last_change.split("-")[0]))
+                self.styles.profile["about"]["age"] = age
+            body_start = about.find("<body>")
+            body_end = about.find("</body>", body_start)
+            body = about[body_start + 6 : body_end] if body_start != -1 else ""
+            self.styles.profile["about"].update({"body": urllib.parse.unquote(body)})
+
+        try:
+            if full_prof is not None and str(full_prof)[:5] == "<?xml":
+                full_prof_start = full_prof.find("<body")
+                full_prof_end = full_prof.find("</body>", full_prof_start)
+                full_prof_body = (
+                    full_prof[full_prof_start + len("<body") : full_prof_end] if full_prof_start != -1 else ""
+                )
+                self.styles.profile["full"] = full_prof_body
+        except (AttributeError, KeyError):
+            pass
+
+
+DEFAULT_BG_STYLE = {
+    "align": "",
+    "bgc": "",
+    "bgalp": "",
+    "hasrec": "0",
+    "ialp": "",
+    "isvid": "0",
+    "tile": "0",
+    "useimg": "0",
+}
+
+
+def default_profile() -> dict:
+    return {
+        "about": {"age": "", "last_change": "", "gender": "?", "location": "", "d": "", "body": ""},
+        "full": {},
+    }
+
 
 class Styles:
+    """User message styles. Background and profile data are only allocated once they are read or fetched."""
+
+    __slots__ = (
+        "_name_color",
+        "_font_color",
+        "_font_size",
+        "_font_face",
+        "_use_background",
+        "_blend_name",
+        "_bg_style",
+        "_profile",
+    )
+
     def __init__(
         self,
         name_color=None,
@@ -271,27 +408,15 @@ class Styles:
         font_size=None,
         use_background=None,
     ):
-        self._name_color = name_color if name_color else str("000000")
-        self._font_color = font_color if font_color else str("000000")
+        self._name_color = name_color if name_color else "000000"
+        self._font_color = font_color if font_color else "000000"
         self._font_size = font_size if font_size else 11
         self._font_face = font_face if font_face else 0
         self._use_background = int(use_background) if use_background else 0
 
         self._blend_name = None
-        self._bg_style = {
-            "align": "",
-            "bgc": "",
-            "bgalp": "",
-            "hasrec": "0",
-            "ialp": "",
-            "isvid": "0",
-            "tile": "0",
-            "useimg": "0",
-        }
-        self._profile = {
-            "about": {"age": "", "last_change": "", "gender": "?", "location": "", "d": "", "body": ""},
-            "full": {},
-        }
+        self._bg_style = None
+        self._profile = None
 
     def __dir__(self):
         return public_attributes(self)
@@ -299,13 +424,19 @@ class Styles:
     def __repr__(self):
         return f"nc:{self.name_color} |bg:{self.use_background} |{self.default}"
 
+    @property
+    def profile(self):
+        if self._profile is None:
+            self._profile = default_profile()
+        return self._profile
+
     @property
     def about_me(self):
-        return self._profile["about"]
+        return self.profile["about"]
 
     @property
     def full_html(self):
-        o = html.escape(urllib.parse.unquote(self._profile["full"] or "")).replace("\r\n", "\n")
+        o = html.escape(urllib.parse.unquote(self.profile["full"] or "")).replace("\r\n", "\n")
         if o:
             return o
         else:
@@ -313,16 +444,25 @@ class Styles:
 
     @property
     def full_mini(self):
-        o = html.escape(urllib.parse.unquote(self._profile["about"]["body"] or "")).replace("\r\n", "\n")
+        o = html.escape(urllib.parse.unquote(self.profile["about"]["body"] or "")).replace("\r\n", "\n")
         if o:
             return o
         else:
             return None
 
+    # Aliases kept from the former `chatango.utils.Styles`
+    aboutme = about_me
+    fullhtml = full_html
+    fullmini = full_mini
+
     @property
     def bg_style(self):
+        if self._bg_style is None:
+            self._bg_style = dict(DEFAULT_BG_STYLE)
         return self._bg_style
 
+    bgstyle = bg_style
+
     @property
     def use_background(self):
         return self._use_background
@@ -349,8 +489,25 @@ class Styles:
     def font_face(self):
         return self._font_face
 
+    def set_name_color(self, color):
+        self._name_color = color
+
+    def set_font_color(self, color):
+        self._font_color = color
+
+    def set_font_face(self, face):
+        self._font_face = face
+
+    def set_font_size(self, size):
+        self._font_size = size
+
+    def set_use_background(self, use_background):
+        self._use_background = use_background
+
 
 class Friend:
+    __slots__ = ("user", "name", "_client", "_status", "_idle", "_last_active")
+
     def __init__(self, user: User, client: Optional[Any] = None):
         self.user = user
         self.name = user.name
@@ -1,14 +1,17 @@
-from typing import Tuple, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple, Optional
 import asyncio
+import bisect
+import functools
 import random
-import mimetypes
 import html
 import re
 import string
-import aiohttp
-import urllib
+import urllib.parse
 import logging
 
+if TYPE_CHECKING:
+    import aiohttp
+
 # fmt: off
 specials = {
     'mitvcanal': 56, 'animeultimacom': 34, 'cricket365live': 21,
@@ -42,9 +45,79 @@ tsweights = [
 # fmt: on
 
 
+# Cumulative weight table, accumulated exactly like the original linear scan so bisect picks the same server
+_ts_maxnum = sum(y for x, y in tsweights)
+_ts_numbers = [x for x, y in tsweights]
+_ts_cumulative = []
+_cumfreq = 0
+for _x, _y in tsweights:
+    _cumfreq += float(_y) / _ts_maxnum
+    _ts_cumulative.append(_cumfreq)
+del _cumfreq, _x, _y
+
+
+def _server_fraction(group: str) -> float:
+    group = group.replace("_", "q")
+    group = group.replace("-", "q")
+    fnv = int(group[:5], 36)
+    lnv = group[6:9]
+    if lnv:
+        lnv = int(lnv, 36)
+        lnv = max(lnv, 1000)
+    else:
+        lnv = 1000
+    return (fnv % lnv) / lnv
+
+
+def _server_number(index: int) -> int:
+    return _ts_numbers[index] if index < len(_ts_numbers) else 0
+
+
+_np_tables = None
+
+
+def _numpy_tables(np):
+    """Cumulative weights, server hosts by weight index and a base-36 digit lookup, built on first use."""
+    global _np_tables
+    if _np_tables is None:
+        digits = np.full(128, -1, np.int64)
+        for value, char in enumerate(string.digits + string.ascii_lowercase):
+            digits[ord(char)] = digits[ord(char.upper())] = value
+        digits[ord("_")] = digits[ord("-")] = digits[ord("q")]
+        hosts = [f"s{sn}.chatango.com" for sn in _ts_numbers + [0]]
+        _np_tables = (np.asarray(_ts_cumulative), hosts, digits)
+    return _np_tables
+
+
+def _server_fractions(np, groups: List[str], digits):
+    """
+    `_server_fraction` of many groups, parsing the base-36 prefixes column by column.
+
+    :returns: (fractions, mask of groups the vectorized parse cannot handle, e.g. empty names)
+    """
+    chars = np.array(groups, dtype="U9")  # only the first 9 characters are ever read
+    lengths = np.char.str_len(chars)
+    codes = np.ascontiguousarray(chars).view(np.uint32).reshape(len(groups), 9)
+    values = digits[np.minimum(codes, 127)]  # -1 for anything that is not a base-36 digit
+    invalid = lengths == 0
+    fnv = np.zeros(len(groups), np.int64)
+    lnv = np.zeros(len(groups), np.int64)
+    for column in range(9):
+        if column == 5:
+            continue
+        present = lengths > column
+        invalid |= present & (values[:, column] < 0)
+        target = fnv if column < 5 else lnv
+        target[present] = target[present] * 36 + values[present, column]
+    lnv = np.where(lengths > 6, np.maximum(lnv, 1000), 1000)
+    return (fnv % lnv) / lnv, invalid
+
+
+@functools.lru_cache(maxsize=8192)
 def get_server(group: str):
     """
-    Get the server host for a certain room.
+    Get the server host for a certain room. Results are memoized; call `get_server.cache_clear()`
+    after changing `specials` or `tsweights`.
 
     :param str group: room name
 
@@ -53,29 +126,66 @@ def get_server(group: str):
     try:
         sn = specials[group]
     except KeyError:
-        group = group.replace("_", "q")
-        group = group.replace("-", "q")
-        fnv = int(group[:5], 36)
-        lnv = group[6:9]
-        if lnv:
-            lnv = int(lnv, 36)
-            lnv = max(lnv, 1000)
-        else:
-            lnv = 1000
-        num = (fnv % lnv) / lnv
-        maxnum = sum(y for x, y in tsweights)
-        cumfreq = 0
-        sn = 0
-        for x, y in tsweights:
-            cumfreq += float(y) / maxnum
-            if num <= cumfreq:
-                sn = x
-                break
+        sn = _server_number(bisect.bisect_left(_ts_cumulative, _server_fraction(group)))
     return f"s{sn}.chatango.com"
 
 
+def get_servers(groups: Iterable[str], use_numpy: Optional[bool] = None) -> List[str]:
+    """
+    Get the server hosts for many rooms at once.
+
+    :param Iterable[str] groups: room names
+    :param Optional[bool] use_numpy: Vectorize the weight lookup with NumPy; by default used when installed
+        and the batch is large.
+
+    :returns: List[str]
+    """
+    groups = list(groups)
+    if use_numpy is None:
+        use_numpy = len(groups) >= 256
+    np = None
+    if use_numpy:
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+    if np is None:
+        return [get_server(group) for group in groups]
+
+    if not groups:
+        return []
+    cumulative, host_table, digits = _numpy_tables(np)
+    fractions, invalid = _server_fractions(np, groups, digits)
+    for i in np.flatnonzero(invalid).tolist():
+        if groups[i] not in specials:
+            fractions[i] = _server_fraction(groups[i])  # raises the same error as `get_server`
+    indexes = np.searchsorted(cumulative, fractions, side="left").tolist()
+    hosts = [host_table[i] for i in indexes]
+    if specials:
+        for i, group in enumerate(groups):
+            sn = specials.get(group)
+            if sn is not None:
+                hosts[i] = f"s{sn}.chatango.com"
+    return hosts
+
+
+def group_by_server(groups: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Group room names by the server host that serves them.
+
+    :param Iterable[str] groups: room names
+
+    :returns: Dict[str, List[str]]
+    """
+    groups = list(groups)
+    by_server: Dict[str, List[str]] = {}
+    for group, host in zip(groups, get_servers(groups)):
+        by_server.setdefault(host, []).append(group)
+    return by_server
+
+
 def public_attributes(obj):
-    return [x for x in set(list(obj.__dict__.keys()) + list(dir(type(obj)))) if x[0] != "_"]
+    return [x for x in set(list(getattr(obj, "__dict__", ())) + list(dir(type(obj)))) if x[0] != "_"]
 
 
 async def on_request_exception(session, context, params):
@@ -83,33 +193,81 @@ async def on_request_exception(session, context, params):
 
 
 def trace():
+    import aiohttp
+
     trace_config = aiohttp.TraceConfig()
     trace_config.on_request_exception.append(on_request_exception)
     return trace_config
 
 
 _aiohttp_session = None
+_aiohttp_session_loop = None
+_closing_sessions = set()
+
+
+def _close_stale_session(session, session_loop, loop):
+    """Close the session of a previous event loop: on that loop if it still runs, else on the current one."""
+    if session_loop is not None and session_loop.is_running():
+        asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+        return
+
+    async def close():
+        try:
+            await session.close()
+        except Exception:  # pylint: disable=broad-except
+            # Connections bound to a loop that is already closed cannot be shut down cleanly
+            logging.getLogger(__name__).debug("Could not close the previous aiohttp session", exc_info=True)
+
+    task = loop.create_task(close())
+    _closing_sessions.add(task)
+    task.add_done_callback(_closing_sessions.discard)
 
 
 def get_aiohttp_session():
-    global _aiohttp_session
-    if _aiohttp_session is None:
+    """
+    Pooled session of the running event loop; recreated if closed or the loop changed, in which case
+    the previous session is closed.
+    """
+    global _aiohttp_session, _aiohttp_session_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if _aiohttp_session is None or _aiohttp_session.closed or (loop and loop is not _aiohttp_session_loop):
+        import aiohttp
+
+        if _aiohttp_session is not None and not _aiohttp_session.closed:
+            _close_stale_session(_aiohttp_session, _aiohttp_session_loop, loop)
         _aiohttp_session = aiohttp.ClientSession(trace_configs=[trace()])
+        _aiohttp_session_loop = loop
     return _aiohttp_session
 
 
-async def get_token(user_name, passwd):
-    chatango, token = ["http://chatango.com/login", "auth.chatango.com"], None
+async def get_token(
+    user_name,
+    passwd,
+    login_url: str = "http://chatango.com/login",
+    session: Optional["aiohttp.ClientSession"] = None,
+):
+    """
+    Log in and return the `auth.chatango.com` token, or None when the credentials are refused.
+
+    Prefer `chatango.auth.get_token_manager().get(...)`, which caches tokens and coalesces logins.
+    """
+    chatango, token = [login_url, "auth.chatango.com"], None
     payload = {
         "user_id": str(user_name).lower(),
         "password": str(passwd),
         "storecookie": "on",
         "checkerrors": "yes",
     }
-    # Use fresh session to retrieve auth cookies
-    async with aiohttp.ClientSession().post(chatango[0], data=payload) as resp:
+    if not session:
+        session = get_aiohttp_session()
+    async with session.post(chatango[0], data=payload) as resp:
         if chatango[1] in resp.cookies:
-            token = str(resp.cookies[chatango[1]]).split("=")[1].split(";")[0]
+            token = resp.cookies[chatango[1]].value
+    # Keep one account's auth cookies from leaking into the next login on the pooled session
+    session.cookie_jar.clear_domain(urllib.parse.urlsplit(login_url).hostname or "chatango.com")
     return token
 
 
@@ -135,6 +293,8 @@ def multipart(data, files, boundary=None):
         if "mimetype" in value:
             mimetype = value["mimetype"]
         else:
+            import mimetypes
+
             mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
         lines.extend(
             (
@@ -160,7 +320,7 @@ def multipart(data, files, boundary=None):
     return body, headers
 
 
-async def http_get(url: str, session: Optional[aiohttp.ClientSession] = None):
+async def http_get(url: str, session: Optional["aiohttp.ClientSession"] = None):
     if not session:
         session = get_aiohttp_session()
     async with session.get(url) as resp:
@@ -172,7 +332,37 @@ async def http_get(url: str, session: Optional[aiohttp.ClientSession] = None):
             return None
 
 
-async def session_get(session: aiohttp.ClientSession, url: str):
+async def http_get_conditional(
+    url: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    session: Optional["aiohttp.ClientSession"] = None,
+) -> Tuple[int, Optional[str], Optional[str], Optional[str]]:
+    """
+    GET revalidating against cached validators.
+
+    :returns: Tuple[int, Optional[str], Optional[str], Optional[str]] of status, body, ETag & Last-Modified;
+        the body is None on 304 Not Modified.
+    """
+    if not session:
+        session = get_aiohttp_session()
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    async with session.get(url, headers=headers) as resp:
+        if resp.status == 304:
+            return resp.status, None, etag, last_modified
+        assert resp.status == 200
+        try:
+            text = await resp.text()
+        except Exception:
+            text = None
+        return resp.status, text, resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+
+
+async def session_get(session: "aiohttp.ClientSession", url: str):
     async with session.get(url) as resp:
         assert resp.status == 200
         try:
@@ -182,11 +372,20 @@ async def session_get(session: aiohttp.ClientSession, url: str):
             return None
 
 
-async def make_requests(urls):
-    r = {}
-    for x in urls:
-        task = asyncio.create_task(session_get(get_aiohttp_session(), x[1]))
-        r[x[0]] = task
+async def make_requests(urls: Iterable[Tuple[str, str]], limit: int = 16) -> Dict[str, asyncio.Task]:
+    """
+    Fetch `(key, url)` pairs with at most `limit` requests in flight.
+
+    :returns: Dict[str, asyncio.Task] of completed tasks by key.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    session = get_aiohttp_session()
+
+    async def bounded_get(url):
+        async with semaphore:
+            return await session_get(session, url)
+
+    r = {key: asyncio.create_task(bounded_get(url)) for key, url in urls}
     await asyncio.gather(*r.values())
     return r
 
@@ -295,109 +494,6 @@ def _videoImagePMFormat(text):
     return text
 
 
-class Styles:
-    """User message styles."""
-
-    def __init__(
-        self,
-        name_color=None,
-        font_color=None,
-        font_face=None,
-        font_size=None,
-        use_background=None,
-    ):
-        self._name_color = name_color if name_color else str("000000")
-        self._font_color = font_color if font_color else str("000000")
-        self._font_size = font_size if font_size else 11
-        self._font_face = font_face if font_face else 0
-        self._use_background = int(use_background) if use_background else 0
-
-        self._blend_name = None
-        self.bgstyle = {
-            "align": "",
-            "bgc": "",
-            "bgalp": "",
-            "hasrec": "0",
-            "ialp": "",
-            "isvid": "0",
-            "tile": "0",
-            "useimg": "0",
-        }
-        self._profile = dict(
-            about=dict(age="", last_change="", gender="?", location="", d="", body=""),
-            full=dict(),
-        )
-
-    def __dir__(self):
-        return public_attributes(self)
-
-    def __repr__(self):
-        return f"nc:{self.name_color} |bg:{self.use_background} |{self.default}"
-
-    @property
-    def profile(self):
-        return self._profile
-
-    @property
-    def aboutme(self):
-        return self._profile["about"]
-
-    @property
-    def fullhtml(self):
-        o = html.escape(urllib.parse.unquote(self._profile["full"] or "")).replace("\r\n", "\n")
-        if o:
-            return o
-        return None
-
-    @property
-    def fullmini(self):
-        o = html.escape(urllib.parse.unquote(self._profile["about"]["body"] or "")).replace("\r\n", "\n")
-        if o:
-            return o
-        return None
-
-    @property
-    def use_background(self):
-        return self._use_background
-
-    @property
-    def default(self):
-        size = str(self.font_size)
-        face = str(self.font_face)
-        return f"<f x{size}{self.font_color}='{face}'>"
-
-    @property
-    def name_color(self):
-        return self._name_color
-
-    @property
-    def font_color(self):
-        return self._font_color
-
-    @property
-    def font_size(self):
-        return self._font_size
-
-    @property
-    def font_face(self):
-        return self._font_face
-
-    def set_name_color(self, color):
-        self._name_color = color
-
-    def set_font_color(self, color):
-        self._font_color = color
-
-    def set_font_face(self, face):
-        self._font_face = face
-
-    def set_font_size(self, size):
-        self._font_size = size
-
-    def set_use_background(self, use_background):
-        self._use_background = use_background
-
-
 def _convert_dict(src):
     r = {}
     m = src.split(" ")
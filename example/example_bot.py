@@ -1,7 +1,7 @@
 """Bot implementation demo."""
 from chatango import Client, Room, Message
 
-from logger import LOGGER
+from logger import LOGGER, chat_logger
 
 
 class Bot(Client):
@@ -39,10 +39,5 @@ class Bot(Client):
 
         :returns: None
         """
-        chat_message = message.body
-        user_name = message.room.user.name
-        room_name = message.room.name
-        if bool(message.ip) is True and message.body is not None:
-            LOGGER.info(f"[{room_name}] [{user_name}] [{message.ip}]: {chat_message}")
-        else:
-            LOGGER.info(f"[{room_name}] [{user_name}] [no IP address]: {chat_message}")
+        if message.body is not None:
+            chat_logger(room.name, message.user.name, message.ip or None).info(message.body)
@@ -0,0 +1,84 @@
+"""Room analytics tests."""
+import asyncio
+import csv
+
+import pytest
+
+from chatango.message import MessageFlags, RoomMessage
+from chatango.room import Room
+from chatango.user import User
+
+np = pytest.importorskip("numpy")
+
+from chatango.analytics import RoomAnalytics  # noqa: E402
+
+
+def room_message(room, n, t, user):
+    msg = RoomMessage()
+    msg.room = room
+    msg.id = f"m{n}"
+    msg.time = t
+    msg.user = User(user)
+    msg.body = msg.raw = "x" * (n % 10)
+    msg.flags = MessageFlags(0)
+    return msg
+
+
+def feed(analytics):
+    room1 = Room("analyticsroom1", analytics=analytics)
+    room2 = Room("analyticsroom2", analytics=analytics)
+    # room1: 10 messages a minute for an hour from three users, room2: one a minute
+    for n in range(600):
+        room1._add_history(room_message(room1, n, 6000.0 + n * 6, f"user{n % 3 if n % 5 else 0}"))
+    for n in range(60):
+        room2._add_history(room_message(room2, n, 6000.0 + n * 60, "loner"))
+    for n, count in enumerate((5, 7, 9)):
+        analytics.add_user_count("analyticsroom1", count, when=6000.0 + n * 30)
+    return room1, room2
+
+
+def test_histograms_rolling_and_top_talkers():
+    analytics = RoomAnalytics(capacity=16)
+    feed(analytics)
+    assert len(analytics) == 660
+
+    starts, counts = analytics.histogram(60, room="analyticsroom1")
+    assert starts[0] == 6000.0 and len(counts) == 60 and set(counts) == {10}
+    _, chars = analytics.histogram(600, room="analyticsroom2", weights="length")
+    assert chars.tolist() == [45.0] * 6
+
+    ends, rolled = analytics.rolling(300, step=60, since=6000.0, until=10200.0)
+    assert ends[0] == 6060.0 and rolled[0] == 11 and rolled[4] == 55 and rolled[30] == 55 and rolled[-1] == 0
+
+    top = analytics.top_talkers(2)
+    assert top[0] == ("user0", 280) and top[1][1] == 160
+    assert analytics.top_talkers(5, room="analyticsroom2") == [("loner", 60)]
+    assert analytics.top_talkers(5, since=10**9) == []
+    assert len(analytics.select(user="USER1", since=6000.0, until=6600.0)["time"]) == 27
+    assert len(analytics.select(room="nowhere")["time"]) == 0
+
+    times, means = analytics.user_count_series("analyticsroom1", bucket=60)
+    assert means.tolist() == [6.0, 9.0]
+
+
+def test_user_counts_from_room_and_exports(tmp_path):
+    analytics = RoomAnalytics()
+    room1, _ = feed(analytics)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(room1._rcmd_n(["1f"]))
+    finally:
+        loop.close()
+    assert analytics.user_count_series("analyticsroom1")[1].tolist() == [5, 7, 9, 31]
+
+    analytics.to_csv(str(tmp_path / "messages.csv"))
+    with open(tmp_path / "messages.csv") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["time", "room", "user", "length", "flags"]
+    assert rows[1] == ["6000.0", "analyticsroom1", "user0", "0", "0"]
+    assert len(rows) == 661
+
+    analytics.save_npz(str(tmp_path / "analytics.npz"))
+    loaded = RoomAnalytics.load_npz(str(tmp_path / "analytics.npz"))
+    assert len(loaded) == 660 and loaded.top_talkers(3) == analytics.top_talkers(3)
+    assert loaded.user_count_series("analyticsroom1")[1].tolist() == [5, 7, 9, 31]
@@ -0,0 +1,123 @@
+"""Message archive tests."""
+import asyncio
+import os
+import types
+
+import chatango.archive as archive_module
+from chatango.archive import INDEX_ENTRY, MessageArchive
+from chatango.message import MessageFlags, RoomMessage
+from chatango.user import User
+
+
+def room_message(room, n, t):
+    msg = RoomMessage()
+    msg.room = room
+    msg.id = f"m{n}"
+    msg.time = t
+    msg.user = User(f"user{n % 3}")
+    msg.body = msg.raw = f"hello {n}"
+    msg.ip, msg.unid, msg.puid = "1.2.3.4", f"u{n}", "1234"
+    msg.flags = MessageFlags(0)
+    return msg
+
+
+def test_time_range_rotation_and_lookup(tmp_path):
+    room = types.SimpleNamespace(name="someroom")
+    archive = MessageArchive(str(tmp_path), segment_bytes=2000, flush_interval=0.01)
+
+    async def scenario():
+        for n in range(100):
+            archive.append(room_message(room, n, 1000.0 + n))
+        await archive.close()
+
+    asyncio.run(scenario())
+    assert archive.written == 100
+    assert len(archive.segments("someroom")) > 1
+    records = archive.read("someroom", start=1050.0, end=1060.0)
+    assert [r["id"] for r in records] == [f"m{n}" for n in range(50, 60)]
+    assert records[0]["user"] == "user2" and records[0]["ip"] == "1.2.3.4"
+    t, msgid, view = next(archive.raw("someroom", start=1099.0))
+    assert (t, msgid) == (1099.0, "m99") and isinstance(view, memoryview)
+    assert archive.get("someroom", "m42")["body"] == "hello 42"
+    assert archive.get("someroom", "missing") is None
+
+
+def test_recovers_torn_tail_and_compacts(tmp_path):
+    room = types.SimpleNamespace(name="someroom")
+    archive = MessageArchive(str(tmp_path), segment_seconds=10, retention=30)
+
+    async def write(archive, start):
+        for n in range(start, start + 50):
+            archive.append(room_message(room, n, 1000.0 + n))
+        await archive.close()
+
+    asyncio.run(write(archive, 0))
+    segments = archive.segments("someroom")
+    assert len(segments) == 5
+    # A crash mid-write: half an index entry on disk
+    with open(segments[-1].idx_path, "ab") as f:
+        f.write(b"\x01" * (INDEX_ENTRY.size // 2))
+
+    reopened = MessageArchive(str(tmp_path), segment_bytes=10**6, segment_seconds=10**6)
+    asyncio.run(write(reopened, 50))
+    assert len(reopened.read("someroom")) == 100
+    assert os.path.getsize(segments[-1].idx_path) % INDEX_ENTRY.size == 0
+
+    async def compact():
+        return await reopened.compact()
+
+    assert asyncio.run(compact()) == 3
+    assert len(reopened.segments("someroom")) == 2
+    assert [r["id"] for r in reopened.read("someroom")] == [f"m{n}" for n in range(100)]
+
+
+class FailingFile:
+    """Wraps a file so that its next `flush` fails like a full disk, after half the data went out."""
+
+    def __init__(self, f):
+        self.f = f
+        self.fail = True
+
+    def write(self, data):
+        return self.f.write(data[: len(data) // 2] if self.fail else data)
+
+    def flush(self):
+        if self.fail:
+            self.fail = False
+            self.f.flush()
+            raise OSError(28, "No space left on device")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def test_failed_write_is_rolled_back_and_requeued(tmp_path, monkeypatch):
+    room = types.SimpleNamespace(name="someroom")
+    archive = MessageArchive(str(tmp_path), segment_bytes=2000, flush_interval=0.01)
+    open_active = archive_module.Channel._open_active
+    failing = []
+
+    def open_failing(channel):
+        open_active(channel)
+        if not failing:
+            failing.append(FailingFile(channel._idx))
+            channel._idx = failing[0]
+
+    async def scenario():
+        for n in range(10):
+            archive.append(room_message(room, n, 1000.0 + n))
+        await archive.flush()
+        archive._channels["someroom"].close_active()
+        monkeypatch.setattr(archive_module.Channel, "_open_active", open_failing)
+        for n in range(10, 20):
+            archive.append(room_message(room, n, 1000.0 + n))
+        # The background flusher hits the failure, keeps the rows and retries on its next interval
+        await asyncio.sleep(0.2)
+        assert archive._flush_task and not archive._flush_task.done()
+        await archive.close()
+
+    asyncio.run(scenario())
+    assert failing and not failing[0].fail
+    assert archive.written == 20
+    assert [r["id"] for r in archive.read("someroom")] == [f"m{n}" for n in range(20)]
@@ -0,0 +1,82 @@
+"""Token manager tests."""
+import asyncio
+import os
+import stat
+
+from chatango.auth import TokenManager
+
+
+class FakeLogin:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, user_name, password, login_url=None):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return f"token-{user_name.lower()}-{self.calls}" if password == "secret" else None
+
+
+def test_coalesced_login_and_invalidate():
+    login = FakeLogin()
+    manager = TokenManager(login=login)
+
+    async def scenario():
+        tokens = await asyncio.gather(*(manager.get("SomeBot", "secret") for _ in range(20)))
+        assert set(tokens) == {"token-somebot-1"} and login.calls == 1
+        assert await manager.get("somebot", "secret") == "token-somebot-1"
+        await manager.invalidate("somebot")
+        assert await manager.get("somebot", "secret") == "token-somebot-2"
+        assert await manager.get("other", "wrong") is None
+        assert manager.peek("other") is None
+
+    asyncio.run(scenario())
+
+
+def test_tokens_persist_owner_only(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    login = FakeLogin()
+    asyncio.run(TokenManager(path, login=login).get("somebot", "secret"))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    restarted = TokenManager(path, login=login)
+    assert asyncio.run(restarted.get("somebot", "secret")) == "token-somebot-1"
+    assert login.calls == 1
+
+    expired = TokenManager(path, ttl=0, login=login)
+    expired.tokens.clear()
+    assert asyncio.run(expired.get("somebot", "secret")) == "token-somebot-2"
+
+
+def test_concurrent_logins_of_different_accounts_persist(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    login = FakeLogin()
+    manager = TokenManager(path, login=login)
+
+    async def scenario():
+        names = [f"bot{n}" for n in range(50)]
+        tokens = await asyncio.gather(*(manager.get(name, "secret") for name in names))
+        assert all(tokens) and login.calls == 50
+        await asyncio.gather(*(manager.invalidate(name) for name in names[:10]))
+
+    asyncio.run(scenario())
+    assert os.listdir(tmp_path) == ["tokens.json"]  # no temp files left behind
+    restarted = TokenManager(path, login=login)
+    assert asyncio.run(restarted.get("bot10", "secret")).startswith("token-bot10-")
+    assert len(restarted.tokens) == 40 and login.calls == 50
+
+
+def test_session_of_previous_loop_is_closed():
+    from chatango.utils import get_aiohttp_session
+
+    async def session():
+        return get_aiohttp_session()
+
+    first = asyncio.run(session())
+
+    async def scenario():
+        second = get_aiohttp_session()
+        await asyncio.sleep(0.01)
+        assert second is not first and first.closed
+        await second.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+"""Client tests."""
+import asyncio
+
+from chatango import PM, Client, Room
+
+
+class LegacyRoom(Room):
+    def __init__(self, name):
+        super().__init__(name)
+
+    async def listen(self, user_name, password, reconnect=False):
+        pass
+
+
+class LegacyPM(PM):
+    def __init__(self):
+        super().__init__()
+
+    async def listen(self, user_name, password, reconnect=False):
+        pass
+
+
+def test_room_and_pm_classes_with_the_old_signature():
+    async def scenario():
+        client = Client("bot", "secret", [], room_class=LegacyRoom, pm_class=LegacyPM)
+        await client._watch_room("legacyroom")
+        await client._watch_pm()
+        client.end_tasks()
+
+        options = Client("bot", "secret", [], room_class=LegacyRoom, room_port=8081)
+        try:
+            await options._watch_room("legacyroom")
+        except TypeError as e:
+            assert "port" in str(e)  # only options that were actually set are passed
+        else:
+            raise AssertionError("room_port was not passed to the room class")
+        options.end_tasks()
+
+    asyncio.run(scenario())
@@ -0,0 +1,34 @@
+"""Event & command handler logging tests."""
+import asyncio
+import logging
+
+from chatango.room import Room
+
+
+class Exploding:
+    def __repr__(self):
+        raise AssertionError("repr built while DEBUG is off")
+
+
+def test_protocol_trace_sampling_and_truncation(caplog):
+    async def scenario():
+        room = Room("traceroom")
+        room.call_event("custom", Exploding())
+        trace = room.enable_trace(sample_rate=0.5, max_length=10, actions=["n", "b"])
+        for n in range(9):
+            await room._receive_command(f"n:{n:x}")
+        await room._receive_command("b:" + "x" * 100)
+        await room._receive_command("u:ignored:1")
+        room.disable_trace()
+        await room._receive_command("n:ff")
+        room.end_tasks()
+        return trace
+
+    with caplog.at_level(logging.INFO, logger="chatango.trace"):
+        loop = asyncio.new_event_loop()
+        trace = loop.run_until_complete(scenario())
+        loop.close()
+    lines = [record.getMessage() for record in caplog.records if record.name == "chatango.trace"]
+    assert trace.seen == 11 and trace.logged == 5 == len(lines)
+    assert lines[0] == "traceroom  IN n:1"
+    assert lines[-1] == "traceroom  IN b:xxxxxxxx... (+92 chars)"
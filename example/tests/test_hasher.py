@@ -0,0 +1,34 @@
+"""Hasher output tests."""
+import hashlib
+
+from chatango.hasher import Hasher, hash_many
+
+
+def test_hash_matches_md5():
+    for size in (0, 1, 55, 56, 63, 64, 65, 127, 128, 1000):
+        message = "".join(chr(97 + n % 26) for n in range(size))
+        assert Hasher().hash(message) == hashlib.md5(message.encode()).hexdigest()
+
+
+def test_incremental_updates():
+    payload = bytes(range(256)) * 5
+    hasher = Hasher()
+    for offset in range(0, len(payload), 37):
+        hasher.update(memoryview(payload)[offset : offset + 37])
+    assert hasher.digest() == hashlib.md5(payload).digest()
+    assert hasher.hexdigest() == Hasher(bytearray(payload)).hexdigest()
+    assert hasher.finalize() == list(hashlib.md5(payload).digest())
+
+
+def test_str_hashes_per_character():
+    # Digests of the original per-character `ord` implementation
+    assert Hasher().hash("héllo") == "1a722f7e6c801d9e470a10cb91ba406d"
+    assert Hasher().hash("ßüñ" * 30) == "d6804adbaee7b3b07d56357942a78585"
+    assert Hasher().hash("日本語ルーム") == "5db229ca5dccd160aaf0ed4cf857f765"
+    assert Hasher().hash("日本" * 40) == "26e5b250c9b6807404cba3ae0c55c743"
+    assert hash_many(["héllo", "日本語ルーム"]) == ["1a722f7e6c801d9e470a10cb91ba406d", "5db229ca5dccd160aaf0ed4cf857f765"]
+
+
+def test_zero_length_hashes_everything():
+    assert Hasher().update("abcdef", 0).hexdigest() == hashlib.md5(b"abcdef").hexdigest()
+    assert Hasher().update("abcdef", 3).hexdigest() == hashlib.md5(b"abc").hexdigest()
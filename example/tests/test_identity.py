@@ -0,0 +1,70 @@
+"""Identity index tests."""
+import asyncio
+import time
+
+from chatango.identity import IdentityIndex
+from chatango.room import Room
+
+DAY = 86400.0
+
+
+def test_links_decay_and_associates():
+    index = IdentityIndex(half_life=DAY)
+    now = 100 * DAY
+    for day in range(5):
+        index.observe(ip="10.0.0.1", puid="111", name="Banned", room="room1", when=now - day * DAY)
+    index.observe(ip="10.0.0.1", puid="222", name="evader", room="room2", when=now - 60)
+    index.observe(ip="10.0.0.1", puid="333", name="oldnat", room="room3", when=now - 30 * DAY)
+    index.observe(puid="111", name="alt", room="room2", when=now - DAY)
+
+    assert index.names("ip", "10.0.0.1", now) == ["banned", "evader"]  # oldnat decayed below min_score
+    assert index.rooms("name", "BANNED", now) == ["room1"]
+    assert index.rooms("ip", "10.0.0.1", now) == ["room1", "room2"]
+    associates = dict(index.associates(name="banned", now=now))
+    assert set(associates) == {"evader", "alt"}
+    assert associates["evader"] > associates["alt"] > 0.4
+    assert [name for name, _ in index.associates(ip="10.0.0.1", now=now)] == ["banned", "evader"]
+
+
+def test_memory_is_bounded():
+    index = IdentityIndex(max_links=1000)
+    start = time.time() - 5000
+    for n in range(5000):
+        index.observe(ip=f"10.0.{n // 250}.{n % 250}", puid=str(n), name=f"user{n}", room="room1", when=start + n)
+    assert len(index) <= 1000
+    # The most recent sightings survive pruning
+    assert index.names("puid", "4999") == ["user4999"]
+    assert index.names("puid", "0") == []
+
+
+def test_fed_by_room_participants_messages_and_bans():
+    index = IdentityIndex()
+    room = Room("identityroom", identity_index=index)
+    room._correctiontime = 0
+    events = []
+
+    class Listener:
+        async def on_ban_associates(self, room, target, associates):
+            events.append((target.name, associates))
+
+    room.add_listener(Listener())
+
+    now = int(time.time())
+
+    async def scenario():
+        await room._rcmd_participant(["1", "ssid1", "11112222", "evader", "None", "10.0.0.9", str(now - 60)])
+        await room._rcmd_b(
+            [str(now), "banned", "", "11112222", "unid1", "m1", "10.0.0.9", "0", "", "<n0/><f x11=''>hi"]
+        )
+        await room._rcmd_blocked(["unid1", "10.0.0.9", "banned", "moderator", str(now)])
+        await asyncio.sleep(0)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+
+    assert set(index.names("puid", "11112222")) == {"evader", "banned"}
+    assert events and events[0][0] == "banned"
+    assert [name for name, _ in events[0][1]] == ["evader"]
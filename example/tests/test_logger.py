@@ -0,0 +1,122 @@
+"""Queued log sink tests."""
+import threading
+import time
+
+from logger import QueuedSink
+
+
+class SlowStream:
+    def __init__(self):
+        self.chunks = []
+        self.release = threading.Event()
+
+    def write(self, text):
+        self.release.wait(5)
+        self.chunks.append(text)
+
+    def flush(self):
+        pass
+
+
+def test_drop_policy_never_blocks_the_caller():
+    stream = SlowStream()
+    sink = QueuedSink(stream=stream, max_queue=100)
+    started = time.perf_counter()
+    for n in range(5000):
+        sink(f"record {n}\n")
+    assert time.perf_counter() - started < 0.5
+    assert sink.dropped >= 4800
+    stream.release.set()
+    sink.stop()
+    assert sink.written + sink.dropped == 5000
+    assert "".join(stream.chunks).startswith("record 0\n")
+
+
+def test_rotating_file(tmp_path):
+    path = str(tmp_path / "bot.log")
+    sink = QueuedSink(path=path, max_bytes=1000, backups=2, policy="block", batch_size=10)
+    for n in range(300):
+        sink(f"line {n:04d} of the rotating log\n")
+    sink.stop()
+    assert sink.dropped == 0 and sink.written == 300
+    assert (tmp_path / "bot.log.1").exists() and (tmp_path / "bot.log.2").exists()
+    assert not (tmp_path / "bot.log.3").exists()
+    assert (tmp_path / "bot.log").read_text().endswith("line 0299 of the rotating log\n")
+
+
+def test_failed_rotation_keeps_the_writer_alive(tmp_path):
+    path = str(tmp_path / "bot.log")
+    (tmp_path / "bot.log.1").mkdir()
+    (tmp_path / "bot.log.1" / "busy").write_text("")  # a non-empty directory cannot be replaced
+    sink = QueuedSink(path=path, max_bytes=100, backups=1, policy="block", max_queue=2, batch_size=1)
+    for n in range(20):
+        sink(f"line {n:04d} of the log\n")
+    deadline = time.monotonic() + 5
+    while sink.written < 20 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sink._thread.is_alive() and sink.errors and sink.written == 20
+    (tmp_path / "bot.log.1" / "busy").unlink()
+    (tmp_path / "bot.log.1").rmdir()
+    sink("after the disk recovered\n")
+    sink.stop()
+    assert sink.written == 21
+    assert (tmp_path / "bot.log.1").read_text().startswith("line 0000")
+    assert (tmp_path / "bot.log").read_text() == "after the disk recovered\n"
+
+
+def test_json_lines_use_bound_fields():
+    import json
+
+    from loguru import logger
+
+    from logger import chat_logger, json_formatter, log_formatter
+
+    lines, text = [], []
+    json_sink = logger.add(lines.append, format=json_formatter, level="TRACE")
+    text_sink = logger.add(text.append, format=log_formatter, level="TRACE", colorize=False)
+    try:
+        chat_logger("pythonrpg", "someone", "203.0.113.42").info("hi: [not] a {template}")
+        chat_logger("pythonrpg", "someone", None, event="join").info("joined")
+    finally:
+        logger.remove(json_sink)
+        logger.remove(text_sink)
+    first, second = (json.loads(line) for line in lines)
+    assert first["room"] == "pythonrpg" and first["user"] == "someone" and first["ip"] == "203.0.113.42"
+    assert first["message"] == "hi: [not] a {template}" and first["level"] == "INFO"
+    assert isinstance(first["time"], float)
+    assert second["event"] == "join" and "ip" not in second
+    assert all(line.endswith("}\n") and line.count("\n") == 1 for line in lines)
+    assert "[pythonrpg] [someone] [203.0.113.42]: hi: [not] a {template}" in text[0]
+
+
+def test_protocol_trace_reaches_loguru():
+    from loguru import logger
+
+    from chatango.handler import ProtocolTrace
+    from logger import bridge_stdlib
+
+    bridge_stdlib()
+    lines = []
+    sink = logger.add(lines.append, format="{level} {message}", level="TRACE")
+    try:
+        ProtocolTrace("pythonrpg", max_length=8)(" IN", "b:1700000000.0:someone")
+    finally:
+        logger.remove(sink)
+    assert lines == ["INFO pythonrpg  IN b:170000... (+14 chars)\n"]
+
+
+def test_client_info_reaches_loguru():
+    import logging
+
+    from loguru import logger
+
+    from logger import create_logger
+
+    create_logger()
+    lines = []
+    sink = logger.add(lines.append, format="{level} {message}", level="TRACE")
+    try:
+        logging.getLogger("chatango.client").info("Connected to %s", "<Room pythonrpg>")
+    finally:
+        logger.remove(sink)
+    assert lines == ["INFO Connected to <Room pythonrpg>\n"]
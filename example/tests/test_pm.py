@@ -0,0 +1,161 @@
+"""PM history and offline delivery tests."""
+import asyncio
+
+from chatango.pm import PM
+from chatango.simulator import pm_message_frame
+
+
+def _args(frame):
+    return frame.split(":")[1:]
+
+
+def test_history_ring_buffer_and_contact_index():
+    async def scenario():
+        pm = PM(history_size=5)
+        for n in range(8):
+            await pm._rcmd_msg(_args(pm_message_frame(f"friend{n % 2}", 1700000000 + n, f"message {n}")))
+        history = pm.history
+        assert len(history) == 5
+        assert [msg.body for msg in history] == [f"message {n}" for n in range(3, 8)]
+        assert history[0].body == "message 3" and history[-1].body == "message 7"
+        assert [msg.body for msg in history.with_contact("Friend1")] == ["message 3", "message 5", "message 7"]
+        assert [msg.body for msg in history.with_contact("friend0", limit=1)] == ["message 6"]
+        assert sorted(history.contacts()) == ["friend0", "friend1"]
+        pm.end_tasks()
+
+    asyncio.run(scenario())
+
+
+def test_offline_messages_are_batched():
+    batches = []
+
+    class Listener:
+        async def on_pm_offline_messages(self, pm, messages):
+            batches.append([msg.body for msg in messages])
+
+    async def scenario():
+        pm = PM(offline_batch_delay=0.02)
+        pm.add_listener(Listener())
+        for n in range(3):
+            await pm._rcmd_msgoff(_args(pm_message_frame("friend", 1700000000 + n, f"offline {n}")))
+        await asyncio.sleep(0.1)
+        pm.end_tasks()
+
+    asyncio.run(scenario())
+    assert batches == [["offline 0", "offline 1", "offline 2"]]
+
+
+class FakeWriter:
+    def __init__(self):
+        self.frames = []
+        self.drains = 0
+
+    def write(self, data):
+        self.frames.append(data)
+
+    async def drain(self):
+        self.drains += 1
+
+
+def test_watchlist_tracking_and_coalesced_presence():
+    from chatango.simulator import watchlist_frame
+
+    events = []
+
+    class Listener:
+        async def on_pm_presence(self, pm, friends):
+            events.append(sorted(friend.name for friend in friends))
+
+    async def scenario():
+        pm = PM(presence_tick=0.02)
+        pm.add_listener(Listener())
+        writer = pm._connection = FakeWriter()
+        pm._first_command = False
+        contacts = [(f"friend{n}", "1700000000", "on" if n % 2 else "off", "0") for n in range(50)]
+        await pm._rcmd_wl(_args(watchlist_frame(contacts)))
+        assert writer.drains == 1 and len(writer.frames) == 50
+        assert len(pm.friends) == 50 and "friend3" in pm.friends
+        assert pm.presence.online == {f"friend{n}" for n in range(1, 50, 2)}
+
+        await pm._rcmd_track(["friend0", "0", "online"])
+        await pm._rcmd_status(["friend1", "1700000000", "offline"])
+        await pm._rcmd_idleupdate(["friend3", "0"])
+        await pm._rcmd_track(["friend5", "0", "online"])  # unchanged
+        await asyncio.sleep(0.1)
+        assert "friend0" in pm.presence.online and "friend1" not in pm.presence.online
+        assert pm.presence.idle == {"friend3"}
+        pm.end_tasks()
+
+    asyncio.run(scenario())
+    assert events == [["friend0", "friend1", "friend3"]]
+
+
+def test_outbox_waits_out_toofast_merges_and_overflows():
+    from chatango.exceptions import OutboxOverflowError
+    from chatango.outbox import PMOutbox, RateGovernor
+
+    sent = []
+
+    async def send(target, message):
+        sent.append((target, message))
+
+    async def scenario():
+        outbox = PMOutbox(send, max_backlog=3, governor=RateGovernor(interval=0, min_interval=0, silence=0.05))
+        outbox.governor.on_toofast()
+        first = outbox.submit("friend", "hello")
+        assert outbox.submit("friend", "hello") is first
+        outbox.submit("other", "hi")
+        outbox.submit("friend", "again")
+        newest = outbox.submit("third", "overflow")
+        await asyncio.sleep(0.02)
+        assert sent == [] and first.done()
+        assert isinstance(first.exception(), OutboxOverflowError)
+        await asyncio.wait_for(newest, 1)
+        assert sent == [("other", "hi"), ("friend", "again"), ("third", "overflow")]
+        assert outbox.merged == 1 and outbox.dropped == 1
+
+        rejecting = PMOutbox(send, max_backlog=0, overflow="reject")
+        assert isinstance(rejecting.submit("friend", "x").exception(), OutboxOverflowError)
+
+    asyncio.run(scenario())
+
+
+def test_outbox_is_unpaced_until_the_server_complains():
+    from chatango.exceptions import OutboxOverflowError
+    from chatango.outbox import PMOutbox
+
+    sent = []
+
+    async def send(target, message):
+        sent.append((target, message))
+
+    async def scenario():
+        outbox = PMOutbox(send)
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(*(outbox.submit(f"friend{n}", "hi") for n in range(20)))
+        assert len(sent) == 20 and asyncio.get_running_loop().time() - start < 0.2
+
+        outbox.governor.on_msglexceeded()
+        assert outbox.governor.interval == outbox.governor.min_interval
+        for _ in range(100):
+            outbox.governor.on_sent()
+        assert outbox.governor.interval == outbox.governor.min_interval
+
+        empty = PMOutbox(send, max_backlog=0)
+        assert isinstance(empty.submit("friend", "x").exception(), OutboxOverflowError)
+
+    asyncio.run(scenario())
+
+
+def test_outbox_cancelled_when_kicked_off():
+    async def scenario():
+        pm = PM()
+        assert not pm.silent
+        await pm._rcmd_toofast([])
+        assert pm.silent and pm.outbox.silenced
+        queued = pm.queue_message("friend", "hello")
+        await pm._rcmd_kickingoff([])
+        assert queued.cancelled() and not len(pm.outbox)
+        pm.end_tasks()
+
+    asyncio.run(scenario())
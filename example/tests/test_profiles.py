@@ -0,0 +1,225 @@
+"""Profile cache tests."""
+import asyncio
+
+from chatango.profiles import ProfileCache, get_profile_cache, set_profile_cache
+from chatango.user import User
+
+MOD1 = '<?xml version="1.0" ?><mod><body>hello%20there</body><s>F</s><b>1990-01-01</b><l c="1">Earth</l></mod>'
+MSGSTYLES = '{"nameColor": "ff0000", "fontFamily": "2", "fontSize": "12", "textColor": "00ff00", "usebackground": "1"}'
+
+
+class FakeUpstream:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.requests = []
+
+    async def __call__(self, url):
+        self.requests.append(url)
+        await asyncio.sleep(self.delay)
+        if url.endswith("mod1.xml"):
+            return MOD1
+        if url.endswith("msgstyles.json"):
+            return MSGSTYLES
+        return None
+
+
+def test_single_flight_and_ttl():
+    upstream = FakeUpstream()
+    cache = ProfileCache(fetcher=upstream, ttls={"mod1": 0.05})
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get("someone", "mod1", "http://x/mod1.xml") for _ in range(50)))
+        assert results == [MOD1] * 50
+        assert len(upstream.requests) == 1
+        assert await cache.get("someone", "mod1", "http://x/mod1.xml") == MOD1
+        assert len(upstream.requests) == 1
+        await asyncio.sleep(0.06)
+        await cache.get("someone", "mod1", "http://x/mod1.xml")
+        assert len(upstream.requests) == 2
+
+    asyncio.run(scenario())
+
+
+def test_failures_expire_quickly_and_cancelled_callers_do_not_fail_others():
+    upstream = FakeUpstream(delay=0.02)
+    cache = ProfileCache(fetcher=upstream, failure_ttl=0.05)
+
+    async def scenario():
+        assert await cache.get("someone", "mod2", "http://x/mod2.xml") is None
+        assert await cache.get("someone", "mod2", "http://x/mod2.xml") is None
+        assert len(upstream.requests) == 1
+        await asyncio.sleep(0.06)
+        await cache.get("someone", "mod2", "http://x/mod2.xml")
+        assert len(upstream.requests) == 2
+
+        first = asyncio.ensure_future(cache.get("other", "mod1", "http://x/mod1.xml"))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get("other", "mod1", "http://x/mod1.xml"))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await waiter == MOD1
+        assert first.cancelled() and len(upstream.requests) == 3
+
+    asyncio.run(scenario())
+
+
+def test_bounded_eviction():
+    cache = ProfileCache(max_entries=3)
+    for n in range(5):
+        cache.put(f"user{n}", "mod1", "x")
+    assert len(cache) == 3
+    assert cache.peek("user0", "mod1") is None
+    assert cache.peek("user4", "mod1") == "x"
+
+
+def test_get_profile_uses_cache():
+    upstream = FakeUpstream()
+    previous = get_profile_cache()
+    set_profile_cache(ProfileCache(fetcher=upstream))
+    try:
+        user = User("cachedregular", is_anon=False)
+
+        async def scenario():
+            await asyncio.gather(*(user.get_profile() for _ in range(10)))
+
+        asyncio.run(scenario())
+        assert len(upstream.requests) == 4
+        assert user.gender == "F" and user.last_change == "1990-01-01"
+        assert user.styles.name_color == "ff0000" and user.styles.font_size == 12
+    finally:
+        set_profile_cache(previous)
+
+
+def test_persistent_store_serves_stale_and_revalidates(tmp_path):
+    from chatango.profile_store import SQLiteProfileStore
+
+    path = str(tmp_path / "profiles.sqlite3")
+    conditional = []
+
+    async def revalidator(url, etag=None, last_modified=None):
+        conditional.append(etag)
+        if etag == '"v1"':
+            return 304, None, etag, last_modified
+        return 200, MOD1, '"v1"', None
+
+    async def first_run():
+        store = SQLiteProfileStore(path)
+        cache = ProfileCache(store=store, revalidator=revalidator)
+        assert await cache.get("someone", "mod1", "http://x/mod1.xml") == MOD1
+        await store.close()
+
+    async def restart(ttls):
+        store = SQLiteProfileStore(path)
+        cache = ProfileCache(store=store, revalidator=revalidator, ttls=ttls)
+        assert await cache.get("someone", "mod1", "http://x/mod1.xml") == MOD1
+        await asyncio.gather(*cache._refreshing)
+        await store.close()
+        return cache
+
+    asyncio.run(first_run())
+    assert conditional == [None]
+    cache = asyncio.run(restart({}))
+    assert conditional == [None] and cache.stale_hits == 0
+    cache = asyncio.run(restart({"mod1": 0}))
+    assert conditional == [None, '"v1"'] and cache.stale_hits == 1
+
+
+def test_store_queues_deletes_and_sees_rows_being_committed(tmp_path):
+    from chatango.client import Client
+    from chatango.profile_store import SQLiteProfileStore
+
+    async def scenario():
+        store = SQLiteProfileStore(str(tmp_path / "profiles.sqlite3"))
+        store.put("someone", "mod1", MOD1)
+        store.put("someone", "msgstyles", MSGSTYLES)
+        flushing = asyncio.ensure_future(store.flush())
+        await asyncio.sleep(0)
+        assert store._writing and not store._pending
+        assert (await store.get("someone", "mod1")).content == MOD1
+        store.delete("someone", "mod1")
+        assert await store.get("someone", "mod1") is None
+        await flushing
+        assert await store.get("someone", "mod1") is None
+        assert await store.count() == 1
+        store.delete("someone")
+        store.put("someone", "mod2", "again")
+        assert await store.count() == 1
+        assert (await store.get("someone", "mod2")).content == "again"
+        await store.close()
+
+        client = Client("bot", "secret", [], profile_store=str(tmp_path / "client.sqlite3"))
+        previous = get_profile_cache()
+        set_profile_cache(ProfileCache(fetcher=FakeUpstream()))
+        try:
+            await client.run()
+            assert isinstance(get_profile_cache().store, SQLiteProfileStore)
+        finally:
+            await get_profile_cache().store.close()
+            set_profile_cache(previous)
+            client.end_tasks()
+
+    asyncio.run(scenario())
+
+
+def test_failed_store_write_rolls_back_and_is_retried(tmp_path):
+    import sqlite3
+
+    from chatango.profile_store import SQLiteProfileStore
+
+    async def scenario():
+        store = SQLiteProfileStore(str(tmp_path / "profiles.sqlite3"), flush_interval=0.01)
+        store._db.execute(
+            "CREATE TRIGGER full BEFORE INSERT ON resources WHEN NEW.user = 'second' "
+            "BEGIN SELECT RAISE(ABORT, 'database or disk is full'); END"
+        )
+        store.put("first", "mod1", MOD1)
+        store.put("second", "mod1", MOD1)
+        try:
+            await store.flush()
+        except sqlite3.IntegrityError:
+            pass
+        else:
+            raise AssertionError("the trigger did not fail the write")
+        assert not store._db.in_transaction and len(store._pending) == 2
+        assert (await store.get("second", "mod1")).content == MOD1
+        await asyncio.sleep(0.05)  # the background flusher fails too, but keeps running
+        assert not store._flush_task.done()
+        store._db.execute("DROP TRIGGER full")
+        await asyncio.sleep(0.05)
+        assert not store._pending and store._count() == 2
+        await store.close()
+
+    asyncio.run(scenario())
+
+
+def test_prefetch_is_bounded_and_ordered():
+    from chatango.prefetch import prefetch_profiles
+
+    class CountingUpstream(FakeUpstream):
+        in_flight = peak = 0
+
+        async def __call__(self, url):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            try:
+                return await super().__call__(url)
+            finally:
+                self.in_flight -= 1
+
+    upstream = CountingUpstream(delay=0.005)
+    previous = get_profile_cache()
+    set_profile_cache(ProfileCache(fetcher=upstream))
+    try:
+        users = [User(f"prefetched{n}", is_anon=False) for n in range(20)]
+        users.append(User("!anonprefetch", is_anon=True))
+        updates = []
+
+        result = asyncio.run(
+            prefetch_profiles(users + users[:5], concurrency=3, progress=lambda p: updates.append(p.done))
+        )
+        assert result.total == 20 and result.done == 20 and result.finished
+        assert upstream.peak <= 3 * 4
+        assert updates == list(range(1, 21))
+        assert upstream.requests[0].endswith("/p/r/prefetched0/msgstyles.json")
+    finally:
+        set_profile_cache(previous)
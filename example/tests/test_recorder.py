@@ -0,0 +1,48 @@
+"""Frame recorder and replay tests."""
+import asyncio
+import time
+
+import pytest
+
+from chatango.recorder import MAGIC, FrameRecorder, read_frames, replay
+from chatango.room import Room
+
+
+def test_record_read_and_replay(tmp_path):
+    path = str(tmp_path / "capture.rec")
+    frames = [f"ok:owner:11112222:M:replaybot:{int(time.time())}:1.2.3.4::0", "n:1f"]
+    for n in range(20):
+        frames.append(f"b:{1700000000 + n}:user{n % 3}::11112222:unid:t{n}:1.2.3.4:0::<n0/><f x11=''>héllo {n}")
+        frames.append(f"u:t{n}:m{n}")
+    recorder = FrameRecorder(path)
+    for n, frame in enumerate(frames):
+        recorder.write(frame, timestamp=1000.0 + n / 100)
+    recorder.close()
+    with open(path, "ab") as f:
+        f.write(b"\x00\x01")  # torn tail of a recording still being written
+
+    recorded = list(read_frames(path))
+    assert [frame for _, frame in recorded] == frames
+    assert recorded[-1][0] == 1000.0 + (len(frames) - 1) / 100
+
+    async def scenario():
+        room = Room("replayroom")
+        report = await replay(path, room)
+        paced_room = Room("replayroom")
+        paced = await replay(path, paced_room, speed=10)
+        room.end_tasks()
+        paced_room.end_tasks()
+        return room, report, paced
+
+    room, report, paced = asyncio.run(scenario())
+    assert report.frames == len(frames) and report.peak_memory > 0
+    assert room._user_count == 31
+    assert [msg.body for msg in room.history] == [f"héllo {n}" for n in range(20)]
+    assert paced.elapsed >= (len(frames) - 1) / 1000  # 10 ms apart when recorded, 1 ms at 10x
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a recording" + MAGIC)
+    with pytest.raises(ValueError):
+        list(read_frames(str(path)))
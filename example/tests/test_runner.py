@@ -0,0 +1,39 @@
+"""Event loop runner tests."""
+import asyncio
+
+import pytest
+
+from chatango.runner import new_event_loop, run
+
+
+def test_run_with_loop_factory_and_options():
+    created = []
+
+    def factory():
+        loop = asyncio.new_event_loop()
+        created.append(loop)
+        return loop
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        workers = await loop.run_in_executor(None, lambda: __import__("threading").current_thread().name)
+        return loop.get_debug(), loop.slow_callback_duration, workers
+
+    debug, slow, worker = run(main(), loop_factory=factory, debug=True, slow_callback_duration=0.25, executor_workers=2)
+    assert debug is True and slow == 0.25 and worker.startswith("chatango")
+    assert len(created) == 1 and created[0].is_closed()
+
+
+def test_uvloop_required_but_missing():
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        with pytest.raises(ImportError):
+            new_event_loop(use_uvloop=True)
+        loop = new_event_loop()
+        assert isinstance(loop, asyncio.AbstractEventLoop)
+        loop.close()
+    else:
+        loop = new_event_loop(use_uvloop=True)
+        assert type(loop).__module__.startswith("uvloop")
+        loop.close()
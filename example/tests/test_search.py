@@ -0,0 +1,116 @@
+"""Search index tests."""
+import asyncio
+
+from chatango.message import MessageFlags, RoomMessage
+from chatango.room import Room
+from chatango.search import SearchIndex, SQLiteSearchIndex, parse_query
+from chatango.user import User
+
+
+def room_message(room, n, body, user="someone", ip="1.2.3.4"):
+    msg = RoomMessage()
+    msg.room = room
+    msg.id = f"m{n}"
+    msg.time = 1000.0 + n
+    msg.user = User(user)
+    msg.body = msg.raw = body
+    msg.ip, msg.unid, msg.puid = ip, f"unid{n % 2}", "1234"
+    msg.flags = MessageFlags(0)
+    return msg
+
+
+def test_parse_query():
+    assert parse_query("Free nitro* user:SomeOne ip:1.2.*") == (["free", "user:someone"], ["nitro", "ip:1.2."])
+
+
+def test_search_across_rooms_and_history_eviction():
+    index = SearchIndex()
+    room1 = Room("searchroom1", search_index=index)
+    room2 = Room("searchroom2", search_index=index)
+    for n in range(3000):
+        room = room1 if n % 2 else room2
+        body = "free nitro here" if n % 100 == 0 else f"hello world {n}"
+        room._add_history(room_message(room, n, body, user=f"user{n % 7}", ip=f"10.0.0.{n % 5}"))
+
+    assert len(room1.history) + len(room2.history) == len(index) == 3000
+    hits = index.search("free nitro")
+    assert [m.id for m in hits[:3]] == ["m2900", "m2800", "m2700"]
+    assert all(m.room is room2 for m in hits)
+    assert [m.id for m in index.search("nit*", since=2500, until=2750)] == ["m1700", "m1600", "m1500"]
+    assert [m.id for m in index.search("hello", user="User3", ip="10.0.0.1", limit=2)] == ["m2971", "m2936"]
+    assert index.search("hello", rooms=["searchroom2"], limit=1)[0].id == "m2998"
+    assert len(index.search("ip:10.0.0.* world", limit=None)) == 2970
+    assert index.search("nothing") == []
+
+    # Room histories start evicting past 2900 messages; the index follows them
+    for n in range(3000, 9000):
+        room = room1 if n % 2 else room2
+        room._add_history(room_message(room, n, f"later {n}"))
+    assert len(room1.history) == len(room2.history) == 2900
+    assert len(index) == 5800
+    assert index.search("free") == []
+
+    deleted = room1._remove_history("m8999")
+    assert deleted is not None and deleted not in index
+    assert index.search("later", limit=1)[0].id == "m8998"
+
+
+def test_sqlite_search_index(tmp_path):
+    room = Room("searchroom1")
+    index = SQLiteSearchIndex(str(tmp_path / "search.db"))
+
+    async def scenario():
+        for n in range(50):
+            index.add(room_message(room, n, "free nitro" if n % 10 == 0 else f"hello {n}", user=f"user{n % 3}"))
+        hits = await index.search("nit*", user="USER1")
+        assert [hit["id"] for hit in hits] == ["m40", "m10"]
+        index.add(room_message(room, 50, "free nitro"))
+        index.remove(room_message(room, 50, ""))  # still queued
+        index.remove(room_message(room, 40, ""))  # queued for the next batch
+        assert not index._pending and len(index._deletes) == 2
+        assert [hit["id"] for hit in await index.search("free", since=1000.0)] == ["m30", "m20", "m10", "m0"]
+        assert await index.purge(before=1025.0) == 25
+        await index.close()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
+
+
+def test_failed_sqlite_write_rolls_back_and_is_retried(tmp_path):
+    import sqlite3
+
+    room = Room("searchroom1")
+    index = SQLiteSearchIndex(str(tmp_path / "search.db"), flush_interval=0.01)
+    index._db.execute(
+        "CREATE TRIGGER full BEFORE INSERT ON message_keys WHEN NEW.msgid = 'm1' "
+        "BEGIN SELECT RAISE(ABORT, 'database or disk is full'); END"
+    )
+
+    async def scenario():
+        index.add(room_message(room, 0, "free nitro"))
+        index.add(room_message(room, 1, "free nitro"))
+        index.remove(room_message(room, 5, ""))
+        try:
+            await index.flush()
+        except sqlite3.IntegrityError:
+            pass
+        else:
+            raise AssertionError("the trigger did not fail the write")
+        assert not index._db.in_transaction
+        assert len(index._pending) == 2 and len(index._deletes) == 1
+        await asyncio.sleep(0.05)  # the background flusher fails too, but keeps running
+        assert not index._flush_task.done()
+        index._db.execute("DROP TRIGGER full")
+        await asyncio.sleep(0.05)
+        assert not index._pending and not index._deletes
+        assert [hit["id"] for hit in await index.search("nitro")] == ["m1", "m0"]
+        await index.close()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(scenario())
+    finally:
+        loop.close()
@@ -0,0 +1,62 @@
+"""Server lookup tests."""
+import random
+import string
+
+import pytest
+
+from chatango.utils import get_server, get_servers, group_by_server, specials, tsweights
+
+
+def legacy_get_server(group: str) -> str:
+    """Reference linear-scan implementation."""
+    try:
+        sn = specials[group]
+    except KeyError:
+        group = group.replace("_", "q").replace("-", "q")
+        fnv = int(group[:5], 36)
+        lnv = group[6:9]
+        lnv = max(int(lnv, 36), 1000) if lnv else 1000
+        num = (fnv % lnv) / lnv
+        maxnum = sum(y for x, y in tsweights)
+        cumfreq = 0
+        sn = 0
+        for x, y in tsweights:
+            cumfreq += float(y) / maxnum
+            if num <= cumfreq:
+                sn = x
+                break
+    return f"s{sn}.chatango.com"
+
+
+def room_names(count: int) -> list:
+    rng = random.Random(7)
+    alphabet = string.ascii_lowercase + string.digits + "-"
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 20))).strip("-") or "room" for _ in range(count)
+    ] + list(specials)
+
+
+def test_get_server_matches_linear_scan():
+    for name in room_names(5000):
+        assert get_server(name) == legacy_get_server(name)
+
+
+def test_get_servers_batch():
+    names = room_names(2000)
+    expected = [legacy_get_server(name) for name in names]
+    assert get_servers(names, use_numpy=False) == expected
+    pytest.importorskip("numpy")
+    assert get_servers(names, use_numpy=True) == expected
+    # Upper case, short names, underscores and specials
+    odd = ["ABCdef", "x", "a_b-c_d_e", "abcdefg_h"] + list(specials)
+    assert get_servers(odd, use_numpy=True) == [legacy_get_server(name) for name in odd]
+    with pytest.raises(ValueError):
+        get_servers(["valid", "ab cd"], use_numpy=True)
+
+
+def test_group_by_server():
+    names = room_names(500)
+    grouped = group_by_server(names)
+    assert sorted(sum(grouped.values(), [])) == sorted(names)
+    for host, rooms in grouped.items():
+        assert all(legacy_get_server(name) == host for name in rooms)
@@ -0,0 +1,162 @@
+"""Room & PM protocol tests against the local simulator."""
+import asyncio
+
+from chatango import PM, Room
+from chatango.simulator import ChatangoSimulator, SimulationScript
+
+
+async def _wait_for(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.01)
+
+
+def test_room_against_simulator():
+    async def scenario():
+        script = SimulationScript(participants=50, message_rate=40, join_rate=10, history=5, seed=1)
+        async with ChatangoSimulator(script=script) as sim:
+            room = Room("simroom", server=sim.host, port=sim.ws_port)
+            listener = asyncio.create_task(room.listen("simbot", "password"))
+            await _wait_for(lambda: len(room.history) >= 15)
+            assert room.user.name == "simbot"
+            assert len(room.all_user_list) >= 50
+            assert room.ban_list
+            await room.send_message("hello from the bot")
+            await _wait_for(lambda: any(msg.body == "hello from the bot" for msg in room.history))
+            await room.disconnect()
+            await listener
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(scenario())
+    loop.close()
+
+
+def test_pm_against_simulator():
+    async def scenario():
+        async with ChatangoSimulator(script=SimulationScript(friends=4, seed=1)) as sim:
+            pm = PM(server=sim.host, port=sim.pm_port, login_url=sim.login_url)
+            listener = asyncio.create_task(pm.listen("simbot", "password"))
+            await _wait_for(lambda: len(pm.friends) == 4 and "simbot" in sim.pm_clients)
+            await sim.send_pm("simbot", "simfriend1", "ping")
+            await _wait_for(lambda: len(pm.history) == 1)
+            assert pm.history[0].body == "ping"
+            await pm.disconnect()
+            await listener
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(scenario())
+    loop.close()
+
+
+def test_multi_client_against_simulator():
+    from chatango.auth import TokenManager
+    from chatango.multi import MultiClient
+
+    async def scenario():
+        async with ChatangoSimulator(script=SimulationScript(friends=3, seed=1)) as sim:
+            tokens = TokenManager()
+            multi = MultiClient(token_manager=tokens, **sim.client_kwargs())
+            names = [f"simbot{n}" for n in range(4)]
+            for name in names:
+                multi.add_account(name, "password", pm=True)
+            runner = asyncio.create_task(multi.run())
+            await _wait_for(lambda: all(name in sim.pm_clients for name in names))
+            await _wait_for(lambda: all(client.pm and len(client.pm.friends) == 3 for client in multi.clients.values()))
+            assert tokens.logins == 4
+            outboxes = {id(client.pm.outbox) for client in multi.clients.values()}
+            assert len(outboxes) == 4
+
+            await sim.send_pm("simbot2", "simfriend1", "only for two")
+            await _wait_for(lambda: len(multi.get_client("simbot2").pm.history) == 1)
+            assert all(len(multi.get_client(name).pm.history) == 0 for name in names if name != "simbot2")
+            multi.stop()
+            await asyncio.wait_for(runner, 5)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(scenario())
+    loop.close()
+
+
+def test_removed_account_run_task_ends():
+    from chatango.multi import MultiClient
+
+    async def scenario():
+        async with ChatangoSimulator(script=SimulationScript(friends=1, seed=1)) as sim:
+            multi = MultiClient(**sim.client_kwargs())
+            multi.add_account("simbot0", "password", pm=True)
+            runner = asyncio.create_task(multi.run(forever=True))
+            multi.add_account("simbot1", "password", pm=True)
+            await _wait_for(lambda: "simbot0" in sim.pm_clients and "simbot1" in sim.pm_clients)
+            run_task, pm = multi._runs["simbot1"], multi.get_client("simbot1").pm
+            removed = multi.remove_account("simbot1")
+            await asyncio.wait({run_task}, timeout=5)
+            assert run_task.done() and run_task not in multi.tasks and "simbot1" not in multi._runs
+            assert not pm.connected and removed.task_loop.cancelled()
+            await _wait_for(lambda: len(multi.tasks) == 1)
+            assert multi.get_client("simbot0").pm.connected
+            multi.stop()
+            multi.end_tasks()
+            await asyncio.gather(runner, return_exceptions=True)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(scenario())
+    loop.close()
+
+
+def test_message_stream_batches_with_backpressure():
+    async def scenario():
+        script = SimulationScript(participants=5, message_rate=0, history=0, seed=1)
+        async with ChatangoSimulator(script=script) as sim:
+            room = Room("streamroom", server=sim.host, port=sim.ws_port)
+            messages = room.messages_stream(maxsize=5)
+            events = room.stream(events={"message"}, maxsize=100, overflow="drop_oldest")
+            listener = asyncio.create_task(room.listen("simbot", "password"))
+            await _wait_for(lambda: room.user is not None)
+            for n in range(20):
+                sim.post_message("streamroom", f"streamed {n}")
+            await asyncio.sleep(0.2)
+            assert len(messages) == 5  # reading paused at maxsize
+            received = []
+            while len(received) < 20:
+                received += await messages.get_batch(8, timeout=1)
+            assert [msg.body for msg in received] == [f"streamed {n}" for n in range(20)]
+            assert await messages.get_batch(8, timeout=0.05) == []
+            first = await events.get()
+            assert first.source is room and first.event == "message" and first.args[0].body == "streamed 0"
+            messages.close()
+            events.close()
+            await room.disconnect()
+            await listener
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(scenario())
+    loop.close()
+
+
+def test_full_blocking_stream_does_not_hold_disconnect():
+    async def scenario():
+        script = SimulationScript(participants=5, message_rate=0, history=0, seed=1)
+        async with ChatangoSimulator(script=script) as sim:
+            room = Room("stalledroom", server=sim.host, port=sim.ws_port)
+            messages = room.messages_stream(maxsize=2)
+            listener = asyncio.create_task(room.listen("simbot", "password"))
+            await _wait_for(lambda: room.user is not None)
+            for n in range(10):
+                sim.post_message("stalledroom", f"unread {n}")
+            await _wait_for(lambda: len(messages) == 2)
+            # The consumer stopped reading without closing its stream
+            await room.disconnect()
+            await asyncio.wait_for(listener, 2)
+            assert not room.connected
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(scenario())
+    loop.close()
@@ -0,0 +1,50 @@
+"""User interning tests."""
+import gc
+
+from chatango.user import User
+
+
+def test_identity_while_referenced():
+    user = User("SomeRegular", ip="10.0.0.1")
+    assert User("someregular") is user
+    assert User("SOMEREGULAR").name == "someregular"
+    assert user._ip == "10.0.0.1"
+
+
+def test_unreferenced_users_are_evicted():
+    registry = User._users
+    limit = registry.recent_limit
+    try:
+        registry.resize(2)
+        for n in range(10):
+            User(f"passerby{n}")
+        gc.collect()
+        assert "passerby9" in registry and "passerby8" in registry
+        assert "passerby0" not in registry
+        kept = User("passerby9")
+        registry.resize(0)
+        gc.collect()
+        assert "passerby8" not in registry
+        assert User("passerby9") is kept
+    finally:
+        registry.resize(limit)
+
+
+def test_slotted_lazy_styles():
+    user = User("lazystyles", is_anon=True, puid="12345678")
+    assert not hasattr(user, "__dict__")
+    assert user._styles is None and user._sids is None
+    assert user.get_session_ids() == set()
+    styles = user.styles
+    assert styles._profile is None and styles._bg_style is None
+    assert user.gender == "?"
+    assert styles.bg_style["useimg"] == "0"
+    user.del_profile()
+    assert styles._profile is None
+    assert "name_color" in dir(styles)
+
+
+def test_known_keyword_fields_are_set_and_unknown_ignored():
+    user = User("KeywordUser", is_premium=True, nickname="ignored")
+    assert user._is_premium is True
+    assert not hasattr(user, "_nickname")
@@ -1,96 +1,69 @@
 """Custom logger and error notifications."""
+import atexit
 import json
-import re
-from sys import stdout
+import logging
+import os
+import queue
+import threading
+from os import getenv
+from sys import stderr, stdout
+from typing import Optional, TextIO
 
 from loguru import logger
 
+QUEUE_POLICIES = ("drop", "block")
 
-def json_formatter(record: dict) -> str:
+
+# Bound fields (`LOGGER.bind(room=..., user=..., ip=..., event=...)`) copied into JSON records
+CONTEXT_FIELDS = ("room", "user", "ip", "event")
+
+_encode_json = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
+
+
+def chat_logger(room: str, user: Optional[str] = None, ip: Optional[str] = None, event: str = "message") -> logger:
     """
-    Format info message logs.
+    Logger bound to the context of a chat event, instead of formatting it into the message text.
 
-    :param dict record: Log object containing log metadata & message.
+    :param str room: Room name.
+    :param str user: User name.
+    :param str ip: User IP address, when visible.
+    :param str event: Event name, e.g. `message` or `join`.
 
-    :returns: str
+    :returns: logger
     """
+    return logger.bind(room=room, user=user, ip=ip, event=event)
 
-    record["time"] = record["time"].strftime("%m/%d/%Y, %H:%M:%S")
-    record["elapsed"] = record["elapsed"].total_seconds()
 
-    def serialize_as_admin(log: dict) -> str:
-        """
-        Construct JSON info log record where user is room admin.
+def json_formatter(record: dict) -> str:
+    """
+    Format records as compact JSON lines.
 
-        :param dict log: Dictionary containing logged message with metadata.
+    :param dict record: Log object containing log metadata & message.
 
-        :returns: str
-        """
-        try:
-            chat_data = re.search(r"(?P<room>\[\S+]) (?P<user>\[\S+]) (?P<ip>\[\S+])", log.get("message"))
-            if chat_data and log.get("message"):
-                subset = {
-                    "time": log["time"],
-                    "message": log["message"].split(": ", 1)[1],
-                    "level": log["level"].name,
-                    "room": chat_data["room"].replace("[", "").replace("]", ""),
-                    "user": chat_data["user"].replace("[", "").replace("]", ""),
-                    "ip": chat_data["ip"].replace("[", "").replace("]", ""),
-                }
-                return json.dumps(subset)
-        except Exception as e:
-            subset["error"] = f"Logging error occurred: {str(e)}"
-            return serialize_error(subset)
-
-    def serialize_event(log: dict) -> str:
-        """
-        Construct warning log.
-
-        :param dict log: Dictionary containing logged message with metadata.
-
-        :returns: str
-        """
-        try:
-            chat_data = re.search(r"(?P<room>\[\S+]) (?P<user>\[\S+])", log["message"])
-            if bool(chat_data) and log.get("message") is not None:
-                subset = {
-                    "time": log["time"],
-                    "message": log["message"].split(": ", 1)[1],
-                    "level": log["level"].name,
-                    "room": chat_data["room"].replace("[", "").replace("]", ""),
-                    "user": chat_data["user"].replace("[", "").replace("]", ""),
-                }
-                return json.dumps(subset)
-        except Exception as e:
-            log["error"] = f"Logging error occurred: {str(e)}"
-
-    def serialize_error(log: dict) -> str:
-        """
-        Construct error log record.
-
-        :param dict log: Dictionary containing logged message with metadata.
-
-        :returns: str
-        """
-        if log and log.get("message"):
-            subset = {
-                "time": log["time"],
-                "level": log["level"].name,
-                "message": log["message"],
-            }
-            return json.dumps(subset)
+    :returns: str
+    """
+    extra = record["extra"]
+    subset = {
+        "time": record["time"].timestamp(),
+        "level": record["level"].name,
+        "message": record["message"],
+    }
+    for field in CONTEXT_FIELDS:
+        value = extra.get(field)
+        if value is not None:
+            subset[field] = value
+    if record["exception"]:
+        subset["error"] = repr(record["exception"].value)
+    extra["serialized"] = _encode_json(subset)
+    return "{extra[serialized]}\n"
 
-    if record["level"].name == "INFO":
-        record["extra"]["serialized"] = serialize_as_admin(record)
-        return "{extra[serialized]},\n"
-    if record["level"].name in ("TRACE", "WARNING", "SUCCESS", "DEBUG"):
-        record["extra"]["serialized"] = serialize_event(record)
-        return "{extra[serialized]},\n"
-    if record["level"].name in ("ERROR", "CRITICAL"):
-        record["extra"]["serialized"] = serialize_error(record)
-        return "{extra[serialized]},\n"
-    record["extra"]["serialized"] = serialize_error(record)
-    return "{extra[serialized]},\n"
+
+def _context_prefix(record: dict) -> str:
+    extra = record["extra"]
+    if "room" not in extra:
+        return ""
+    parts = [extra.get(field) for field in ("room", "user", "ip")]
+    return " ".join(f"[{part}]" for part in parts if part is not None) + ": "
 
 
 def log_formatter(record: dict) -> str:
@@ -101,30 +74,201 @@ def log_formatter(record: dict) -> str:
 
     :returns: str
     """
+    record["extra"]["context"] = _context_prefix(record)
     if record["level"].name == "TRACE":
-        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #d2eaff>{level}</fg #d2eaff>: <light-white>{message}</light-white>\n"
+        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #d2eaff>{level}</fg #d2eaff>: <light-white>{extra[context]}{message}</light-white>\n"
     if record["level"].name == "INFO":
-        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #98bedf>{level}</fg #98bedf>: <light-white>{message}</light-white>\n"
+        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #98bedf>{level}</fg #98bedf>: <light-white>{extra[context]}{message}</light-white>\n"
     if record["level"].name == "WARNING":
-        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> |  <fg #b09057>{level}</fg #b09057>: <light-white>{message}</light-white>\n"
+        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> |  <fg #b09057>{level}</fg #b09057>: <light-white>{extra[context]}{message}</light-white>\n"
     if record["level"].name == "SUCCESS":
-        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #6dac77>{level}</fg #6dac77>: <light-white>{message}</light-white>\n"
+        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #6dac77>{level}</fg #6dac77>: <light-white>{extra[context]}{message}</light-white>\n"
     if record["level"].name == "ERROR":
-        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #a35252>{level}</fg #a35252>: <light-white>{message}</light-white>\n"
+        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #a35252>{level}</fg #a35252>: <light-white>{extra[context]}{message}</light-white>\n"
     if record["level"].name == "CRITICAL":
-        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #521010>{level}</fg #521010>: <light-white>{message}</light-white>\n"
-    return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #98bedf>{level}</fg #98bedf>: <light-white>{message}</light-white>\n"
+        return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #521010>{level}</fg #521010>: <light-white>{extra[context]}{message}</light-white>\n"
+    return "<fg #5278a3>{time:MM-DD-YYYY HH:mm:ss}</fg #5278a3> | <fg #98bedf>{level}</fg #98bedf>: <light-white>{extra[context]}{message}</light-white>\n"
 
 
-def create_logger() -> logger:
+class QueuedSink:
+    """
+    Loguru sink handing formatted records to a background thread through a bounded queue.
+
+    The event loop only pays for formatting and a queue put; the writer thread drains up to `batch_size`
+    records per write, to `stream` or to a size-rotated file at `path`. When the queue is full the `drop`
+    policy discards the record and counts it, while `block` waits for room. Write and rotation errors are
+    counted in `errors` and reported on stderr; the thread keeps draining the queue.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        path: Optional[str] = None,
+        max_queue: int = 10000,
+        policy: str = "drop",
+        batch_size: int = 512,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 5,
+    ):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"policy must be one of {QUEUE_POLICIES}")
+        self.path = path
+        self.policy = policy
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._stream = open(path, "a", encoding="utf-8") if path else stream or stdout
+        self._size = self._stream.tell() if path else 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def __call__(self, message: str):
+        try:
+            if self.policy == "block":
+                self._queue.put(message)
+            else:
+                self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            records = [record for record in batch if record is not None]
+            if records:
+                try:
+                    self._write("".join(records))
+                    self.written += len(records)
+                except Exception as e:  # pylint: disable=broad-except
+                    self._report(e)
+            if stop:
+                return
+
+    def _report(self, error: Exception):
+        self.errors += 1
+        try:
+            stderr.write(f"QueuedSink: log write failed: {error!r}\n")
+        except (OSError, ValueError):
+            pass
+
+    def _write(self, text: str):
+        if self.path:
+            if self._size and self._size + len(text) > self.max_bytes:
+                try:
+                    self._rotate()
+                except OSError as e:
+                    self._report(e)
+            self._size += len(text)
+        self._stream.write(text)
+        self._stream.flush()
+
+    def _rotate(self):
+        self._stream.close()
+        mode = "a"  # keep appending to the current file when it cannot be moved aside
+        try:
+            for n in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{n}"):
+                    os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+            if self.backups:
+                os.replace(self.path, f"{self.path}.1")
+            mode = "w"
+        finally:
+            self._stream = open(self.path, mode, encoding="utf-8")
+            self._size = self._stream.tell()
+
+    def stop(self, timeout: float = 5.0):
+        """Write out everything queued and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        if self.path:
+            self._stream.close()
+
+
+class StdlibBridge(logging.Handler):
+    """Forward records of the stdlib loggers used inside the `chatango` package, e.g. `chatango.trace`, to loguru."""
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        logger.opt(exception=record.exc_info).log(level, record.getMessage())
+
+
+QUEUED_SINK: Optional[QueuedSink] = None
+STDLIB_BRIDGE = StdlibBridge()
+
+
+def bridge_stdlib(name: str = "chatango", level: int = logging.INFO, trace: bool = True):
+    """
+    Route a stdlib logger into loguru, so library messages such as `Connected to ...` and `enable_trace`
+    output reach our sinks.
+
+    :param str name: Stdlib logger to bridge; its records stop propagating to the root logger.
+    :param int level: Level of the bridged logger, e.g. `logging.DEBUG` for `IN`/`OUT` frame logging.
+    :param bool trace: Let INFO records of `chatango.trace` through even when `level` is higher.
+    """
+    stdlib_logger = logging.getLogger(name)
+    if STDLIB_BRIDGE not in stdlib_logger.handlers:
+        stdlib_logger.addHandler(STDLIB_BRIDGE)
+    stdlib_logger.setLevel(level)
+    stdlib_logger.propagate = False
+    if trace:
+        logging.getLogger("chatango.trace").setLevel(logging.INFO)
+
+
+def create_logger(
+    queued: bool = False,
+    path: Optional[str] = None,
+    policy: str = "drop",
+    max_queue: int = 10000,
+    json_lines: bool = False,
+) -> logger:
     """
     Configure custom logger.
 
+    :param bool queued: Write through a `QueuedSink` instead of synchronously to stdout.
+    :param str path: Queued mode only; write to this size-rotated file instead of stdout.
+    :param str policy: Queued mode only; `drop` or `block` when the queue is full.
+    :param int max_queue: Queued mode only; records buffered before the policy applies.
+    :param bool json_lines: Write compact JSON lines via `json_formatter` instead of colorized text.
+
     :returns: logger
     """
+    global QUEUED_SINK
     logger.remove()
-    logger.add(stdout, level="TRACE", colorize=True, catch=True, format=log_formatter)
+    if QUEUED_SINK:
+        QUEUED_SINK.stop()
+        QUEUED_SINK = None
+    formatter = json_formatter if json_lines else log_formatter
+    if queued:
+        QUEUED_SINK = QueuedSink(path=path, policy=policy, max_queue=max_queue)
+        logger.add(QUEUED_SINK, level="TRACE", colorize=not (path or json_lines), catch=True, format=formatter)
+    else:
+        logger.add(stdout, level="TRACE", colorize=not json_lines, catch=True, format=formatter)
+    bridge_stdlib()
     return logger
 
 
-LOGGER = create_logger()
+LOGGER = create_logger(
+    queued=getenv("LOG_QUEUED", "").lower() in ("1", "true", "yes"),
+    path=getenv("LOG_FILE") or None,
+    policy=getenv("LOG_QUEUE_POLICY", "drop"),
+    json_lines=getenv("LOG_JSON", "").lower() in ("1", "true", "yes"),
+)